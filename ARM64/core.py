@@ -11,92 +11,51 @@ from src.cache.cache_config import CacheConfig, MultiLevelCacheConfig  # 缓存
 from src.cache.constants import *                # 缓存相关常量
 from src.analyser import CacheAnalyser           # 缓存分析器
 from src.cache.memory_ref import Reference       # 内存引用类
+from src.frontend_cache import FrontendCache, FrontendArtifacts  # 前端结果缓存
 
-# ============================================ 端到端运行函数 =============================================
-def end2end_run(config: TestbenchConfig, logger: Logger):
+# ============================================ 分析准备函数 =============================================
+def default_cache_config(state_backend: CacheStateBackend = CacheStateBackend.DICT) -> MultiLevelCacheConfig:
     """
-    端到端缓存分析主函数
-    
+    返回默认的多级缓存配置：L1I/L1D 各 64KB，L2 统一缓存 512KB。
+
     参数:
-        config: 测试基准配置对象，包含所有运行时参数
-        logger: 日志记录器，用于输出运行信息
+        state_backend: 分析时 Abstract Cache State 的存储方式
     """
-    # --------------------------------------- 初始化阶段 ---------------------------------------
-    logger.log("Starting hw cache analysis v2.", verbose=1, color='blue')
-    logger.log2C("Received benchamrk: ", f"{config.benchmark_name}", verbose=1, color='green', color2='red')
-    
-    # 创建输出目录
-    benchmark_name = config.benchmark_name
-    output_path = os.path.join('output', benchmark_name)
-    os.makedirs(output_path, exist_ok=True)  # 自动处理目录存在性
-
-    # --------------------------------------- 调试配置 ---------------------------------------
-    debug_path = os.path.join('debug', benchmark_name)
-    if os.path.exists(debug_path):
-        shutil.rmtree(debug_path)  # 清空旧调试目录
-    os.makedirs(debug_path, exist_ok=True)
-
-    # ------------------------------------ 汇编文件处理阶段 ------------------------------------
-    logger.log("Read asm file and build instructions...", verbose=1, color='blue')
-    reader = AsmFileReader(config.asm_path)        # 汇编文件读取器
-    seg_reader = SegmentReader(config.asm_d_path)  # 段信息读取器
-
-    # 过程网络构建（控制流分析）
-    if config.skip_user_plt:
-        logger.log("Use user-defined @plt procedure.", verbose=1, color='red')
-        proc_network = ProcedureNetwork(reader, skip_as_plt=config.user_plt)
-    else:
-        logger.log("Do not use user-defined @plt procedure.", verbose=1, color='red')
-        proc_network = ProcedureNetwork(reader, skip_as_plt=[])
-
-    # ------------------------------------ CFG构建阶段 ------------------------------------
-    logger.log("Build CFG...", verbose=1, color='blue')
-    cfg = InnerProcCFG(proc_network)  # 内部过程控制流图
-    procedures = proc_network.procedures  # 获取所有过程对象
-
-    # 生成过程CFG图（可选）
-    if config.gen_procedure_cfg:
-        logger.log("Generate Procedure CFG...", verbose=1, color='red')
-        # 根据配置生成指定或全部过程的CFG图
-        target_procs = procedures if "all" in config.procedure_cfg else \
-            [p for p in procedures if p.name in config.gen_procedure_cfg]
-        for proc in target_procs:
-            g = proc.draw_inner_cfg()
-            g.render(filename=proc.name, directory=output_path, format='svg')
-
-    # -------------------------------- 缓存配置初始化阶段 --------------------------------
-    logger.log("Cache Config Init.", verbose=1, color='blue')
-    
     # L1指令缓存配置：64KB，直接映射
     inst_cache_config = CacheConfig(CacheHierarchy.L1I, 
                                    capacity_size=65536, 
                                    associativity=1, 
                                    line_size=64)
-    
+
     # L1数据缓存配置：64KB，2路组相联
     data_cache_config = CacheConfig(CacheHierarchy.L1D,
                                    capacity_size=65536,
                                    associativity=2,
                                    line_size=64)
-    
+
     # L2统一缓存配置：512KB，4路组相联
     unified_cache_config = CacheConfig(CacheHierarchy.L2,
                                       capacity_size=524288,
                                       associativity=4,
                                       line_size=64)
-    
+
     # 构建多级缓存配置（当前使用L1+L2配置）
     multilevel_cache_config = MultiLevelCacheConfig({
         CacheHierarchy.L1I: inst_cache_config,
         CacheHierarchy.L1D: data_cache_config,
         CacheHierarchy.L2: unified_cache_config
-    })
+    }, state_backend=state_backend)
+    return multilevel_cache_config
 
-    # --------------------------------- 地址查找与引用收集阶段 --------------------------------
-    logger.log("Find addr.", verbose=1, color='blue')
-    addr_finder = Addr_Finder(proc_network, seg_reader, output_path, node_name2obj, ins_name2obj)
-    
-    # 收集每个过程的指令和数据引用
+
+def collect_references(related_procs: Set[Procedure], multilevel_cache_config: MultiLevelCacheConfig):
+    """
+    收集每个过程的指令和数据引用
+
+    返回:
+        proc_inst_ref: 结构：{过程: {节点: {指令: 引用对象}}}
+        proc_data_ref: 结构：{过程: {节点: {指令: 引用对象集合}}}
+    """
     proc_inst_ref = dict()  # 结构：{过程: {节点: {指令: 引用对象}}}
     proc_data_ref = dict()  # 结构：{过程: {节点: {指令: 引用对象集合}}}
     
@@ -128,6 +87,119 @@ def end2end_run(config: TestbenchConfig, logger: Logger):
         proc_inst_ref[proc_cfg] = inst_ref
         proc_data_ref[proc_cfg] = data_ref
 
+    return proc_inst_ref, proc_data_ref
+
+
+# ============================================ 前端处理函数 =============================================
+def build_frontend(config: TestbenchConfig, logger: Logger, output_path: str) -> FrontendArtifacts:
+    """
+    读取汇编文件，构建过程网络和CFG，并查找每条指令的访存地址。结果只由汇编文件决定，与缓存配置无关。
+
+    参数:
+        config: 测试基准配置对象
+        logger: 日志记录器
+        output_path: 输出目录
+    """
+    # ------------------------------------ 汇编文件处理阶段 ------------------------------------
+    logger.log("Read asm file and build instructions...", verbose=1, color='blue')
+    reader = AsmFileReader(config.asm_path)        # 汇编文件读取器
+    seg_reader = SegmentReader(config.asm_d_path)  # 段信息读取器
+
+    # 过程网络构建（控制流分析）
+    if config.skip_user_plt:
+        logger.log("Use user-defined @plt procedure.", verbose=1, color='red')
+        proc_network = ProcedureNetwork(reader, skip_as_plt=config.user_plt)
+    else:
+        logger.log("Do not use user-defined @plt procedure.", verbose=1, color='red')
+        proc_network = ProcedureNetwork(reader, skip_as_plt=[])
+
+    # ------------------------------------ CFG构建阶段 ------------------------------------
+    logger.log("Build CFG...", verbose=1, color='blue')
+    cfg = InnerProcCFG(proc_network)  # 内部过程控制流图
+    procedures = proc_network.procedures  # 获取所有过程对象
+    related_procs = cfg.find_related_procs()  # 与main函数相关的过程
+    regular_loops = {loop for loop in cfg.find_related_loops() if loop.head is not None}  # 忽略irregular loop
+
+    # --------------------------------- 地址查找阶段 --------------------------------
+    logger.log("Find addr.", verbose=1, color='blue')
+    node_name2obj = {node.name: node for proc in procedures for node in proc.nodes}
+    ins_name2obj = {inst.addr.val(): inst for proc in procedures for inst in proc.instruction}
+    Addr_Finder(proc_network, seg_reader, output_path, node_name2obj, ins_name2obj)
+
+    return FrontendArtifacts(proc_network, cfg, related_procs, regular_loops)
+
+
+# ============================================ 端到端运行函数 =============================================
+def end2end_run(config: TestbenchConfig, logger: Logger, command: Optional[str] = None,
+                state_backend: CacheStateBackend = CacheStateBackend.DICT, jobs: int = 1,
+                use_frontend_cache: bool = True):
+    """
+    端到端缓存分析主函数
+    
+    参数:
+        config: 测试基准配置对象，包含所有运行时参数
+        logger: 日志记录器，用于输出运行信息
+        command: 启动本次分析的原始命令行，仅用于日志输出
+        state_backend: 分析时 Abstract Cache State 的存储方式，DICT 或 ARRAY
+        jobs: 函数级不动点迭代使用的进程数，1 表示顺序执行
+        use_frontend_cache: 是否使用 output/<benchmark>/.cache 中缓存的前端结果，汇编文件变化时缓存自动失效
+
+    返回:
+        完成分析的 CacheAnalyser，可用于获取迭代轮数、分类结果等统计信息
+    """
+    # --------------------------------------- 初始化阶段 ---------------------------------------
+    logger.log("Starting hw cache analysis v2.", verbose=1, color='blue')
+    logger.log2C("Received benchamrk: ", f"{config.benchmark_name}", verbose=1, color='green', color2='red')
+    if command is not None:
+        logger.log(f"Command: {command}", verbose=1)
+    
+    # 创建输出目录
+    benchmark_name = config.benchmark_name
+    output_path = os.path.join('output', benchmark_name)
+    os.makedirs(output_path, exist_ok=True)  # 自动处理目录存在性
+
+    # --------------------------------------- 调试配置 ---------------------------------------
+    debug_path = os.path.join('debug', benchmark_name)
+    if os.path.exists(debug_path):
+        shutil.rmtree(debug_path)  # 清空旧调试目录
+    os.makedirs(debug_path, exist_ok=True)
+
+    # ------------------------------------ 前端（汇编读取、CFG构建、地址查找） ------------------------------------
+    skip_as_plt = config.user_plt if config.skip_user_plt else []
+    frontend_cache = FrontendCache(os.path.join(output_path, '.cache'), config.asm_path, config.asm_d_path, skip_as_plt)
+    artifacts = frontend_cache.load() if use_frontend_cache else None
+    if artifacts is not None:
+        logger.log(f"Load asm, CFG and addresses from cache {frontend_cache.path}.", verbose=1, color='blue')
+    else:
+        artifacts = build_frontend(config, logger, output_path)
+        if use_frontend_cache:
+            frontend_cache.store(artifacts)
+    proc_network = artifacts.proc_network
+    cfg = artifacts.cfg
+    procedures = proc_network.procedures  # 获取所有过程对象
+    related_procs = artifacts.related_procs  # 与main函数相关的过程
+    regular_loops = artifacts.regular_loops
+
+    # 生成过程CFG图（可选）
+    if config.gen_procedure_cfg:
+        logger.log("Generate Procedure CFG...", verbose=1, color='red')
+        # 根据配置生成指定或全部过程的CFG图
+        target_procs = procedures if "all" in config.procedure_cfg else \
+            [p for p in procedures if p.name in config.gen_procedure_cfg]
+        for proc in target_procs:
+            g = proc.draw_inner_cfg()
+            g.render(filename=proc.name, directory=output_path, format='svg')
+
+    # -------------------------------- 缓存配置初始化阶段 --------------------------------
+    logger.log("Cache Config Init.", verbose=1, color='blue')
+    
+    logger.log(f"Cache state backend: {state_backend.name}", verbose=1)
+    multilevel_cache_config = default_cache_config(state_backend)
+
+    # --------------------------------- 引用收集阶段 --------------------------------
+    # 收集每个过程的指令和数据引用
+    proc_inst_ref, proc_data_ref = collect_references(related_procs, multilevel_cache_config)
+
     # --------------------------------- 缓存行为分析阶段 ---------------------------------
     logger.log("Analysis Cache Behavior", verbose=1, color='blue')
     cache_analyser = CacheAnalyser(
@@ -138,7 +210,8 @@ def end2end_run(config: TestbenchConfig, logger: Logger):
         related_procs,
         regular_loops,
         debug_path,
-        debug=True
+        debug=True,
+        jobs=jobs
     )
     
     # 执行核心分析流程
@@ -158,4 +231,5 @@ def end2end_run(config: TestbenchConfig, logger: Logger):
             analysis_output_path
         )
     
-    logger.log("Finished.", verbose=1, color='green') 
+    logger.log("Finished.", verbose=1, color='green')
+    return cache_analyser 
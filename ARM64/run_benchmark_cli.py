@@ -6,6 +6,7 @@ import sys
 
 from src.util import read_config, Logger
 from core import end2end_run
+from src.cache.constants import CacheStateBackend
 
 warnings.filterwarnings('ignore', category=UserWarning)
 
@@ -13,9 +14,14 @@ warnings.filterwarnings('ignore', category=UserWarning)
 def parse_args():
     parser = argparse.ArgumentParser()
 
+    target = parser.add_mutually_exclusive_group(required=True)
     # args.tbpath
-    parser.add_argument('-f', '--folder', dest='tbpath', required=True,
+    target.add_argument('-f', '--folder', dest='tbpath',
                         help='The folder where the testbench to be analyzed is located.')
+    # args.batch
+    target.add_argument('--batch', dest='batch_root',
+                        help='Analyze all testbenches (folders containing config.json) under the given folder, '
+                             'e.g. benchmark/MRTC, and write an aggregated summary.')
     # args.verbose
     parser.add_argument('--verbose', type=int, choices=[0, 1, 2], default=1,
                         help='The level of detail in the output, default is 1.')
@@ -25,6 +31,31 @@ def parse_args():
     # args.skip_user_plt
     parser.add_argument('--skip_user_plt', action='store_true',
                         help="Whether to skip the user's plt. If not provided, the default is false.")
+    # args.state_backend
+    parser.add_argument('--state_backend', choices=['dict', 'array'], default='dict',
+                        help="The storage of abstract cache states, 'dict' (per-set dictionaries) or "
+                             "'array' (NumPy age matrix, less memory). The default is dict.")
+    # args.jobs
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='The number of processes used to analyze independent procedures in parallel, '
+                             'default is 1 (sequential).')
+    # args.no_cache
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Do not use the cached asm/CFG/address results under output/<benchmark>/.cache.')
+    # args.batch_jobs
+    parser.add_argument('--batch_jobs', type=int, default=os.cpu_count() or 1,
+                        help='Batch mode: the number of testbenches analyzed at the same time, '
+                             'default is the number of CPUs.')
+    # args.timeout
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Batch mode: the time limit (seconds) of each testbench, no limit by default.')
+    # args.memory_limit
+    parser.add_argument('--memory_limit', type=int, default=None,
+                        help='Batch mode: the address space limit (MB) of each testbench, no limit by default.')
+    # args.summary
+    parser.add_argument('--summary', default=os.path.join('output', 'batch-summary'),
+                        help='Batch mode: the path (without extension) of the JSON/CSV summary, '
+                             'default is output/batch-summary.')
     raw_command_line = ' '.join(sys.argv)
     args = parser.parse_args()
     return args, raw_command_line
@@ -33,6 +64,14 @@ def parse_args():
 if __name__ == "__main__":
     args, raw_command_line = parse_args()
 
+    if args.batch_root is not None:
+        from toolset.batch_run import run_batch
+        run_batch(args.batch_root, args.batch_jobs, timeout=args.timeout, memory_limit=args.memory_limit,
+                  state_backend=CacheStateBackend[args.state_backend.upper()], jobs=args.jobs,
+                  summary_path=args.summary, use_frontend_cache=not args.no_cache,
+                  gen_procedure_cfg=args.gen_procedure_cfg, skip_user_plt=args.skip_user_plt)
+        sys.exit(0)
+
     tb_config = read_config(args.tbpath, gen_procedure_cfg=args.gen_procedure_cfg, skip_user_plt=args.skip_user_plt)
     logger = Logger(verbose=args.verbose)
 
@@ -46,5 +85,8 @@ if __name__ == "__main__":
     end2end_run(
         config=tb_config,
         logger=logger,
-        command=raw_command_line
+        command=raw_command_line,
+        state_backend=CacheStateBackend[args.state_backend.upper()],
+        jobs=args.jobs,
+        use_frontend_cache=not args.no_cache
     )
@@ -1,4 +1,5 @@
 import copy
+import itertools
 from collections import defaultdict
 from typing import List, Dict, Hashable, Optional, Set
 import json
@@ -9,6 +10,7 @@ from src.cache.memory_block import MemoryBlock
 from src.cfg import *
 from src.cache.constants import CacheHierarchy, RefType, CacheAnalysisMethod, CHMC
 from src.cache.fixpoint import Fixpoint, FixpointState
+from src.cache.scheduler import FixpointWorkerPool
 from src.cache.cache_config import CacheConfig, MultiLevelCacheConfig
 from src.cache.memory_ref import Reference
 from src.isa import Instruction
@@ -17,6 +19,134 @@ INST_CHMC = Tuple[CacheHierarchy, CHMC]
 DATA_CHMC = Tuple[CacheHierarchy, CHMC]
 
 
+def instruction_execution_counts(target_range: Tuple[int, int], intervals: List[dict[str, int]]) -> List[int]:
+    """
+    计算 target_range 中每条指令的执行次数，第 i 个元素对应地址 target_range[0] + 4 * i。
+
+    每个执行区间只在差分数组中修改两个端点，再对差分数组求一次前缀和（即按地址顺序扫描所有区间端点），
+    时间复杂度为 O(指令数 + 区间数)。区间端点不必与指令地址对齐，区间内第一条、最后一条指令分别向上、向下取整。
+    """
+    start, end = target_range
+    inst_number = max(0, (end - start) // 4 + 1)
+    diff = [0] * (inst_number + 1)
+    for interval in intervals:
+        first = max(0, -((start - interval['start_address']) // 4))
+        last = min(inst_number - 1, (interval['end_address'] - start) // 4)
+        if first <= last:
+            diff[first] += interval['execution_count']
+            diff[last + 1] -= interval['execution_count']
+    return list(itertools.accumulate(diff[:inst_number]))
+
+
+def estimate_cache_misses(target_range: Tuple[int, int], exec_counts: List[int],
+                          L1I_inst_chmc: Dict[int, float | str],
+                          L1D_inst_chmc: Dict[int, float | str]) -> Dict[str, float]:
+    """
+    根据每条指令的执行次数与分类结果估计 L1I、L1D 的 cache misses。
+
+    参数:
+        exec_counts: ``instruction_execution_counts`` 的结果
+        L1I_inst_chmc, L1D_inst_chmc: 指令地址（整数） -> CHMC 名称或者命中概率
+    """
+    start = target_range[0]
+
+    # ================================= 分类L1I======================================
+    L1_icache_loads = 0
+    for i, count in enumerate(exec_counts):  # 计算 L1I 加载指令的数量
+        if start + 4 * i in L1I_inst_chmc:
+            L1_icache_loads += count
+
+    L1_icache_misses = 0
+    L1_icache_misses_noNC = 0
+    block_begin = 0
+    while block_begin < len(exec_counts):
+        # Step 1: 当前内存块（cache_address = addr >> 6）中的指令为 [block_begin, block_end)
+        next_block_addr = (((start + 4 * block_begin) >> 6) + 1) << 6
+        block_end = min(len(exec_counts), -((start - next_block_addr) // 4))
+
+        current_category = L1I_inst_chmc[start + 4 * block_begin]
+        current_exec_count = exec_counts[block_begin]
+        current_miss = 0
+        current_miss_noNC = 0
+        # 处理 mb 的第一个指令
+        if current_category == 'AH':
+            pass
+        elif current_category == 'AM':
+            current_miss += current_exec_count
+            current_miss_noNC += current_exec_count
+        elif current_category == 'PS':
+            current_miss += 1
+            current_miss_noNC += current_exec_count
+        else:
+            current_miss += current_exec_count * (1 - current_category)
+            current_miss_noNC += current_exec_count
+
+        # Step 2: 找到分类和执行次数相同的连续指令地址
+        for i in range(block_begin + 1, block_end):
+            category, exec_count = L1I_inst_chmc[start + 4 * i], exec_counts[i]
+            # 如果分类和执行次数不同，则结束当前连续地址的计算
+            if category != current_category or exec_count != current_exec_count:
+                # 累加之前连续地址的 cost
+                if category == 'AH':
+                    pass
+                elif category == 'AM':
+                    current_miss += exec_count
+                    current_miss_noNC += exec_count
+                elif category == 'PS':
+                    current_miss += 1
+                    current_miss_noNC += 1
+                else:
+                    current_miss += exec_count * (1 - category)
+                    current_miss_noNC += exec_count
+                # 更新为新的地址块
+                current_category, current_exec_count = category, exec_count
+
+        # Step 3: 累加每个 cache block 的计算结果
+        L1_icache_misses += current_miss
+        L1_icache_misses_noNC += current_miss_noNC
+        block_begin = block_end
+
+    L1_icache_rate = L1_icache_misses / L1_icache_loads
+    L1_icache_rate_noNC = L1_icache_misses_noNC / L1_icache_loads
+
+    # ================================= 分类L1D ================================================
+    L1_dcache_loads = 0
+    L1_dcache_misses = 0
+    L1_dcache_misses_noNC = 0
+    for i, count in enumerate(exec_counts):
+        category = L1D_inst_chmc.get(start + 4 * i)
+        if category is None:
+            continue
+        L1_dcache_loads += count
+        if category == 'AM':
+            L1_dcache_misses += count
+            L1_dcache_misses_noNC += count
+        elif category == 'PS':
+            L1_dcache_misses += 1
+            L1_dcache_misses_noNC += 1
+        elif category == 'AH':
+            pass
+        else:
+            L1_dcache_misses += count * (1 - category)
+            L1_dcache_misses_noNC += count
+
+    L1_dcache_rate = L1_dcache_misses / L1_dcache_loads
+    L1_dcache_rate_noNC = L1_dcache_misses_noNC / L1_dcache_loads
+
+    return {
+        "L1_icache_loads": L1_icache_loads,
+        "L1_icache_misses": L1_icache_misses,
+        "L1_icache_rate": L1_icache_rate,
+        "L1_icache_misses_noNC": L1_icache_misses_noNC,
+        "L1_icache_rate_noNC": L1_icache_rate_noNC,
+        "L1_dcache_loads": L1_dcache_loads,
+        "L1_dcache_misses": L1_dcache_misses,
+        "L1_dcache_rate": L1_dcache_rate,
+        "L1_dcache_misses_noNC": L1_dcache_misses_noNC,
+        "L1_dcache_rate_noNC": L1_dcache_rate_noNC
+    }
+
+
 class CacheAnalyser:
     def __init__(self, cfg: InnerProcCFG, cache_config: MultiLevelCacheConfig,
                  proc_inst_ref: Dict[Procedure, Dict[Hashable, Dict[Instruction, Reference]]],
@@ -24,7 +154,8 @@ class CacheAnalyser:
                  related_procs: Set[Procedure],
                  regular_loops: Set[InnerProcLoop],
                  debug_path: str,
-                 debug: bool) -> None:
+                 debug: bool,
+                 jobs: int = 1) -> None:
 
         self.__cache_config = cache_config
         self.__cfg = cfg
@@ -32,6 +163,17 @@ class CacheAnalyser:
         self.__regular_loops: Set[InnerProcLoop] = regular_loops
         self.__debug_path: str = debug_path
         self.__debug: bool = debug
+        self.__jobs: int = jobs  # 函数级不动点迭代使用的进程数，1 表示顺序执行
+
+        " 并行执行时使用的进程池、函数序号，以及由工作进程传回的边界结点的 out_state "
+        self.__pool: Optional[FixpointWorkerPool] = None
+        self.__proc_index: Dict[Procedure, int] = dict()
+        self.__boundary_states: Dict[Procedure, Dict[Hashable, MultiLevelCacheState]] = dict()
+
+        " 过程摘要的命中与未命中次数 "
+        self.__summary_hits: int = 0
+        self.__summary_misses: int = 0
+        self.__iteration_count: int = 0  # 函数间不动点迭代的轮数
 
         self.__proc_access_order: Dict[Procedure, Dict[Hashable, List[Set[Reference]]]] = defaultdict(dict)
         self.__proc_inst_ref: Dict[Procedure, Dict[Hashable, Dict[Instruction, Reference]]] = proc_inst_ref
@@ -75,6 +217,20 @@ class CacheAnalyser:
     def proc_inst_chmc(self):
         return self.__proc_inst_chmc
 
+    @property
+    def iteration_count(self) -> int:
+        return self.__iteration_count
+
+    def chmc_statistics(self) -> Dict[str, int]:
+        """ 统计所有指令、数据访问在各级 Cache 上的分类结果的数目，NC 的分类结果为概率，统一计为 NC。 """
+        statistics = {chmc.name: 0 for chmc in CHMC}
+        for proc_chmc in (self.__proc_inst_chmc, self.__proc_data_chmc):
+            for addr_chmc in proc_chmc.values():
+                for chmc_list in addr_chmc.values():
+                    for _, chmc in chmc_list:
+                        statistics[CHMC.NC.name if isinstance(chmc, float) else chmc.name] += 1
+        return statistics
+
     def kahn_topological_sort(self):
         """
         self.call_proc = []  # 某函数调用函数的列表
@@ -152,9 +308,136 @@ class CacheAnalyser:
                                 blocks.update(pre_blocks)
                                 self.__proc_PS_blocks[proc][node.name][level] = blocks
 
+    def topological_levels(self, sorted_functions: List[Procedure]) -> List[List[Procedure]]:
+        """
+        将 sorted_functions 划分为若干层，同一层中的函数之间没有调用关系，可以并行地进行不动点迭代。
+
+        每个函数的层数比所有与它有调用关系、且在 sorted_functions 中排在它之前的函数都大，
+        因此按层执行时，每个函数读到的 caller / callee 的状态与按 sorted_functions 顺序执行时相同（包括存在递归的情况）。
+        """
+        position = {function: idx for idx, function in enumerate(sorted_functions)}
+        level: Dict[Procedure, int] = dict()
+        levels: List[List[Procedure]] = []
+        for function in sorted_functions:
+            neighbours = [proc for proc in set(function.incoming_proc) | set(function.outgoing_proc)
+                          if proc in position and position[proc] < position[function]]
+            level[function] = max((level[proc] + 1 for proc in neighbours), default=0)
+            if level[function] == len(levels):
+                levels.append([])
+            levels[level[function]].append(function)
+        return levels
+
+    def __out_state(self, function: Procedure, node_name: Hashable) -> MultiLevelCacheState:
+        """ 获取 function 中结点的 out_state；并行执行时，边界结点的 out_state 由工作进程传回。 """
+        if function in self.__boundary_states and node_name in self.__boundary_states[function]:
+            return self.__boundary_states[function][node_name]
+        return self.__proc_fixpoint[function].state_map[node_name].out_state
+
+    def __entry_state(self, function: Procedure) -> Optional[MultiLevelCacheState]:
+        """ 其他函数的初始状态为caller nodes的out state的union。 """
+        # 获取本函数入口节点前的调用节点
+        caller_nodes: List[InnerProcNode] = []
+        for caller in function.incoming_proc:
+            for edge in caller.edges:
+                if edge.kind == InnerProcEdgeType.ProcCall and edge.dst.actual_node == function.entry_node:
+                    caller_nodes.append(edge.src)
+        # 获取调用节点的 out_state，Join 会生成新的状态，只有一个调用节点时才需要复制
+        caller_entry_states = []
+        for caller_node in caller_nodes:
+            base_proc = caller_node.base_proc
+            node_name = caller_node.name
+            if base_proc in self.__related_procs:  # 该函数可能被与main无关的函数调用，仅分析与main有关的函数
+                caller_entry_states.append(self.__out_state(base_proc, node_name))
+
+        # 确保在访问列表索引之前检查列表的长度
+        if not caller_entry_states:  # 处理空列表的情况，一般不会出现此情况
+            return None
+        elif len(caller_entry_states) == 1:  # 只有一个元素的情况
+            return copy.deepcopy(caller_entry_states[0])
+        else:  # 正常情况，使用 sum 计算
+            return sum(caller_entry_states[1:], start=caller_entry_states[0])
+
+    def __dummy_nodes_state(self, function: Procedure) -> Optional[Dict[Hashable, MultiLevelCacheState]]:
+        """ 获取本function调用函数后的节点，和调用函数的输出状态。 """
+        if not function.outgoing_proc:
+            return None
+        DummyNodes_State = defaultdict()
+        for edge in function.edges:
+            if edge.kind == InnerProcEdgeType.ProcReturn:
+                base_proc: Procedure = edge.src.actual_node.base_proc
+                exit_nodes = base_proc.exit_nodes
+                # 与main相关的函数outgoing_proc一定与main有关
+                callee_exit_states = [self.__out_state(base_proc, exit_node.name) for exit_node in exit_nodes]
+
+                if len(callee_exit_states) == 1:
+                    DummyNodes_State[edge.src.name] = copy.deepcopy(callee_exit_states[0])
+                else:
+                    DummyNodes_State[edge.src.name] = sum(callee_exit_states[1:],
+                                                          start=callee_exit_states[0])
+        return DummyNodes_State
+
+    def __run_fixpoints(self, functions: List[Procedure]):
+        """ 对同一层中需要重新迭代的函数进行不动点迭代，使用各函数当前的 entry_state 和 dummyNodes_state。 """
+        if self.__pool is None:
+            for function in functions:
+                if self.__debug:
+                    name = function.name + "-before "
+                    memory_usage(self.__debug_path, name)
+                reused = self.__proc_fixpoint[function].do_analysis(self.__proc_access_order[function],
+                                                                    EntryState=function.entry_state,
+                                                                    DummyNodes_State=function.dummyNodes_state)
+                self.__count_summary(reused)
+                if self.__debug:
+                    name = function.name + "-after "
+                    memory_usage(self.__debug_path, name)
+        else:
+            results = self.__pool.run([(self.__proc_index[function], function.entry_state, function.dummyNodes_state)
+                                       for function in functions])
+            for function in functions:
+                reused, self.__boundary_states[function] = results[self.__proc_index[function]]
+                self.__count_summary(reused)
+
+    def __count_summary(self, reused: bool):
+        if reused:
+            self.__summary_hits += 1
+        else:
+            self.__summary_misses += 1
+
     def do_analysis(self):
         # 对调用关系排序
         sorted_functions = self.kahn_topological_sort()
+        if self.__jobs <= 1 or len(sorted_functions) <= 1:
+            self.__iterate([[function] for function in sorted_functions])
+        else:
+            self.__parallel_iterate(sorted_functions)
+
+        if self.__debug:
+            with open(self.__debug_path + "/fixpoint_time.txt", 'a') as file:
+                file.write("\nprocedure summary: " + str(self.__summary_hits) + " hits, "
+                           + str(self.__summary_misses) + " misses\n")
+
+    def __parallel_iterate(self, sorted_functions: List[Procedure]):
+
+        " 同一层中的函数在多个进程中并行迭代，函数的 state_map 保存在工作进程中，结束后统一取回 "
+        self.__proc_index = {function: idx for idx, function in enumerate(sorted_functions)}
+        boundary_nodes = [{exit_node.name for exit_node in function.exit_nodes} |
+                          {edge.src.name for edge in function.edges if edge.kind == InnerProcEdgeType.ProcCall}
+                          for function in sorted_functions]
+        with FixpointWorkerPool([self.__proc_fixpoint[function] for function in sorted_functions],
+                                [self.__proc_access_order[function] for function in sorted_functions],
+                                boundary_nodes, self.__jobs) as pool:
+            self.__pool = pool
+            try:
+                self.__iterate(self.topological_levels(sorted_functions))
+                state_maps = pool.collect()
+            finally:
+                self.__pool = None
+        for function, idx in self.__proc_index.items():
+            self.__proc_fixpoint[function].state_map = state_maps[idx]
+        self.__boundary_states.clear()
+
+    def __iterate(self, levels: List[List[Procedure]]):
+        """ 按层对函数进行不动点迭代，每一层中的函数只依赖之前各层的结果。 """
         max_iterations = 10  # Set a limit to prevent infinite loops
         iteration_count = 0
         fixed = False
@@ -164,6 +447,7 @@ class CacheAnalyser:
             """ 先对整体（不包含loop）进行不动点迭代。 状态不变，或者达到规定次数的情况下停止循环 """
             fixed = True
             iteration_count += 1
+            self.__iteration_count = iteration_count
             print("[" + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "]", end=' ')
             print("iteration_count:", iteration_count)
 
@@ -173,94 +457,43 @@ class CacheAnalyser:
                     file.write(name + "\n")
                 memory_usage(self.__debug_path, name)
 
-            for function in sorted_functions:
+            for level in levels:
                 " 设置初始状态EntryState，main函数初始状态为空；其他函数的初始状态为caller nodes的out state的union。 "
-                if function.name == "main":
-                    EntryState = None
-                    main_checked += 1
-                else:
-                    # 获取本函数入口节点前的调用节点
-                    caller_nodes: List[InnerProcNode] = []
-                    for caller in function.incoming_proc:
-                        for edge in caller.edges:
-                            if edge.kind == InnerProcEdgeType.ProcCall and edge.dst.actual_node == function.entry_node:
-                                caller_nodes.append(edge.src)
-                    # 获取调用节点的 out_state
-                    caller_entry_states = []
-                    for caller_node in caller_nodes:
-                        base_proc = caller_node.base_proc
-                        node_name = caller_node.name
-                        if base_proc in self.__related_procs:  # 该函数可能被与main无关的函数调用，仅分析与main有关的函数
-                            caller_state = copy.deepcopy(self.__proc_fixpoint[base_proc].state_map[node_name].out_state)
-                            caller_entry_states.append(caller_state)
-
-                    # 确保在访问列表索引之前检查列表的长度
-                    if not caller_entry_states:  # 处理空列表的情况，一般不会出现此情况
-                        EntryState = None  #
-                    elif len(caller_entry_states) == 1:  # 只有一个元素的情况
-                        EntryState = caller_entry_states[0]
-                    else:  # 正常情况，使用 sum 计算
-                        EntryState = sum(caller_entry_states[1:], start=caller_entry_states[0])
-
-                if isinstance(function.entry_state,
-                              type(EntryState)) and function.entry_state == EntryState and main_checked > 1:
-                    # print("FIX IN:", function.name)
-                    pass
-                else:
-                    " 如果入口节点传入的状态fixed，则无需再迭代 "
-                    function.entry_state = EntryState  # 保留函数入口节点的State，后续迭代时需要继续使用
-                    # 将 caller 调用节点的抽象状态传递给 callee 的入口节点，作为 callee 的初始状态。
-                    if self.__debug:
-                        name = function.name + "-before "
-                        memory_usage(self.__debug_path, name)
-                    self.__proc_fixpoint[function].do_analysis(self.__proc_access_order[function],
-                                                               EntryState=function.entry_state,
-                                                               DummyNodes_State=function.dummyNodes_state)
-                    if self.__debug:
-                        name = function.name + "-after "
-                        memory_usage(self.__debug_path, name)
+                " 同一层的函数先全部计算好 EntryState，再进行迭代。 "
+                to_analyse = []
+                for function in level:
+                    if function.name == "main":
+                        EntryState = None
+                        main_checked += 1
+                    else:
+                        EntryState = self.__entry_state(function)
 
-            for function in sorted_functions:
+                    if isinstance(function.entry_state,
+                                  type(EntryState)) and function.entry_state == EntryState and main_checked > 1:
+                        # print("FIX IN:", function.name)
+                        pass
+                    else:
+                        " 如果入口节点传入的状态fixed，则无需再迭代 "
+                        function.entry_state = EntryState  # 保留函数入口节点的State，后续迭代时需要继续使用
+                        # 将 caller 调用节点的抽象状态传递给 callee 的入口节点，作为 callee 的初始状态。
+                        to_analyse.append(function)
+                self.__run_fixpoints(to_analyse)
+
+            for level in levels:
                 " 将 callee 的出口状态递回 caller 函数调用后的节点，并对其进行更新。"
-                if not function.outgoing_proc:
-                    DummyNodes_State = None
-                else:
-                    # 若它调用过其他函数，获取本function调用函数后的节点，和调用函数的输出状态
-                    DummyNodes_State = defaultdict()
-                    for edge in function.edges:
-                        if edge.kind == InnerProcEdgeType.ProcReturn:
-                            base_proc: Procedure = edge.src.actual_node.base_proc
-                            exit_nodes = base_proc.exit_nodes
-                            callee_exit_states = []
-                            # 与main相关的函数outgoing_proc一定与main有关
-                            for exit_node in exit_nodes:
-                                callee_state = copy.deepcopy(
-                                    self.__proc_fixpoint[base_proc].state_map[exit_node.name].out_state)
-                                callee_exit_states.append(callee_state)
-
-                            if len(callee_exit_states) == 1:
-                                DummyNodes_State[edge.src.name] = callee_exit_states[0]
-                            else:
-                                DummyNodes_State[edge.src.name] = sum(callee_exit_states[1:],
-                                                                      start=callee_exit_states[0])
-
-                if isinstance(function.dummyNodes_state,
-                              type(DummyNodes_State)) and function.dummyNodes_state == DummyNodes_State:
-                    # print("FIX OUT:", function.name)
-                    pass
-                else:
-                    fixed = False
-                    function.dummyNodes_state = DummyNodes_State
-                    # 将 callee 的出口状态传递回 caller 函数调用之后的节点。
-                    if self.__debug:
-                        name = function.name + "-before "
-                        memory_usage(self.__debug_path, name)
-                    self.__proc_fixpoint[function].do_analysis(self.__proc_access_order[function],
-                                                               EntryState=function.entry_state,
-                                                               DummyNodes_State=function.dummyNodes_state)
-                    if self.__debug:
-                        name = function.name + "-after "
-                        memory_usage(self.__debug_path, name)
+                to_analyse = []
+                for function in level:
+                    DummyNodes_State = self.__dummy_nodes_state(function)
+                    if isinstance(function.dummyNodes_state,
+                                  type(DummyNodes_State)) and function.dummyNodes_state == DummyNodes_State:
+                        # print("FIX OUT:", function.name)
+                        pass
+                    else:
+                        fixed = False
+                        function.dummyNodes_state = DummyNodes_State
+                        # 将 callee 的出口状态传递回 caller 函数调用之后的节点。
+                        to_analyse.append(function)
+                self.__run_fixpoints(to_analyse)
 
     def persistent_analysis(self):
         for function in self.__related_procs:
@@ -398,166 +631,36 @@ class CacheAnalyser:
                                     ]
                             self.__proc_data_chmc[proc][inst.addr.hex_str()] = chmc
 
-    def Statistical(self, target_range: Tuple[int, int], execution_intervals: List[dict[str, int]], output_dir):
-        def get_inst_number(addr_range: Tuple[int, int], intervals: List[dict[str, int]]) -> Dict[str, int]:
-            """ 首先计算每条指令的执行次数, 在计算 cache misses数量 """
-            instruction_execution_counts: Dict[str, int] = {}  # 字典：存储每条指令的执行次数
-            # 遍历目标指令地址范围
-            for addr in range(addr_range[0], addr_range[1] + 1, 4):
-                # 初始化每条指令的执行次数为 0
-                hex_str = hex(addr)[2:]
-                instruction_execution_counts[hex_str] = 0
-                # 遍历每个执行区间
-                for interval in intervals:
-                    interval_start = interval['start_address']
-                    interval_end = interval['end_address']
-                    execution_count = interval['execution_count']
-                    # 如果当前指令在当前区间范围内
-                    if interval_start <= addr <= interval_end:
-                        # 将该区间的执行次数加到指令的执行次数中
-                        instruction_execution_counts[hex_str] += execution_count
-            return instruction_execution_counts
-
-        def group_addresses_by_cache_block(addresses: Tuple[int, int]) -> Dict[int, list[int]]:
-            """ 将地址按照 cache_address 进行划分 """
-            cache_blocks: Dict[int, list[int]] = {}
-            # Step 1: 将地址按照 cache_address 进行划分
-            for addr in range(addresses[0], addresses[1] + 1, 4):
-                cache_address = addr >> 6
-                if cache_address not in cache_blocks:
-                    cache_blocks[cache_address] = []
-                cache_blocks[cache_address].append(addr)
-            return cache_blocks
-
-        # ==============================================================================
-        inst_number = get_inst_number(target_range, execution_intervals)
-        # ================================= 分类L1I======================================
-        L1_icache_loads = 0
-        L1I_inst_chmc: Dict[Hashable, float | str] = {}
+    def level_chmc(self, proc_chmc: Dict[Procedure, Dict[Hashable, List[INST_CHMC]]],
+                   level: CacheHierarchy) -> Dict[int, float | str]:
+        """ 所有相关函数中每条指令在 level 上的分类结果，键为整数形式的指令地址 """
+        level_chmc: Dict[int, float | str] = {}
         for proc in self.__related_procs:
-            for inst_addr, inst_chmc in self.__proc_inst_chmc[proc].items():
+            for inst_addr, inst_chmc in proc_chmc[proc].items():
                 for cache_level, chmc in inst_chmc:
-                    if cache_level == CacheHierarchy.L1I:
-                        L1I_inst_chmc[inst_addr] = chmc if isinstance(chmc, float) else chmc.name
-        L1I_inst_chmc = dict(sorted(L1I_inst_chmc.items()))
-
-        for address in range(target_range[0], target_range[1] + 1, 4):  # 计算 L1I 加载指令的数量
-            hex_str_no_prefix = hex(address)[2:]
-            if hex_str_no_prefix in L1I_inst_chmc and hex_str_no_prefix in inst_number:
-                L1_icache_loads += inst_number[hex_str_no_prefix]
-
-        # Step 1: 将地址按照 cache_address 进行划分
-        mb_list = group_addresses_by_cache_block(target_range)
-
-        # Step 2: 遍历每个内存块中的地址
-        L1_icache_misses = 0
-        L1_icache_misses_noNC = 0
-        for cache_address, inst_addrs in mb_list.items():
-            inst_addrs.sort()  # 保证地址是连续的顺序
-            start_addr = hex(inst_addrs[0])[2:]  # 16进制无前缀
-            current_category = L1I_inst_chmc[start_addr]
-            current_exec_count = inst_number[start_addr]
-            current_miss = 0
-            current_miss_noNC = 0
-            # 处理 mb 的第一个指令
-            if current_category == 'AH':
-                pass
-            elif current_category == 'AM':
-                current_miss += current_exec_count
-                current_miss_noNC += current_exec_count
-            elif current_category == 'PS':
-                current_miss += 1
-                current_miss_noNC += current_exec_count
-            else:
-                current_miss += current_exec_count * (1 - current_category)
-                current_miss_noNC += current_exec_count
-
-            # Step 3: 找到分类和执行次数相同的连续指令地址
-            for i in range(1, len(inst_addrs)):
-                addr = hex(inst_addrs[i])[2:]
-                # 如果分类和执行次数不同，则结束当前连续地址的计算
-                if L1I_inst_chmc[addr] != current_category or inst_number[addr] != current_exec_count:
-                    # 累加之前连续地址的 cost
-                    if L1I_inst_chmc[addr] == 'AH':
-                        pass
-                    elif L1I_inst_chmc[addr] == 'AM':
-                        current_miss += inst_number[addr]
-                        current_miss_noNC += inst_number[addr]
-                    elif L1I_inst_chmc[addr] == 'PS':
-                        current_miss += 1
-                        current_miss_noNC += 1
-                    else:
-                        current_miss += inst_number[addr] * (1 - L1I_inst_chmc[addr])
-                        current_miss_noNC += inst_number[addr]
-                    # 更新为新的地址块
-                    start_addr = addr
-                    current_category = L1I_inst_chmc[start_addr]
-                    current_exec_count = inst_number[start_addr]
-
-            # Step 4: 累加每个 cache block 的计算结果
-            L1_icache_misses += current_miss
-            L1_icache_misses_noNC += current_miss_noNC
-
-        L1_icache_rate = L1_icache_misses / L1_icache_loads
-        L1_icache_rate_noNC = L1_icache_misses_noNC / L1_icache_loads
-
-        print("L1_icache_loads:", L1_icache_loads)
-        print("L1_icache_misses:", L1_icache_misses)
-        print("L1i misses rate:", L1_icache_rate)
-        print("L1_icache_misses noNC", L1_icache_misses_noNC)
-        print("L1i misses rate noNC:", L1_icache_rate_noNC)
-
-        # ================================= 分类L1D ================================================
-        L1_dcache_loads = 0
-        L1_dcache_misses = 0
-        L1_dcache_misses_noNC = 0
-        L1D_inst_chmc: Dict[Hashable, float | str] = {}
-        for proc in self.__related_procs:
-            for inst_addr, data_chmc in self.__proc_data_chmc[proc].items():
-                for cache_level, chmc in data_chmc:
-                    if cache_level == CacheHierarchy.L1D:
-                        L1D_inst_chmc[inst_addr] = chmc if isinstance(chmc, float) else chmc.name
-        L1D_inst_chmc = dict(sorted(L1D_inst_chmc.items()))
-
-        for address in range(target_range[0], target_range[1] + 1, 4):  # 计算L1I加载指令的数量
-            hex_str_no_prefix = hex(address)[2:]
-            if hex_str_no_prefix in L1D_inst_chmc and hex_str_no_prefix in inst_number:
-                L1_dcache_loads += inst_number[hex_str_no_prefix]
-                if L1D_inst_chmc[hex_str_no_prefix] == 'AM':
-                    L1_dcache_misses += inst_number[hex_str_no_prefix]
-                    L1_dcache_misses_noNC += inst_number[hex_str_no_prefix]
-                elif L1D_inst_chmc[hex_str_no_prefix] == 'PS':
-                    L1_dcache_misses += 1
-                    L1_dcache_misses_noNC += 1
-                elif L1D_inst_chmc[hex_str_no_prefix] == 'AH':
-                    pass
-                else:
-                    L1_dcache_misses += inst_number[hex_str_no_prefix] * (1 - L1D_inst_chmc[hex_str_no_prefix])
-                    L1_dcache_misses_noNC += inst_number[hex_str_no_prefix]
-
-        L1_dcache_rate = L1_dcache_misses / L1_dcache_loads
-        L1_dcache_rate_noNC = L1_dcache_misses_noNC / L1_dcache_loads
-
-        # print("L1_dcache_loads:", L1_dcache_loads)
-        print("L1_dcache_misses:", L1_dcache_misses)
-        print("L1_dcache_rate:", L1_dcache_rate)
-        print("L1_dcache_misses noNC:", L1_dcache_misses_noNC)
-        print("L1_dcache_rate noNC:", L1_dcache_rate_noNC)
-
-        output_format = {
-            "CACHE_STATS": {
-                "L1_icache_loads": L1_icache_loads,
-                "L1_icache_misses": L1_icache_misses,
-                "L1_icache_rate": L1_icache_rate,
-                "L1_icache_misses_noNC": L1_icache_misses_noNC,
-                "L1_icache_rate_noNC": L1_icache_rate_noNC,
-                "L1_dcache_loads": L1_dcache_loads,
-                "L1_dcache_misses": L1_dcache_misses,
-                "L1_dcache_rate": L1_dcache_rate,
-                "L1_dcache_misses_noNC": L1_dcache_misses_noNC,
-                "L1_dcache_rate_noNC": L1_dcache_rate_noNC
-            }
-        }
+                    if cache_level == level:
+                        level_chmc[int(inst_addr, 16)] = chmc if isinstance(chmc, float) else chmc.name
+        return level_chmc
+
+    def Statistical(self, target_range: Tuple[int, int], execution_intervals: List[dict[str, int]], output_dir):
+        " 首先计算每条指令的执行次数, 再计算 cache misses数量 "
+        exec_counts = instruction_execution_counts(target_range, execution_intervals)
+        stats = estimate_cache_misses(target_range, exec_counts,
+                                      self.level_chmc(self.__proc_inst_chmc, CacheHierarchy.L1I),
+                                      self.level_chmc(self.__proc_data_chmc, CacheHierarchy.L1D))
+
+        print("L1_icache_loads:", stats["L1_icache_loads"])
+        print("L1_icache_misses:", stats["L1_icache_misses"])
+        print("L1i misses rate:", stats["L1_icache_rate"])
+        print("L1_icache_misses noNC", stats["L1_icache_misses_noNC"])
+        print("L1i misses rate noNC:", stats["L1_icache_rate_noNC"])
+
+        print("L1_dcache_misses:", stats["L1_dcache_misses"])
+        print("L1_dcache_rate:", stats["L1_dcache_rate"])
+        print("L1_dcache_misses noNC:", stats["L1_dcache_misses_noNC"])
+        print("L1_dcache_rate noNC:", stats["L1_dcache_rate_noNC"])
+
+        output_format = {"CACHE_STATS": stats}
         with open(output_dir, 'a') as file:
             json.dump(output_format, file, indent=1)
 
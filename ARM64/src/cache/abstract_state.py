@@ -1,9 +1,14 @@
+import os
+import itertools
 import warnings
+import weakref
 from copy import deepcopy
-from typing import Set, Union, Dict, List, Optional
+from typing import Set, Union, Dict, List, Optional, Iterable, Tuple
+
+import numpy as np
 
 from src.cache.cache_config import CacheConfig, MultiLevelCacheConfig
-from src.cache.constants import CacheAnalysisMethod, CacheHierarchy, CAC, CHMC, RefType
+from src.cache.constants import CacheAnalysisMethod, CacheHierarchy, CacheStateBackend, CAC, CHMC, RefType
 from src.cache.memory_block import *
 from src.cache.memory_ref import Reference
 
@@ -32,16 +37,47 @@ class CacheState:
                                  CacheAnalysisMethod.SCOPE_AWARE}:
             raise ValueError("Unsupported sim type {}.".format(analysis_type))
         self.__analysis_type = analysis_type
-        self.__states = [dict() for _ in range(cache_config.set_number)]
         self.__associativity = cache_config.associativity
         self.__cache_level = cache_config.cache_level
         self.__PO: Set[MemoryBlock] = set()
 
+        """
+        Set State 按照 set 的粒度进行写时复制（copy-on-write）：拷贝得到的 Cache State 与原状态共享所有的 Set State，
+        只有在某个 set 第一次被写入时才会复制该 set 对应的字典。 ``__owned`` 记录了当前实例独占（可以直接写入）的 set 下标。
+
+        ``__dirty`` 记录了自上一次 ``reset_dirty()`` 以来可能发生变化（被写入或者被 Join 重新计算）的 set 下标，
+        不在其中的 set 一定与上一次 ``reset_dirty()`` 时的内容相同。拷贝会保留该记录。
+        """
+        self.__states: List[SetAbsState] = []
+        self.__owned: Set[int] = set()
+        self.__dirty: Set[int] = set()
+        self.clear()
+
     def clear(self):
         """ Clears the state of the cache. This method resets all the states in the cache to an empty dictionary. """
-        self.__states = [dict() for _ in range(self.__cache_config.set_number)]
+        # 所有的 set 共享同一个空字典，写入时再各自复制
+        empty_set_state: SetAbsState = dict()
+        self.__states = [empty_set_state] * self.__cache_config.set_number
+        self.__owned = set()
+        self.__dirty = set()
         self.__PO = set()
 
+    def __writable_set(self, set_index: int) -> SetAbsState:
+        """ 私有方法。返回下标为 ``set_index`` 的 Set State 用于写入，如果该 set 与其他实例共享，则先复制一份。 """
+        if set_index not in self.__owned:
+            self.__states[set_index] = self.__states[set_index].copy()
+            self.__owned.add(set_index)
+        self.__dirty.add(set_index)
+        return self.__states[set_index]
+
+    @property
+    def dirty_sets(self) -> Set[int]:
+        """ 自上一次 ``reset_dirty()`` 以来可能发生变化的 set 下标。 """
+        return self.__dirty
+
+    def reset_dirty(self):
+        self.__dirty = set()
+
     @property
     def cache_config(self) -> CacheConfig:
         return self.__cache_config
@@ -100,11 +136,11 @@ class CacheState:
         return True if mb in in_cache_blocks else False
 
     def remove_block(self, mb: MemoryBlock):
-        self.__states[mb.set_index].pop(mb.tag)
+        self.__writable_set(mb.set_index).pop(mb.tag)
 
     def set_age(self, age, mb: MemoryBlock):
         """ 暂时只用于PERSISTENT中 """
-        self.__states[mb.set_index][mb.tag] = age
+        self.__writable_set(mb.set_index)[mb.tag] = age
 
     def get_age(self, mb: MemoryBlock):
         return self.__states[mb.set_index][mb.tag]
@@ -117,11 +153,11 @@ class CacheState:
         如果 ``remove_evicted == True``，那么方法最后会调用 ``__remove_evicted()`` 方法检查所有的内存块，并将被驱逐的内存块删除。
         """
 
-        for mem_block, rel_age in self.__states[set_index].items():
-            if rel_age >= cmp_rel_age:
-                continue
-            """ 内存块的年龄最大不会超过 SetState.associativity + 1，当等于时，说明该内存块被驱逐。 """
-            self.__states[set_index][mem_block] = min(self.__associativity, rel_age) + 1
+        """ 内存块的年龄最大不会超过 SetState.associativity + 1，当等于时，说明该内存块被驱逐。 """
+        aged = {mem_block: min(self.__associativity, rel_age) + 1
+                for mem_block, rel_age in self.__states[set_index].items() if rel_age < cmp_rel_age}
+        if aged:
+            self.__writable_set(set_index).update(aged)
 
         if remove_evicted:
             self.__remove_evicted(set_index)
@@ -134,19 +170,21 @@ class CacheState:
         如果 ``remove_evicted == True``，那么方法最后会调用 ``__remove_evicted()`` 方法检查所有的内存块，并将被驱逐的内存块删除。
         """
 
-        for mem_block, rel_age in self.__states[set_index].items():
-            if rel_age > cmp_rel_age:
-                continue
-            """ 内存块的年龄最大不会超过 SetState.associativity+1，当等于时，说明该内存块被驱逐。 """
-            self.__states[set_index][mem_block] = min(self.__associativity, rel_age) + 1
+        """ 内存块的年龄最大不会超过 SetState.associativity+1，当等于时，说明该内存块被驱逐。 """
+        aged = {mem_block: min(self.__associativity, rel_age) + 1
+                for mem_block, rel_age in self.__states[set_index].items() if rel_age <= cmp_rel_age}
+        if aged:
+            self.__writable_set(set_index).update(aged)
         if remove_evicted:
             self.__remove_evicted(set_index)
 
     def __remove_evicted(self, set_index) -> None:
         """ 私有方法。该方法检查所有的内存块，并将被驱逐的内存块删除。 """
-        for mem_block, rel_age in tuple(self.__states[set_index].items()):
-            if rel_age > self.__associativity:
-                self.__states[set_index].pop(mem_block)
+        evicted = [mem_block for mem_block, rel_age in self.__states[set_index].items() if rel_age > self.__associativity]
+        if evicted:
+            set_state = self.__writable_set(set_index)
+            for mem_block in evicted:
+                set_state.pop(mem_block)
 
     def updateL1(self, mem_block: MemoryBlock, min_age: Optional[int] = None):
         if not isinstance(mem_block, MemoryBlock):
@@ -169,7 +207,7 @@ class CacheState:
             """ 如果内存块m不在 Set State 中，那么将年龄设置为 SetState.associativity + 1，这样所有的内存块年龄都小于m """
             rel_age = self.__states[set_index].get(block_ident, self.associativity + 1)
             self.__add_relative_age_less(mem_block.set_index, rel_age, remove_evicted=True)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
         elif self.__analysis_type == CacheAnalysisMethod.MAY:
             """ May-sim:
@@ -189,11 +227,11 @@ class CacheState:
             rel_age = self.__states[set_index].get(block_ident, self.__associativity + 1)
             if min_age is None or rel_age <= min_age:
                 self.__add_relative_age_leq(mem_block.set_index, rel_age, remove_evicted=True)
-                self.__states[set_index][block_ident] = 1
+                self.__writable_set(set_index)[block_ident] = 1
             else:
                 """ 根据 'Precise Multi-Level Inclusive Cache Analysis for WCET Estimation' 的safe MAY Update实现"""
                 self.__add_relative_age_leq(mem_block.set_index, min_age, remove_evicted=True)
-                self.__states[set_index][block_ident] = 1
+                self.__writable_set(set_index)[block_ident] = 1
 
         elif self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
             """
@@ -207,7 +245,7 @@ class CacheState:
 
             rel_age = self.__states[set_index].get(block_ident, self.__associativity + 1)
             self.__add_relative_age_less(mem_block.set_index, rel_age, remove_evicted=False)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
     def updateL2(self, mem_block: MemoryBlock):
         if not isinstance(mem_block, MemoryBlock):
@@ -223,7 +261,7 @@ class CacheState:
             if last_blocks != set() and rel_age > self.associativity:
                 self.add_PO(last_blocks)
             self.__add_relative_age_less(mem_block.set_index, rel_age, remove_evicted=True)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
         elif self.__analysis_type == CacheAnalysisMethod.MAY:
             """ 如果内存块m不在 Set State 中，那么将年龄设置为 SetState.associativity + 1，这样所有的内存块年龄都小于等于m """
@@ -234,12 +272,12 @@ class CacheState:
             if last_blocks != set() and rel_age >= self.associativity:  # 只有L2需要获取驱逐块，min_age为空
                 self.add_PO(last_blocks)
             self.__add_relative_age_leq(mem_block.set_index, rel_age, remove_evicted=True)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
         elif self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
             rel_age = self.__states[set_index].get(block_ident, self.__associativity + 1)
             self.__add_relative_age_less(mem_block.set_index, rel_age, remove_evicted=False)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
     def updateU(self, mem_block: MemoryBlock, loop_level: int = -1, min_age: Optional[List[int]] = None):
         """
@@ -259,7 +297,7 @@ class CacheState:
             if rel_age > self.__associativity:  # must_state没有此内存块，更新(L1 AM)
                 if last_blocks != set():
                     self.add_PO(last_blocks)
-                self.__states[set_index][block_ident] = 1
+                self.__writable_set(set_index)[block_ident] = 1
             else:  # must_state有此内存块，合并must状态(L1 AH)，此时便不操作。
                 pass
 
@@ -267,13 +305,13 @@ class CacheState:
             # L1 MISS，继而访问L2(更新Block) | L1 Hit，不访问L2(L2中一定含有L1的block)
             # CAC=N， L1_MAY一定有此内存块，所以L2中也一定有
             self.reset_PO()
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
         elif self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
             rel_age = self.__states[set_index].get(block_ident, self.__associativity + 1)
             self.__add_relative_age_less(set_index, rel_age, remove_evicted=False)
             if rel_age == self.__associativity + 1:
-                self.__states[set_index][block_ident] = 1
+                self.__writable_set(set_index)[block_ident] = 1
             else:  # ps_state存在此内存块，合并ps状态(L1 Hit)，则保留并集(所以不存在驱逐集)和max age。
                 pass
 
@@ -293,12 +331,12 @@ class CacheState:
         if self.__analysis_type == CacheAnalysisMethod.MUST:
             rel_age = self.__states[set_index].get(block_ident, self.associativity + 1)
             self.__add_relative_age_less(mem_block.set_index, rel_age, remove_evicted=True)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
         elif self.__analysis_type == CacheAnalysisMethod.MAY:
             rel_age = self.__states[set_index].get(block_ident, self.__associativity + 1)
             self.__add_relative_age_leq(mem_block.set_index, rel_age, remove_evicted=True)
-            self.__states[set_index][block_ident] = 1
+            self.__writable_set(set_index)[block_ident] = 1
 
     def __add__(self, other):
         """ 不同分析方法的Join函数 """
@@ -316,45 +354,86 @@ class CacheState:
         other_state = other.__states
         new_cachestate = new_state.__states
 
+        """
+        对于两个操作数共享的（同一个对象的）Set State，任何一种 Join 的结果都与它相同，因此直接共享该 set，不计入新状态独占的 set，
+        并且两个操作数也都失去对该 set 的独占（与 ``__deepcopy__`` 相同），否则之后对操作数的原地写入会改变 Join 的结果；
+        其余的 set 由 Join 新建，归新状态独占。
+        """
+        joined_sets = [set_index for set_index in range(set_number) if self_state[set_index] is not other_state[set_index]]
+        for set_index in range(set_number):
+            new_cachestate[set_index] = self_state[set_index]
+        new_state.__owned = set(joined_sets)
+        shared_sets = set(range(set_number)).difference(joined_sets)
+        self.__owned -= shared_sets
+        other.__owned -= shared_sets
+
+        for set_index in joined_sets:
+            new_cachestate[set_index] = self.__join_set(self_state[set_index], other_state[set_index])
+        new_state.__dirty = self.__dirty | other.__dirty | new_state.__owned
+
+        return new_state
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __join_set(self, self_set_state: SetAbsState, other_set_state: SetAbsState) -> SetAbsState:
+        """ 私有方法。不同分析方法下单个 Set State 的 Join，返回新的字典。 """
         if self.__analysis_type == CacheAnalysisMethod.MUST:
-            for set_index in range(set_number):
-                self_set_state = self_state[set_index]
-                other_set_state = other_state[set_index]
-                intersection_keys = self_set_state.keys() & other_set_state.keys()
-                new_cachestate[set_index] = {
-                    ident: self_set_state[ident] if self_set_state[ident] > other_set_state[ident]
+            intersection_keys = self_set_state.keys() & other_set_state.keys()
+            return {ident: self_set_state[ident] if self_set_state[ident] > other_set_state[ident]
                     else other_set_state[ident]
                     for ident in intersection_keys}
 
         elif self.__analysis_type == CacheAnalysisMethod.MAY:
             default_age = self.__associativity + 1
-            for set_index in range(set_number):
-                self_set_state = self_state[set_index]
-                other_set_state = other_state[set_index]
-                union_keys = self_set_state.keys() | other_set_state.keys()
-                new_set_state = {}
-                for ident in union_keys:
-                    self_age = self_set_state.get(ident, default_age)
-                    other_age = other_set_state.get(ident, default_age)
-                    new_set_state[ident] = self_age if self_age < other_age else other_age
-                new_cachestate[set_index] = new_set_state
-
-        elif self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
-            for set_index in range(set_number):
-                self_set_state = self_state[set_index]
-                other_set_state = other_state[set_index]
-                union_keys = self_set_state.keys() | other_set_state.keys()
-                new_set_state = {}
-                for ident in union_keys:
-                    self_age = self_set_state.get(ident, 0)
-                    other_age = other_set_state.get(ident, 0)
-                    new_set_state[ident] = self_age if self_age > other_age else other_age
-                new_cachestate[set_index] = new_set_state
-
-        return new_state
+            new_set_state = {}
+            for ident in self_set_state.keys() | other_set_state.keys():
+                self_age = self_set_state.get(ident, default_age)
+                other_age = other_set_state.get(ident, default_age)
+                new_set_state[ident] = self_age if self_age < other_age else other_age
+            return new_set_state
+
+        else:  # PERSISTENT
+            new_set_state = {}
+            for ident in self_set_state.keys() | other_set_state.keys():
+                self_age = self_set_state.get(ident, 0)
+                other_age = other_set_state.get(ident, 0)
+                new_set_state[ident] = self_age if self_age > other_age else other_age
+            return new_set_state
+
+    def rejoin_sets(self, states: List['CacheState'], set_indexes: Iterable[int]) -> Set[int]:
+        """
+        将下标在 ``set_indexes`` 中的 set 重新计算为 ``states`` 中对应 set 的 Join 结果，其余的 set 保持不变。
 
-    def __radd__(self, other):
-        return self.__add__(other)
+        Returns:
+            内容确实发生了变化的 set 下标。
+        """
+        changed = set()
+        for set_index in set_indexes:
+            set_states = [state.__states[set_index] for state in states]
+            joined = set_states[0]
+            for set_state in set_states[1:]:
+                if set_state is not joined:
+                    joined = self.__join_set(joined, set_state)
+            if joined is not self.__states[set_index] and joined != self.__states[set_index]:
+                self.__states[set_index] = joined
+                # 如果 joined 直接取自某个操作数，那么它与该操作数共享，不能视为独占
+                if any(joined is set_state for set_state in set_states):
+                    self.__owned.discard(set_index)
+                else:
+                    self.__owned.add(set_index)
+                self.__dirty.add(set_index)
+                changed.add(set_index)
+        return changed
+
+    def changed_sets(self, other, set_indexes: Optional[Iterable[int]] = None) -> Set[int]:
+        """ 返回下标在 ``set_indexes`` （为 None 时为所有 set）中，与 ``other`` 内容不同的 set 下标。 """
+        if set_indexes is None:
+            set_indexes = range(len(self.__states))
+        self_states, other_states = self.__states, other.__states
+        return {set_index for set_index in set_indexes
+                if self_states[set_index] is not other_states[set_index]
+                and self_states[set_index] != other_states[set_index]}
 
     def get_set_lines(self, set_index: int, do_sort: bool = True) -> List[List[MemoryBlock]]:
         """
@@ -385,23 +464,477 @@ class CacheState:
 
     def __eq__(self, other) -> bool:
         for self_state, other_state in zip(self.__states, other.__states):
-            if self_state != other_state:
+            # 共享的 Set State 一定相同，无需逐项比较
+            if self_state is not other_state and self_state != other_state:
                 return False
         return True
 
+    def fingerprint(self) -> int:
+        """ 返回由所有 Set State 以及 PO 计算得到的哈希值，内容相同（``==`` 且 PO 相同）的 Cache State 的哈希值相同。 """
+        return hash((tuple([hash(frozenset(state.items())) for state in self.__states]), frozenset(self.__PO)))
+
     def __deepcopy__(self, memo=None):
+        if memo is None:
+            memo = {}
         if id(self) in memo:
             return memo[id(self)]
 
         new_state = CacheState(cache_config=self.__cache_config, analysis_type=self.__analysis_type)
 
-        # Here we can use Shallow Copy because Immutable Attributes
-        new_state.__states = [set_dict.copy() for set_dict in self.__states]
+        # 写时复制：拷贝只共享所有的 Set State，双方都失去对这些 set 的独占，之后各自在写入某个 set 时再复制该 set。
+        new_state.__states = self.__states.copy()
+        new_state.__dirty = self.__dirty.copy()
+        self.__owned = set()
 
         memo[id(self)] = new_state
         return new_state
 
 
+class TagColumns:
+    """
+    内存块 ``tag`` 到 ``ArrayCacheState`` 矩阵列下标的映射。
+
+    同一次分析中同一级 Cache 的所有 ``ArrayCacheState`` 共享同一个映射（由 ``MultiLevelCacheConfig.tag_columns`` 持有），
+    这样不同实例的矩阵的同一列总是对应同一个 ``tag`` ，Join 和比较时无需对齐。映射中的列只会增加，不会删除，
+    分析结束、配置被释放后映射随之释放，不会在批量运行中越积越多。
+
+    序列化时只保存映射的标识 ``token`` ：在同一进程或 fork 得到的子进程中反序列化时得到的仍是同一个映射。
+    """
+
+    __counter = itertools.count()
+
+    def __init__(self, token: Optional[Tuple[int, int]] = None) -> None:
+        self.__token = token if token is not None else (os.getpid(), next(TagColumns.__counter))
+        self.__columns: Dict[int, int] = dict()
+        self.__tags: List[int] = []
+        _tag_columns_registry[self.__token] = self
+
+    def __reduce__(self):
+        return _lookup_tag_columns, (self.__token,)
+
+    def get(self, tag: int) -> Optional[int]:
+        return self.__columns.get(tag, None)
+
+    def add(self, tag: int) -> int:
+        """ 返回 ``tag`` 对应的列下标，如果 ``tag`` 第一次出现，则为其分配新的一列。 """
+        column = self.__columns.get(tag, None)
+        if column is None:
+            column = len(self.__tags)
+            self.__columns[tag] = column
+            self.__tags.append(tag)
+        return column
+
+    def tag(self, column: int) -> int:
+        return self.__tags[column]
+
+    def __len__(self) -> int:
+        return len(self.__tags)
+
+
+_tag_columns_registry: 'weakref.WeakValueDictionary[Tuple[int, int], TagColumns]' = weakref.WeakValueDictionary()
+""" 当前进程中仍然存活的 ``TagColumns`` ，键为 ``token`` 。 """
+
+
+def _lookup_tag_columns(token: Tuple[int, int]) -> TagColumns:
+    """ 反序列化 ``TagColumns`` ：返回当前进程中 ``token`` 对应的映射，不存在时新建一个。 """
+    tag_columns = _tag_columns_registry.get(token)
+    return tag_columns if tag_columns is not None else TagColumns(token)
+
+
+class ArrayCacheState:
+    """
+    以 NumPy 矩阵存储的 Abstract Cache State，对外提供与 ``CacheState`` 相同的接口，只支持 Must/May/Persistent 分析。
+
+    矩阵的行对应 Cache Set，列对应 ``TagColumns`` 中登记的 ``tag``，元素为内存块的 relative age。不在状态中的内存块用
+    ``absent`` 表示：Must/May 分析中为 associativity + 1，Persistent 分析中为 0。这样：
+    * Must 分析的 Join（取交集，年龄取较大值）就是逐元素取 max；
+    * May 分析的 Join（取并集，年龄取较小值）就是逐元素取 min；
+    * Persistent 分析的 Join（取并集，年龄取较大值）就是逐元素取 max；
+    * 两个状态是否相同只需要比较一次矩阵。
+
+    矩阵按照整个状态的粒度进行写时复制：拷贝得到的实例与原实例共享矩阵，第一次写入时才复制。
+    与 ``CacheState`` 相同， ``__dirty`` 记录了自上一次 ``reset_dirty()`` 以来可能发生变化的 set（行）下标。
+    """
+
+    def __init__(self, cache_config: CacheConfig, analysis_type: CacheAnalysisMethod,
+                 tag_columns: Optional[TagColumns] = None):
+        """
+        Args:
+            tag_columns: 与同一次分析中其他状态共享的列映射。为 None 时使用新的映射，此时只能与自身的拷贝进行 Join。
+        """
+        self.__cache_config = cache_config
+        if analysis_type not in {CacheAnalysisMethod.MUST, CacheAnalysisMethod.MAY, CacheAnalysisMethod.PERSISTENT}:
+            raise ValueError("Unsupported sim type {} for array backend.".format(analysis_type))
+        if cache_config.associativity + 1 > np.iinfo(np.uint8).max:
+            raise ValueError("Associativity {} is too large for array backend.".format(cache_config.associativity))
+        self.__analysis_type = analysis_type
+        self.__associativity = cache_config.associativity
+        self.__cache_level = cache_config.cache_level
+        self.__absent = 0 if analysis_type == CacheAnalysisMethod.PERSISTENT else self.__associativity + 1
+        self.__columns = tag_columns if tag_columns is not None else TagColumns()
+        self.__PO: Set[MemoryBlock] = set()
+
+        self.__ages: np.ndarray = np.empty((0, 0), dtype=np.uint8)
+        self.__owned = False
+        self.__dirty: Set[int] = set()
+        self.clear()
+
+    def clear(self):
+        """ Clears the state of the cache. 矩阵的列在写入时再按需扩展。 """
+        self.__ages = np.full((self.__cache_config.set_number, 0), self.__absent, dtype=np.uint8)
+        self.__owned = True
+        self.__dirty = set()
+        self.__PO = set()
+
+    @property
+    def dirty_sets(self) -> Set[int]:
+        """ 自上一次 ``reset_dirty()`` 以来可能发生变化的 set 下标。 """
+        return self.__dirty
+
+    def reset_dirty(self):
+        self.__dirty = set()
+
+    def __writable_ages(self) -> np.ndarray:
+        """ 私有方法。返回可以直接写入的矩阵：如果矩阵与其他实例共享则先复制，如果列数少于已登记的 tag 数则补齐。 """
+        width = len(self.__columns)
+        if self.__ages.shape[1] < width:
+            padding = np.full((self.__ages.shape[0], width - self.__ages.shape[1]), self.__absent, dtype=np.uint8)
+            self.__ages = np.hstack((self.__ages, padding))
+            self.__owned = True
+        elif not self.__owned:
+            self.__ages = self.__ages.copy()
+            self.__owned = True
+        return self.__ages
+
+    def __aligned(self, width: int) -> np.ndarray:
+        """ 私有方法。返回补齐到 ``width`` 列的矩阵（只读）。 """
+        if self.__ages.shape[1] >= width:
+            return self.__ages
+        padding = np.full((self.__ages.shape[0], width - self.__ages.shape[1]), self.__absent, dtype=np.uint8)
+        return np.hstack((self.__ages, padding))
+
+    @property
+    def cache_config(self) -> CacheConfig:
+        return self.__cache_config
+
+    @property
+    def analysis_type(self) -> CacheAnalysisMethod:
+        return self.__analysis_type
+
+    @property
+    def associativity(self):
+        return self.__associativity
+
+    @property
+    def runtime_ident(self) -> Tuple[int, ...]:
+        """ 与 ``CacheState.runtime_ident`` 相同，返回每个 set 对应的哈希值。 """
+        ages = self.__aligned(len(self.__columns))
+        return tuple([row.tobytes().__hash__() for row in ages])
+
+    def fingerprint(self) -> int:
+        """
+        与 ``CacheState.fingerprint`` 相同。所有实例共用同一个 tag 到列的映射，因此可以直接对矩阵的内容求哈希。
+
+        映射中的列只增不减，为了使同一个状态的哈希值不随之后登记的 ``tag`` 变化，求哈希前去掉末尾全部为 absent 的列。
+        """
+        present = np.flatnonzero((self.__ages != self.__absent).any(axis=0))
+        width = int(present[-1]) + 1 if present.size else 0
+        return hash((self.__ages[:, :width].tobytes(), frozenset(self.__PO)))
+
+    @property
+    def PO(self) -> set[MemoryBlock]:
+        return self.__PO
+
+    def add_PO(self, mbs: Set[MemoryBlock]):
+        self.__PO = mbs
+
+    def reset_PO(self):
+        self.__PO = set()
+
+    def __get(self, set_index: int, tag: int) -> int:
+        """ 私有方法。返回内存块的 relative age，不在状态中时返回 ``absent``。 """
+        column = self.__columns.get(tag)
+        if column is None or column >= self.__ages.shape[1]:
+            return self.__absent
+        return int(self.__ages[set_index, column])
+
+    def __set(self, set_index: int, tag: int, age: int) -> None:
+        column = self.__columns.add(tag)
+        self.__writable_ages()[set_index, column] = age
+        self.__dirty.add(set_index)
+
+    def get_last_block(self, set_index: int) -> Set[MemoryBlock]:
+        columns = np.flatnonzero(self.__ages[set_index] == self.__associativity)
+        return {MemoryBlock(self.__columns.tag(column), set_index, self.__cache_level) for column in columns.tolist()}
+
+    def get_evicted_line(self) -> Set[MemoryBlock]:
+        if not self.analysis_type == CacheAnalysisMethod.PERSISTENT:
+            raise TypeError("Only PERSISTENT analysis is supported")
+        set_indexes, columns = np.nonzero(self.__ages == self.__associativity + 1)
+        return {MemoryBlock(self.__columns.tag(column), set_index, self.__cache_level)
+                for set_index, column in zip(set_indexes.tolist(), columns.tolist())}
+
+    def in_cache(self, mb: MemoryBlock) -> bool:
+        return self.__get(mb.set_index, mb.tag) != self.__absent
+
+    def remove_block(self, mb: MemoryBlock):
+        if not self.in_cache(mb):
+            raise KeyError(mb.tag)
+        self.__set(mb.set_index, mb.tag, self.__absent)
+
+    def set_age(self, age, mb: MemoryBlock):
+        """ 暂时只用于PERSISTENT中 """
+        self.__set(mb.set_index, mb.tag, age)
+
+    def get_age(self, mb: MemoryBlock):
+        age = self.__get(mb.set_index, mb.tag)
+        if age == self.__absent:
+            raise KeyError(mb.tag)
+        return age
+
+    def __add_relative_age(self, set_index: int, cmp_rel_age: int, inclusive: bool) -> None:
+        """
+        私有方法。将 set 中所有 relative age 小于（ ``inclusive == True`` 时为小于或等于） ``cmp_rel_age`` 的内存块的年龄加1，
+        年龄最大不超过 associativity + 1。
+
+        对于 Must/May 分析， ``absent`` 就是 associativity + 1，年龄达到该值的内存块即被驱逐，不需要额外删除；
+        对于 Persistent 分析，年龄为 associativity + 1 的内存块保留在表示 Evicted 的行中。
+        """
+        row = self.__ages[set_index]
+        mask = row <= cmp_rel_age if inclusive else row < cmp_rel_age
+        mask &= row != self.__absent
+        columns = np.flatnonzero(mask)
+        if columns.size:
+            aged = np.minimum(row[columns], self.__associativity) + 1
+            self.__writable_ages()[set_index, columns] = aged
+            self.__dirty.add(set_index)
+
+    def updateL1(self, mem_block: MemoryBlock, min_age: Optional[int] = None):
+        if not isinstance(mem_block, MemoryBlock):
+            raise TypeError("mem_block must be instances of class:MemoryBlock instead of ", type(mem_block))
+        if min_age is not None and not self.analysis_type == CacheAnalysisMethod.MAY:
+            warnings.warn("Min age only used in MAY analysis")
+
+        set_index = mem_block.set_index
+        block_ident = mem_block.tag
+        rel_age = self.__get(set_index, block_ident)
+        if self.__analysis_type == CacheAnalysisMethod.PERSISTENT and rel_age == self.__absent:
+            rel_age = self.__associativity + 1
+
+        if self.__analysis_type == CacheAnalysisMethod.MAY:
+            if min_age is None or rel_age <= min_age:
+                self.__add_relative_age(set_index, rel_age, inclusive=True)
+            else:
+                """ 根据 'Precise Multi-Level Inclusive Cache Analysis for WCET Estimation' 的safe MAY Update实现"""
+                self.__add_relative_age(set_index, min_age, inclusive=True)
+        else:
+            self.__add_relative_age(set_index, rel_age, inclusive=False)
+        self.__set(set_index, block_ident, 1)
+
+    def updateL2(self, mem_block: MemoryBlock):
+        if not isinstance(mem_block, MemoryBlock):
+            raise TypeError("mem_block must be instances of class:MemoryBlock instead of ", type(mem_block))
+        set_index = mem_block.set_index
+        block_ident = mem_block.tag
+        rel_age = self.__get(set_index, block_ident)
+
+        if self.__analysis_type == CacheAnalysisMethod.MUST:
+            self.reset_PO()
+            last_blocks = self.get_last_block(set_index)
+            last_blocks.discard(mem_block)
+            if last_blocks != set() and rel_age > self.associativity:
+                self.add_PO(last_blocks)
+            self.__add_relative_age(set_index, rel_age, inclusive=False)
+
+        elif self.__analysis_type == CacheAnalysisMethod.MAY:
+            self.reset_PO()
+            last_blocks = self.get_last_block(set_index)
+            last_blocks.discard(mem_block)
+            if last_blocks != set() and rel_age >= self.associativity:  # 只有L2需要获取驱逐块，min_age为空
+                self.add_PO(last_blocks)
+            self.__add_relative_age(set_index, rel_age, inclusive=True)
+
+        elif self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
+            if rel_age == self.__absent:
+                rel_age = self.__associativity + 1
+            self.__add_relative_age(set_index, rel_age, inclusive=False)
+        self.__set(set_index, block_ident, 1)
+
+    def updateU(self, mem_block: MemoryBlock, loop_level: int = -1, min_age: Optional[List[int]] = None):
+        """ 见 ``CacheState.updateU`` """
+        set_index = mem_block.set_index
+        block_ident = mem_block.tag
+        if self.__analysis_type == CacheAnalysisMethod.MUST:
+            self.reset_PO()
+            last_blocks = self.get_last_block(set_index)
+            last_blocks.discard(mem_block)
+            rel_age = self.__get(set_index, block_ident)
+            self.__add_relative_age(set_index, rel_age, inclusive=False)
+            if rel_age > self.__associativity:  # must_state没有此内存块，更新(L1 AM)
+                if last_blocks != set():
+                    self.add_PO(last_blocks)
+                self.__set(set_index, block_ident, 1)
+
+        elif self.__analysis_type == CacheAnalysisMethod.MAY:
+            self.reset_PO()
+            self.__set(set_index, block_ident, 1)
+
+        elif self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
+            rel_age = self.__get(set_index, block_ident)
+            if rel_age == self.__absent:
+                rel_age = self.__associativity + 1
+            self.__add_relative_age(set_index, rel_age, inclusive=False)
+            if rel_age == self.__associativity + 1:
+                self.__set(set_index, block_ident, 1)
+            else:  # ps_state存在此内存块，合并ps状态(L1 Hit)，则保留并集(所以不存在驱逐集)和max age。
+                pass
+
+    def updateL3(self, mem_block: MemoryBlock) -> None:
+        """ 见 ``CacheState.updateL3`` """
+        if not isinstance(mem_block, MemoryBlock):
+            raise TypeError("mem_block must be instances of class:MemoryBlock instead of ", type(mem_block))
+
+        set_index = mem_block.set_index
+        block_ident = mem_block.tag
+
+        if self.__analysis_type == CacheAnalysisMethod.MUST:
+            rel_age = self.__get(set_index, block_ident)
+            self.__add_relative_age(set_index, rel_age, inclusive=False)
+            self.__set(set_index, block_ident, 1)
+
+        elif self.__analysis_type == CacheAnalysisMethod.MAY:
+            rel_age = self.__get(set_index, block_ident)
+            self.__add_relative_age(set_index, rel_age, inclusive=True)
+            self.__set(set_index, block_ident, 1)
+
+    def __add__(self, other):
+        """ 不同分析方法的Join函数 """
+        if not isinstance(other, ArrayCacheState):
+            raise TypeError("Operands must be instances of class:ArrayCacheState.")
+        if not all([self.__analysis_type == other.__analysis_type,
+                    self.__cache_config.ident == other.__cache_config.ident]):
+            raise TypeError("Two operands must have the same sim type and __cache configuration.")
+        if self.__columns is not other.__columns:
+            raise TypeError("Two operands must share the same tag columns.")
+
+        new_state = ArrayCacheState(cache_config=self.__cache_config, analysis_type=self.__analysis_type,
+                                    tag_columns=self.__columns)
+        if self.__ages is other.__ages:
+            # 两个操作数共享同一个矩阵，Join 的结果与它相同。三者共享该矩阵，操作数也都失去对它的独占
+            new_state.__ages = self.__ages
+            new_state.__owned = False
+            self.__owned = other.__owned = False
+            new_state.__dirty = self.__dirty | other.__dirty
+            return new_state
+
+        width = max(self.__ages.shape[1], other.__ages.shape[1])
+        self_ages, other_ages = self.__aligned(width), other.__aligned(width)
+        new_state.__ages = self.__join(self_ages, other_ages)
+        differing_rows = np.flatnonzero((self_ages != other_ages).any(axis=1)).tolist()
+        new_state.__dirty = self.__dirty | other.__dirty | set(differing_rows)
+        return new_state
+
+    def __join(self, self_ages: np.ndarray, other_ages: np.ndarray) -> np.ndarray:
+        """ 私有方法。逐元素的 Join：May 分析取 min，Must/Persistent 分析取 max。 """
+        if self.__analysis_type == CacheAnalysisMethod.MAY:
+            return np.minimum(self_ages, other_ages)
+        return np.maximum(self_ages, other_ages)
+
+    def rejoin_sets(self, states: List['ArrayCacheState'], set_indexes: Iterable[int]) -> Set[int]:
+        """ 见 ``CacheState.rejoin_sets`` """
+        rows = sorted(set_indexes)
+        if not rows:
+            return set()
+        width = max(state.__ages.shape[1] for state in states + [self])
+        joined = states[0].__aligned(width)[rows]
+        for state in states[1:]:
+            joined = self.__join(joined, state.__aligned(width)[rows])
+        current = self.__aligned(width)[rows]
+        changed = [row for row, differ in zip(rows, (joined != current).any(axis=1).tolist()) if differ]
+        if changed:
+            ages = self.__writable_ages()
+            ages[rows, :width] = joined
+            self.__dirty.update(changed)
+        return set(changed)
+
+    def changed_sets(self, other, set_indexes: Optional[Iterable[int]] = None) -> Set[int]:
+        """ 见 ``CacheState.changed_sets`` """
+        if self.__ages is other.__ages:
+            return set()
+        width = max(self.__ages.shape[1], other.__ages.shape[1])
+        self_ages, other_ages = self.__aligned(width), other.__aligned(width)
+        if set_indexes is None:
+            return set(np.flatnonzero((self_ages != other_ages).any(axis=1)).tolist())
+        rows = sorted(set_indexes)
+        differ = (self_ages[rows] != other_ages[rows]).any(axis=1).tolist()
+        return {row for row, row_differ in zip(rows, differ) if row_differ}
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def get_set_lines(self, set_index: int, do_sort: bool = True) -> List[List[MemoryBlock]]:
+        """ 见 ``CacheState.get_set_lines`` """
+        if self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
+            rtn_list = [list() for _ in range(self.__associativity + 1)]
+        else:
+            rtn_list = [list() for _ in range(self.__associativity)]
+        row = self.__ages[set_index]
+        for column in np.flatnonzero(row != self.__absent).tolist():
+            rtn_list[int(row[column]) - 1].append(MemoryBlock(self.__columns.tag(column), set_index, self.__cache_level))
+
+        if do_sort:
+            rtn_list = [sorted(item, key=lambda x: x.tag) for item in rtn_list]
+        return rtn_list
+
+    def get_all_set_lines(self, do_sort=True) -> List[List[List[MemoryBlock]]]:
+        """ 见 ``CacheState.get_all_set_lines`` """
+        return [self.get_set_lines(set_index=set_index, do_sort=do_sort) for set_index in range(self.__ages.shape[0])]
+
+    def __eq__(self, other) -> bool:
+        if self.__ages is other.__ages:
+            return True
+        width = min(self.__ages.shape[1], other.__ages.shape[1])
+        # 多出来的列中只能是 absent
+        for state in (self, other):
+            if not (state.__ages[:, width:] == state.__absent).all():
+                return False
+        return np.array_equal(self.__ages[:, :width], other.__ages[:, :width])
+
+    def __deepcopy__(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+
+        new_state = ArrayCacheState(cache_config=self.__cache_config, analysis_type=self.__analysis_type,
+                                    tag_columns=self.__columns)
+
+        # 写时复制：拷贝与原状态共享矩阵，双方都失去对矩阵的独占。
+        new_state.__ages = self.__ages
+        new_state.__owned = False
+        new_state.__dirty = self.__dirty.copy()
+        self.__owned = False
+
+        memo[id(self)] = new_state
+        return new_state
+
+    def __getstate__(self):
+        """
+        ``TagColumns`` 的内容只在当前进程内有效（fork 之后子进程中登记的列父进程看不到），因此序列化时将列下标转换回
+        ``tag`` ，反序列化时再在目标进程的同一个映射中重新登记。
+        """
+        tags = [self.__columns.tag(column) for column in range(self.__ages.shape[1])]
+        return self.__cache_config, self.__analysis_type, self.__columns, tags, self.__ages, self.__PO, self.__dirty
+
+    def __setstate__(self, state):
+        cache_config, analysis_type, tag_columns, tags, ages, PO, dirty = state
+        self.__init__(cache_config, analysis_type, tag_columns)
+        columns = [self.__columns.add(tag) for tag in tags]
+        self.__writable_ages()[:, columns] = ages
+        self.__PO = PO
+        self.__dirty = dirty
+
+
 class CACLeastUpperBound:
     def __init__(self) -> None:
         self.__CAC_bound: Dict[Reference, Dict[CacheHierarchy, CAC]] = dict()
@@ -428,6 +961,19 @@ class CACLeastUpperBound:
     def CAC_bound(self):
         return self.__CAC_bound
 
+    def __deepcopy__(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+
+        # Reference 和 CAC 在分析过程中都不会被修改，只需复制两层字典
+        new_bound = CACLeastUpperBound()
+        new_bound.__CAC_bound = {ref: levels.copy() for ref, levels in self.__CAC_bound.items()}
+
+        memo[id(self)] = new_bound
+        return new_bound
+
 
 def UpdateCAC(chmc, cac):
     """ From the CHMC and CAC of layer i,  get the CAC of layer i+1 """
@@ -448,17 +994,31 @@ def UpdateCAC(chmc, cac):
     return cac
 
 
+StateKey = Tuple[CacheAnalysisMethod, CacheHierarchy]
+""" ``MultiLevelCacheState`` 中一个 Cache State 的索引，即 (分析方法, Cache 层级)。 """
+
+
 class MultiLevelCacheState:
     def __init__(self, multilevel_cache_config: MultiLevelCacheConfig) -> None:
         self.__cache_config = multilevel_cache_config
 
+        # 根据缓存配置选择 Abstract Cache State 的存储方式，ArrayCacheState 使用配置中每一级 Cache 共享的列映射
+        if multilevel_cache_config.state_backend == CacheStateBackend.ARRAY:
+            tag_columns = multilevel_cache_config.tag_columns
+            for level in multilevel_cache_config.cache_levels():
+                if level not in tag_columns:
+                    tag_columns[level] = TagColumns()
+
+            def new_state(level, config, analysis_type):
+                return ArrayCacheState(config, analysis_type, tag_columns[level])
+        else:
+            def new_state(level, config, analysis_type):
+                return CacheState(config, analysis_type)
+
         self.__states = {
-            CacheAnalysisMethod.MUST: {level: CacheState(config, CacheAnalysisMethod.MUST)
-                                       for level, config in self.__cache_config.cache_configs().items()},
-            CacheAnalysisMethod.MAY: {level: CacheState(config, CacheAnalysisMethod.MAY)
-                                      for level, config in self.__cache_config.cache_configs().items()},
-            CacheAnalysisMethod.PERSISTENT: {level: CacheState(config, CacheAnalysisMethod.PERSISTENT)
-                                             for level, config in self.__cache_config.cache_configs().items()}
+            analysis_type: {level: new_state(level, config, analysis_type)
+                            for level, config in self.__cache_config.cache_configs().items()}
+            for analysis_type in (CacheAnalysisMethod.MUST, CacheAnalysisMethod.MAY, CacheAnalysisMethod.PERSISTENT)
         }
 
         self.__CAC_bound = CACLeastUpperBound()
@@ -504,6 +1064,56 @@ class MultiLevelCacheState:
     def get_state(self, analysis_method: CacheAnalysisMethod, cache_level: CacheHierarchy) -> CacheState:
         return self.__states[analysis_method][cache_level]
 
+    @property
+    def set_count(self) -> int:
+        """ 所有分析方法、所有 Cache 层级的 set 的总数，即比较两个完整状态时需要比较的 set 数。 """
+        return sum(self.__cache_config[level].set_number
+                   for level_states in self.__states.values() for level in level_states)
+
+    @property
+    def dirty_sets(self) -> Dict[StateKey, Set[int]]:
+        """ 每个 (分析方法, Cache 层级) 中自上一次 ``reset_dirty()`` 以来可能发生变化的 set 下标，只包含非空的项。 """
+        return {(analysis_type, level): state.dirty_sets
+                for analysis_type, level_states in self.__states.items()
+                for level, state in level_states.items() if state.dirty_sets}
+
+    def reset_dirty(self):
+        for level_states in self.__states.values():
+            for state in level_states.values():
+                state.reset_dirty()
+
+    def changed_sets(self, other, candidates: Optional[Dict[StateKey, Set[int]]] = None) -> Dict[StateKey, Set[int]]:
+        """
+        返回与 ``other`` 内容不同的 set。 ``candidates`` 为 None 时比较所有的 set，否则只比较 ``candidates`` 中的 set。
+        """
+        changed = dict()
+        for analysis_type, level_states in self.__states.items():
+            for level, state in level_states.items():
+                if candidates is None:
+                    set_indexes = None
+                else:
+                    set_indexes = candidates.get((analysis_type, level))
+                    if not set_indexes:
+                        continue
+                differ = state.changed_sets(other.__states[analysis_type][level], set_indexes)
+                if differ:
+                    changed[(analysis_type, level)] = differ
+        return changed
+
+    def rejoin(self, states: List['MultiLevelCacheState'], candidates: Dict[StateKey, Set[int]]) \
+            -> Dict[StateKey, Set[int]]:
+        """
+        只将 ``candidates`` 中的 set 重新计算为 ``states`` 的 Join 结果（见 ``CacheState.rejoin_sets``），返回内容确实发生了变化的
+        set。调用者需要保证其余的 set 与 ``states`` 的 Join 结果相同。
+        """
+        changed = dict()
+        for (analysis_type, level), set_indexes in candidates.items():
+            differ = self.__states[analysis_type][level].rejoin_sets(
+                [state.__states[analysis_type][level] for state in states], set_indexes)
+            if differ:
+                changed[(analysis_type, level)] = differ
+        return changed
+
     def update(self, ref: Reference):
         """ 更新函数 """
         L1_cache_level = CacheHierarchy.L1I if ref.ref_type == RefType.INST else CacheHierarchy.L1D
@@ -636,6 +1246,22 @@ class MultiLevelCacheState:
     def __radd__(self, other):
         return self.__add__(other)
 
+    def __deepcopy__(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+
+        # 不调用 __init__，避免重新创建所有的 CacheState；缓存配置在分析过程中不会被修改，直接共享。
+        new_state = MultiLevelCacheState.__new__(MultiLevelCacheState)
+        memo[id(self)] = new_state
+        new_state.__cache_config = self.__cache_config
+        new_state.__states = {analysis_type: {level: deepcopy(state, memo) for level, state in level_states.items()}
+                              for analysis_type, level_states in self.__states.items()}
+        new_state.__CAC_bound = deepcopy(self.__CAC_bound, memo)
+        new_state.__min_age = {cache_level: ages.copy() for cache_level, ages in self.__min_age.items()}
+        return new_state
+
     def __eq__(self, other):
 
         for method, self_multi_state in self.__states.items():
@@ -644,3 +1270,25 @@ class MultiLevelCacheState:
                 if self_state != other_multi_state.get(cache_level):
                     return False
         return True
+
+    def fingerprint(self) -> int:
+        """
+        返回整个状态的哈希值。与 ``__eq__`` 不同，这里还考虑了 PO、CAC_bound 和 min_age，
+        它们都会影响之后的 update，只有这些也相同的两个状态，经过同样的不动点迭代才会得到完全相同的结果。
+        """
+        return hash((tuple([state.fingerprint() for level_states in self.__states.values()
+                            for state in level_states.values()]),
+                     frozenset([(ref, frozenset(levels.items())) for ref, levels in self.__CAC_bound.CAC_bound.items()]),
+                     tuple([tuple(ages) for ages in self.__min_age.values()])))
+
+    def identical(self, other: 'MultiLevelCacheState') -> bool:
+        """ 与 ``fingerprint`` 对应的精确比较：状态、PO、CAC_bound 和 min_age 都相同。 """
+        if self is other:
+            return True
+        if not self == other:
+            return False
+        for analysis_type, level_states in self.__states.items():
+            for level, state in level_states.items():
+                if state.PO != other.__states[analysis_type][level].PO:
+                    return False
+        return self.__CAC_bound.CAC_bound == other.__CAC_bound.CAC_bound and self.__min_age == other.__min_age
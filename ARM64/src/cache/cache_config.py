@@ -1,6 +1,9 @@
 from math import log2
-from typing import Optional, Tuple, Dict
-from src.cache.constants import CacheHierarchy
+from typing import Optional, Tuple, Dict, TYPE_CHECKING
+from src.cache.constants import CacheHierarchy, CacheStateBackend
+
+if TYPE_CHECKING:
+    from src.cache.abstract_state import TagColumns
 
 
 class CacheConfig:
@@ -121,7 +124,16 @@ class CacheConfig:
 
 
 class MultiLevelCacheConfig:
-    def __init__(self, cache_level: Dict[CacheHierarchy, CacheConfig]):
+    def __init__(self, cache_level: Dict[CacheHierarchy, CacheConfig],
+                 state_backend: CacheStateBackend = CacheStateBackend.DICT):
+        """
+        Args:
+            cache_level: 每一级 Cache 对应的配置。
+            state_backend: 分析时 Abstract Cache State 的存储方式，``DICT`` 为按 set 存储的字典，
+                ``ARRAY`` 为 NumPy 矩阵（见 ``ArrayCacheState``）。两者的分析结果相同。
+        """
+        self.__state_backend = state_backend
+        self.__tag_columns: Dict[CacheHierarchy, 'TagColumns'] = dict()
         self.__cache_levels = {}
         for level, config in cache_level.items():
             if not isinstance(config, CacheConfig):
@@ -133,6 +145,18 @@ class MultiLevelCacheConfig:
             raise TypeError(f"Config for {level} must be a CacheConfig instance.")
         self.__cache_levels[level] = config
 
+    @property
+    def state_backend(self) -> CacheStateBackend:
+        return self.__state_backend
+
+    @property
+    def tag_columns(self) -> Dict[CacheHierarchy, 'TagColumns']:
+        """
+        每一级 Cache 的 ``ArrayCacheState`` 共享的 tag 到矩阵列的映射，由 ``MultiLevelCacheState`` 按需创建。
+        映射属于这个配置，即属于一次分析，不同分析之间互不影响。
+        """
+        return self.__tag_columns
+
     def get_cache_config(self, level: CacheHierarchy):
         return self.__cache_levels.get(level, None)
 
@@ -31,3 +31,8 @@ class CacheHierarchy(Enum):
     L1D = auto()
     L2 = auto()
     L3 = auto()
+
+
+class CacheStateBackend(Enum):
+    DICT = auto()
+    ARRAY = auto()
@@ -1,14 +1,21 @@
 import copy
-from collections import deque, defaultdict
+import heapq
+from collections import defaultdict, OrderedDict
 from copy import deepcopy
-from typing import List, Dict, Hashable, Optional, Set
+from typing import List, Dict, Hashable, Optional, Set, Tuple
 
-from src.cache.abstract_state import MultiLevelCacheState
+from src.cache.abstract_state import MultiLevelCacheState, StateKey
 from src.cfg import *
 from src.cache.constants import CacheAnalysisMethod, RefType
 from src.cache.memory_ref import Reference
 from src.cache.cache_config import MultiLevelCacheConfig
 
+" 每个 Fixpoint 最多保存的过程摘要（procedure summary）数目 "
+SUMMARY_CACHE_SIZE = 8
+
+" 过程摘要的键：(EntryState 的哈希值, DummyNodes_State 中各结点及其状态的哈希值) "
+SummaryKey = Tuple[Optional[int], Optional[frozenset]]
+
 
 class FixpointState:
 
@@ -50,14 +57,94 @@ class Fixpoint:
             self.__state_map[node.name] = FixpointState(cache_config=self.__cache_config)
         self.__loop = loop
 
+        """
+        过程摘要：以 (EntryState, DummyNodes_State) 为键，保存以它们为输入完成不动点迭代后的 state_map。
+        不动点迭代的结果只由这两个输入决定，再次遇到相同的输入时直接取回对应的 state_map，无需重新迭代。
+        每次迭代都会新建 state_map，已经保存的 state_map 不会再被修改。
+        """
+        self.__summaries: OrderedDict[SummaryKey, Tuple[Optional[MultiLevelCacheState],
+                                                        Optional[Dict[Hashable, MultiLevelCacheState]],
+                                                        Dict[Hashable, FixpointState]]] = OrderedDict()
+
+    @property
+    def proc(self) -> Procedure:
+        return self.__proc
+
     @property
     def state_map(self) -> Dict[Hashable, FixpointState]:
         return self.__state_map
 
+    @state_map.setter
+    def state_map(self, state_map: Dict[Hashable, FixpointState]):
+        """ 用于取回在其他进程中完成迭代的结果。 """
+        self.__state_map = state_map
+
+    @staticmethod
+    def summary_key(EntryState: Optional[MultiLevelCacheState],
+                    DummyNodes_State: Optional[Dict[Hashable, MultiLevelCacheState]]) -> SummaryKey:
+        entry_fingerprint = None if EntryState is None else EntryState.fingerprint()
+        dummy_fingerprint = None if DummyNodes_State is None else \
+            frozenset([(node, state.fingerprint()) for node, state in DummyNodes_State.items()])
+        return entry_fingerprint, dummy_fingerprint
+
+    def __find_summary(self, key: SummaryKey, EntryState: Optional[MultiLevelCacheState],
+                       DummyNodes_State: Optional[Dict[Hashable, MultiLevelCacheState]]
+                       ) -> Optional[Dict[Hashable, FixpointState]]:
+        """ 私有方法。查找输入与 (EntryState, DummyNodes_State) 完全相同的过程摘要，哈希值相同时还需要逐项确认。 """
+        if key not in self.__summaries:
+            return None
+        entry_state, dummy_nodes_state, state_map = self.__summaries[key]
+        if (entry_state is None) != (EntryState is None) or \
+                (entry_state is not None and not entry_state.identical(EntryState)):
+            return None
+        if (dummy_nodes_state is None) != (DummyNodes_State is None):
+            return None
+        if dummy_nodes_state is not None:
+            if dummy_nodes_state.keys() != DummyNodes_State.keys() or \
+                    not all(state.identical(DummyNodes_State[node]) for node, state in dummy_nodes_state.items()):
+                return None
+        self.__summaries.move_to_end(key)
+        return state_map
+
+    def __reverse_postorder(self, entry_node: Hashable, node_considered: Set[Hashable]) -> List[Hashable]:
+        """ 从入口结点出发，在被考虑的结点上进行深度优先遍历，返回所有可达结点的逆后序（reverse postorder）。 """
+        successors = self.__proc.successors
+        postorder: List[Hashable] = []
+        visited: Set[Hashable] = {entry_node}
+        # 使用显式栈代替递归，避免大规模的过程超过递归深度限制
+        stack: List[Tuple[Hashable, int]] = [(entry_node, 0)]
+        while stack:
+            node, idx = stack[-1]
+            node_succs = successors[node]
+            if idx < len(node_succs):
+                stack[-1] = (node, idx + 1)
+                succ = node_succs[idx]
+                if succ in node_considered and succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, 0))
+            else:
+                stack.pop()
+                postorder.append(node)
+        postorder.reverse()
+        return postorder
+
     def do_analysis(self, refs: Dict[Hashable, List[Set[Reference]]], EntryState: Optional[MultiLevelCacheState] = None,
-                    DummyNodes_State: Optional[Dict[Hashable, MultiLevelCacheState]] = None):
+                    DummyNodes_State: Optional[Dict[Hashable, MultiLevelCacheState]] = None) -> bool:
+
+        """
+        对整体进行不动点迭代：MUST, MAY, PERSISTENT(得到外部函数的loop嵌套本函数的情况)。
+        如果找到了输入相同的过程摘要，则直接使用其结果，返回 True；否则进行迭代并保存摘要，返回 False。
+        """
 
-        """ 对整体进行不动点迭代：MUST, MAY, PERSISTENT(得到外部函数的loop嵌套本函数的情况) """
+        " 查找过程摘要 "
+        input_key = self.summary_key(EntryState, DummyNodes_State)
+        state_map = self.__find_summary(input_key, EntryState, DummyNodes_State)
+        if state_map is not None:
+            self.__state_map = state_map
+            if self.__debug:
+                with open(self.__debug_path + "/fixpoint_time.txt", 'a') as file:
+                    file.write(self.__proc.name.ljust(50) + " reused procedure summary \n")
+            return True
 
         " Fixpoint分析的入口结点 "
         entry_node: Hashable = self.__proc.entry_node.name if self.__loop is None else self.__loop.head.name
@@ -68,9 +155,9 @@ class Fixpoint:
         else:
             node_considered: Set[Hashable] = set(node.name for node in self.__proc.nodes)
 
-        " 使用直接重置对象属性的方法来清空每个节点的状态 "
-        for node_name, state in self.__state_map.items():
-            state.reset()
+        " 为每个节点新建空的状态，之前的 state_map 可能被过程摘要引用，不能原地清空 "
+        self.__state_map = {node_name: FixpointState(cache_config=self.__cache_config)
+                            for node_name in self.__state_map}
 
         " 设置入口节点的状态 "
         if EntryState is not None:
@@ -80,136 +167,180 @@ class Fixpoint:
             # nc list = [], add state to nc list
             self.__state_map[entry_node].nc_in_state_list.append(self.__state_map[entry_node].in_state)
 
-        " 判断是否已经达到全局不动点，即检查到的所有的状态都没有发生变化，那么就认为到达了不动点。"
-        global_reach_fixpoint = False
+        " 按逆后序（reverse postorder）为结点分配优先级，优先级越小越先出队 "
+        rpo_index: Dict[Hashable, int] = {node: idx for idx, node in
+                                          enumerate(self.__reverse_postorder(entry_node, node_considered))}
+
+        " 工作表：只有当某结点的 out_state 发生变化时，才将其后继结点重新加入工作表 "
+        worklist: List[Tuple[int, Hashable]] = [(rpo_index[entry_node], entry_node)]
+        in_worklist: Set[Hashable] = {entry_node}
+        checked: Set[Hashable] = set()
 
-        fixpoint_count = 0
+        """
+        pending[n] 记录了自结点 n 上一次被访问以来，其前驱结点的 out_state 中发生变化的 set。
+        再次访问 n 时，只需要重新合并并比较这些 set，其余的 set 一定与 n 当前的 in_state 相同。
+        """
+        pending: Dict[Hashable, Dict[StateKey, Set[int]]] = defaultdict(dict)
+
+        visit_count = 0
+        " 统计比较过的 set 数目，以及每次都比较完整状态时需要比较的 set 数目 "
+        compared_sets = 0
+        full_compared_sets = 0
+        set_count = self.__state_map[entry_node].in_state.set_count
         proc_name = self.__proc.name.ljust(50)
-        file_txt = ""
-        while not global_reach_fixpoint:
-            if self.__debug:
-                fixpoint_count += 1
-                if fixpoint_count == 1:
-                    file_txt = proc_name + " in " + str(fixpoint_count) + " time fixpoint \n"
+        while worklist:
+            """ 获取当前考察的结点。 """
+            _, cur_node_ident = heapq.heappop(worklist)
+            in_worklist.discard(cur_node_ident)
+            cur_node = self.__nodes_dict[cur_node_ident]
+
+            """ 获取该结点的in_state, 以供后续比较。 """
+            old_in_state: MultiLevelCacheState = self.__state_map[cur_node_ident].in_state
+
+            """ 通过前驱索引获得在considered中的所有前驱结点的out_state。 """
+            to_join_states: List[MultiLevelCacheState] = [self.__state_map[o].out_state
+                                                          for o in self.__proc.predecessors[cur_node_ident]
+                                                          if o in node_considered]
+            """ 
+            合并（join）所有的状态，得到新的状态并赋值给当前结点的in_state。
+            第一次访问时合并完整的状态；之后只重新合并前驱结点中发生变化的 set，in_changed 为in_state中确实发生变化的 set。
+            """
+            candidates = pending.pop(cur_node_ident, {})
+            if len(to_join_states) != 0:
+                if cur_node_ident in checked:
+                    # 旧的in_state可能仍被NC状态列表引用，因此在其（写时复制的）拷贝上重新合并
+                    new_in_state = deepcopy(old_in_state)
+                    in_changed = new_in_state.rejoin(to_join_states, candidates)
+                    self.__state_map[cur_node_ident].in_state = new_in_state
+                    compared_sets += sum(len(set_indexes) for set_indexes in candidates.values())
+                    full_compared_sets += set_count
                 else:
-                    file_txt = proc_name + " in " + str(fixpoint_count) + " times fixpoint \n"
-
-            global_reach_fixpoint = True
-            checked = set()
-            q = deque([entry_node])
-            while len(q) != 0:
-                """ 获取当前考察的结点。 """
-                cur_node_ident: Hashable = q.popleft()
-                cur_node = self.__nodes_dict[cur_node_ident]
-
-                """ 获取该结点的in_state, 以供后续比较。 """
-                old_in_state: MultiLevelCacheState = self.__state_map[cur_node_ident].in_state
-
-                """ 获取该结点所有的前驱结点，并进一步获得在considered中的所有前驱结点的out_state。 """
-                predecessor: Set[Hashable] = set()
-                for edge in self.__proc.edges:
-                    if edge.dst == cur_node:  # 本函数的节点
-                        predecessor.add(edge.src.name)
-
-                to_join_states: List[MultiLevelCacheState] = [self.__state_map[o].out_state
-                                                              for o in predecessor if o in node_considered]
-                """ 合并（join）所有的状态，得到新的状态并赋值给当前结点的in_state """
-                if len(to_join_states) != 0:
                     new_in_state = sum(to_join_states[1:], start=to_join_states[0])
                     self.__state_map[cur_node_ident].in_state = new_in_state
-                    self.__state_map[cur_node_ident].nc_in_state_list.extend(to_join_states)
-                    # NC概率化将相邻的两个状态合并成一个，直到状态列表的长度小于或等于8。
-                    if len(self.__state_map[cur_node_ident].nc_in_state_list) > 8:
-                        join_states = self.__state_map[cur_node_ident].nc_in_state_list
-                        # 如果状态列表长度超过 8，执行两两合并
-                        while len(join_states) > 8:
-                            new_states = []  # 存储合并后的新状态列表
-                            for i in range(0, len(join_states) - 1, 2):  # 两两合并，i 每次步进 2
-                                merged_state = sum([join_states[i + 1]], start=join_states[i])  # 合并相邻的两个状态
-                                new_states.append(merged_state)
-                            # 如果原始列表是奇数个，最后一个未被合并，直接加入新的列表中
-                            if len(join_states) % 2 != 0:
-                                new_states.append(join_states[-1])
-                            # 用合并后的新列表替换当前的状态列表
-                            join_states = new_states
-                        # 将最终的状态列表更新回节点，确保长度 <= 8
-                        self.__state_map[cur_node_ident].nc_in_state_list = join_states
-                else:
-                    new_in_state = old_in_state
-
-                """ 
-                如果这是第一次访问该结点，那么无论是否到达fixpoint，都进行后续的步骤。
-                如果这不是第一次访问该节点，检查新旧in_state是否相同。如果相同，则说明该节点已经到达了fixpoint，
-                不再考察该结点。否则，执行后续的步骤。
-                """
-                if new_in_state != old_in_state and not isinstance(cur_node, InterProcNode):
-                    """ 只要存在一个结点没有到达fixpoint，则整个状态都没有到达fixpoint。  """
-                    global_reach_fixpoint = False
-
-                elif cur_node_ident in checked:
-                    continue
-                """ 标记该结点已经被访问过。 """
-                checked.add(cur_node_ident)
-
-                """ 令dummy_node的out_state赋值为调用函数末节点的out_state """
-                if isinstance(cur_node, InterProcNode) and DummyNodes_State:
-                    if cur_node_ident in DummyNodes_State:
-                        new_out_state = copy.deepcopy(DummyNodes_State[cur_node_ident])
-                        new_nc_out_state_list = [new_out_state]
-                    else:
-                        new_out_state = MultiLevelCacheState(multilevel_cache_config=self.__cache_config)
-                        new_nc_out_state_list = [new_out_state]
+                    in_changed = None
+                self.__state_map[cur_node_ident].nc_in_state_list.extend(to_join_states)
+                # NC概率化将相邻的两个状态合并成一个，直到状态列表的长度小于或等于8。
+                if len(self.__state_map[cur_node_ident].nc_in_state_list) > 8:
+                    join_states = self.__state_map[cur_node_ident].nc_in_state_list
+                    # 如果状态列表长度超过 8，执行两两合并
+                    while len(join_states) > 8:
+                        new_states = []  # 存储合并后的新状态列表
+                        for i in range(0, len(join_states) - 1, 2):  # 两两合并，i 每次步进 2
+                            merged_state = sum([join_states[i + 1]], start=join_states[i])  # 合并相邻的两个状态
+                            new_states.append(merged_state)
+                        # 如果原始列表是奇数个，最后一个未被合并，直接加入新的列表中
+                        if len(join_states) % 2 != 0:
+                            new_states.append(join_states[-1])
+                        # 用合并后的新列表替换当前的状态列表
+                        join_states = new_states
+                    # 将最终的状态列表更新回节点，确保长度 <= 8
+                    self.__state_map[cur_node_ident].nc_in_state_list = join_states
+            else:
+                new_in_state = old_in_state
+                in_changed = dict() if cur_node_ident in checked else None
+
+            """ 
+            如果这是第一次访问该结点，那么无论in_state是否变化，都进行后续的步骤。
+            如果这不是第一次访问该节点，检查in_state是否有set发生变化。如果没有，则说明该节点已经到达了fixpoint，
+            不再考察该结点。否则，执行后续的步骤。
+            """
+            if cur_node_ident in checked and not in_changed:
+                continue
+            """ 标记该结点已经被访问过。 """
+            checked.add(cur_node_ident)
+            visit_count += 1
+
+            old_out_state: MultiLevelCacheState = self.__state_map[cur_node_ident].out_state
+
+            """ 
+            out_candidates 为out_state中可能发生变化的 set：in_state中发生变化的 set，以及新旧两次 update 写入过的 set。
+            为 None 时表示无法确定，需要比较完整的状态。
+            """
+            out_candidates: Optional[Dict[StateKey, Set[int]]] = None
+            """ 令dummy_node的out_state赋值为调用函数末节点的out_state """
+            if isinstance(cur_node, InterProcNode) and DummyNodes_State:
+                if cur_node_ident in DummyNodes_State:
+                    new_out_state = copy.deepcopy(DummyNodes_State[cur_node_ident])
+                    new_nc_out_state_list = [new_out_state]
                 else:
-                    """ 该结点的新的out_state是新的in_state与将当前结点的所有mem_blocks进行update的结果。 """
-                    new_out_state = deepcopy(self.__state_map[cur_node_ident].in_state)
-                    new_nc_out_state_list = deepcopy(self.__state_map[cur_node_ident].nc_in_state_list)
-                    for ref in refs[cur_node_ident]:
-                        if ref:
-                            if list(ref)[0].ref_type == RefType.INST:
-                                # RefType.INST, 一条指令
-                                for item in ref:
-                                    new_out_state.update(item)
-                                    for nc_output_state in new_nc_out_state_list:
-                                        nc_output_state.update(item)
-                            else:
-                                # RefType.DATA, 数据确定其对应的数据块(1)。
-                                if len(ref) == 1:
-                                    new_out_state.update(list(ref)[0])
-                                    for nc_output_state in new_nc_out_state_list:
-                                        nc_output_state.update(list(ref)[0])
-                                # RefType.DATA, 数据无法确定对应的数据块，所以赋值为可能对应的多个数据块(>1)，分别进行更新再合并。
-                                if len(ref) > 1:
-                                    " state进行更新 "
-                                    state_list = []
-                                    for may_access_ref in ref:
-                                        state = deepcopy(new_out_state)
-                                        state.update(may_access_ref)
-                                        state_list.append(state)
-                                    new_out_state = sum(state_list[1:], start=state_list[0])
+                    new_out_state = MultiLevelCacheState(multilevel_cache_config=self.__cache_config)
+                    new_nc_out_state_list = [new_out_state]
+            else:
+                """ 该结点的新的out_state是新的in_state与将当前结点的所有mem_blocks进行update的结果。 """
+                new_out_state = deepcopy(self.__state_map[cur_node_ident].in_state)
+                new_out_state.reset_dirty()
+                new_nc_out_state_list = deepcopy(self.__state_map[cur_node_ident].nc_in_state_list)
+                for ref in refs[cur_node_ident]:
+                    if ref:
+                        if list(ref)[0].ref_type == RefType.INST:
+                            # RefType.INST, 一条指令
+                            for item in ref:
+                                new_out_state.update(item)
+                                for nc_output_state in new_nc_out_state_list:
+                                    nc_output_state.update(item)
+                        else:
+                            # RefType.DATA, 数据确定其对应的数据块(1)。
+                            if len(ref) == 1:
+                                new_out_state.update(list(ref)[0])
+                                for nc_output_state in new_nc_out_state_list:
+                                    nc_output_state.update(list(ref)[0])
+                            # RefType.DATA, 数据无法确定对应的数据块，所以赋值为可能对应的多个数据块(>1)，分别进行更新再合并。
+                            if len(ref) > 1:
+                                " state进行更新 "
+                                state_list = []
+                                for may_access_ref in ref:
+                                    state = deepcopy(new_out_state)
+                                    state.update(may_access_ref)
+                                    state_list.append(state)
+                                new_out_state = sum(state_list[1:], start=state_list[0])
 
-                                    " nc state进行更新 "
+                                " nc state进行更新 "
+                                nc_state_list = []
+                                for nc_output_state in new_nc_out_state_list:  # 对于nc list中的每个state更新多个内存块再join
                                     nc_state_list = []
-                                    for nc_output_state in new_nc_out_state_list:  # 对于nc list中的每个state更新多个内存块再join
-                                        nc_state_list = []
-                                        for may_access_ref in ref:
-                                            nc_state = deepcopy(nc_output_state)
-                                            nc_state.update(may_access_ref)
-                                            nc_state_list.append(nc_state)  # 每个state更新多个内存块合并的状态
-                                        nc_new_out_state = sum(nc_state_list[1:], start=nc_state_list[0])
-                                        nc_state_list.append(nc_new_out_state)
-                                    new_nc_out_state_list = nc_state_list
-
-                self.__state_map[cur_node_ident].out_state = new_out_state
-                self.__state_map[cur_node_ident].nc_out_state_list = new_nc_out_state_list
-
-                """ 将该节点所有的后继结点加入队列q中。 """
-                successor: Set[InnerProcNode] = set()
-                for edge in self.__proc.edges:
-                    if edge.src == cur_node:
-                        successor.add(edge.dst.name)
-
-                q.extend(node for node in successor if node in node_considered)
+                                    for may_access_ref in ref:
+                                        nc_state = deepcopy(nc_output_state)
+                                        nc_state.update(may_access_ref)
+                                        nc_state_list.append(nc_state)  # 每个state更新多个内存块合并的状态
+                                    nc_new_out_state = sum(nc_state_list[1:], start=nc_state_list[0])
+                                    nc_state_list.append(nc_new_out_state)
+                                new_nc_out_state_list = nc_state_list
+
+                if in_changed is not None:
+                    out_candidates = defaultdict(set)
+                    for changed in (in_changed, new_out_state.dirty_sets, old_out_state.dirty_sets):
+                        for key, set_indexes in changed.items():
+                            out_candidates[key] |= set_indexes
+
+            self.__state_map[cur_node_ident].out_state = new_out_state
+            self.__state_map[cur_node_ident].nc_out_state_list = new_nc_out_state_list
+
+            """ 
+            只有当out_state发生变化时，后继结点的in_state才可能发生变化，此时才将其重新加入工作表；
+            尚未访问过的后继结点则总是需要加入工作表。
+            """
+            out_changed = new_out_state.changed_sets(old_out_state, out_candidates)
+            compared_sets += set_count if out_candidates is None else \
+                sum(len(set_indexes) for set_indexes in out_candidates.values())
+            full_compared_sets += set_count
+            for successor in self.__proc.successors[cur_node_ident]:
+                if successor not in node_considered:
+                    continue
+                for key, set_indexes in out_changed.items():
+                    pending[successor].setdefault(key, set()).update(set_indexes)
+                if successor in in_worklist:
+                    continue
+                if out_changed or successor not in checked:
+                    heapq.heappush(worklist, (rpo_index[successor], successor))
+                    in_worklist.add(successor)
 
         if self.__debug:
             with open(self.__debug_path + "/fixpoint_time.txt", 'a') as file:
-                file.write(file_txt)
+                file.write(proc_name + " in " + str(visit_count) + " node visits fixpoint, " + str(compared_sets)
+                           + " sets compared (" + str(full_compared_sets) + " with whole-state comparison) \n")
+
+        " 保存过程摘要 "
+        self.__summaries[input_key] = (EntryState, DummyNodes_State, self.__state_map)
+        if len(self.__summaries) > SUMMARY_CACHE_SIZE:
+            self.__summaries.popitem(last=False)
+        return False
@@ -0,0 +1,116 @@
+import multiprocessing
+import traceback
+from typing import List, Dict, Hashable, Optional, Set, Tuple
+
+from src.cache.abstract_state import MultiLevelCacheState
+from src.cache.fixpoint import Fixpoint, FixpointState
+from src.cache.memory_ref import Reference
+
+" 一次函数级不动点迭代的任务：(函数序号, EntryState, DummyNodes_State) "
+FixpointTask = Tuple[int, Optional[MultiLevelCacheState], Optional[Dict[Hashable, MultiLevelCacheState]]]
+
+
+def _worker_loop(fixpoints: Dict[int, Fixpoint],
+                 refs: Dict[int, Dict[Hashable, List[Set[Reference]]]],
+                 boundary_nodes: Dict[int, Set[Hashable]],
+                 task_queue, result_queue):
+    """
+    工作进程的主循环。工作进程由 fork 创建，直接继承父进程中属于自己的 Fixpoint 对象，
+    因此各函数的 state_map 始终保存在工作进程内，与顺序执行时一样在多轮迭代之间延续。
+    """
+    while True:
+        message = task_queue.get()
+        if message[0] == 'run':
+            _, index, entry_state, dummy_nodes_state = message
+            try:
+                reused = fixpoints[index].do_analysis(refs[index], EntryState=entry_state,
+                                                      DummyNodes_State=dummy_nodes_state)
+                state_map = fixpoints[index].state_map
+                result_queue.put(('done', index,
+                                  (reused, {name: state_map[name].out_state for name in boundary_nodes[index]})))
+            except Exception:
+                result_queue.put(('error', index, traceback.format_exc()))
+        elif message[0] == 'collect':
+            result_queue.put(('state_maps', None, {index: fixpoint.state_map for index, fixpoint in fixpoints.items()}))
+        else:
+            break
+
+
+class FixpointWorkerPool:
+    """
+    在多个进程中并行执行函数级的不动点迭代。
+
+    每个函数固定由一个工作进程负责（按序号轮流分配），父进程与工作进程之间只交换函数的
+    EntryState、DummyNodes_State，以及函数边界结点（出口结点、调用结点）的 out_state。
+    所有函数分析结束后，通过 ``collect`` 一次性取回完整的 state_map。
+    """
+
+    def __init__(self, fixpoints: List[Fixpoint],
+                 refs: List[Dict[Hashable, List[Set[Reference]]]],
+                 boundary_nodes: List[Set[Hashable]],
+                 jobs: int):
+        self.__fixpoints = fixpoints
+        self.__refs = refs
+        self.__boundary_nodes = boundary_nodes
+        self.__worker_number = max(1, min(jobs, len(fixpoints)))
+        self.__context = multiprocessing.get_context('fork')
+        self.__result_queue = None
+        self.__task_queues = []
+        self.__workers = []
+
+    def owner(self, index: int) -> int:
+        return index % self.__worker_number
+
+    def __enter__(self):
+        self.__result_queue = self.__context.Queue()
+        for worker_index in range(self.__worker_number):
+            indexes = [index for index in range(len(self.__fixpoints)) if self.owner(index) == worker_index]
+            task_queue = self.__context.Queue()
+            worker = self.__context.Process(target=_worker_loop,
+                                            args=({index: self.__fixpoints[index] for index in indexes},
+                                                  {index: self.__refs[index] for index in indexes},
+                                                  {index: self.__boundary_nodes[index] for index in indexes},
+                                                  task_queue, self.__result_queue),
+                                            daemon=True)
+            worker.start()
+            self.__task_queues.append(task_queue)
+            self.__workers.append(worker)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for task_queue in self.__task_queues:
+            task_queue.put(('stop',))
+        for worker in self.__workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self.__task_queues = []
+        self.__workers = []
+
+    def run(self, tasks: List[FixpointTask]) -> Dict[int, Tuple[bool, Dict[Hashable, MultiLevelCacheState]]]:
+        """
+        执行一组相互独立的函数级不动点迭代，返回 {函数序号: (是否使用了过程摘要, {边界结点: out_state})}。
+        结果按函数序号保存，与各工作进程完成的先后顺序无关。
+        """
+        for index, entry_state, dummy_nodes_state in tasks:
+            self.__task_queues[self.owner(index)].put(('run', index, entry_state, dummy_nodes_state))
+
+        results: Dict[int, Tuple[bool, Dict[Hashable, MultiLevelCacheState]]] = dict()
+        for _ in tasks:
+            kind, index, payload = self.__result_queue.get()
+            if kind == 'error':
+                raise RuntimeError("Fixpoint analysis of {} failed in worker:\n{}".format(
+                    self.__fixpoints[index].proc.name, payload))
+            results[index] = payload
+        return results
+
+    def collect(self) -> Dict[int, Dict[Hashable, FixpointState]]:
+        """ 取回所有函数的 state_map。 """
+        for task_queue in self.__task_queues:
+            task_queue.put(('collect',))
+
+        state_maps: Dict[int, Dict[Hashable, FixpointState]] = dict()
+        for _ in self.__task_queues:
+            _, _, payload = self.__result_queue.get()
+            state_maps.update(payload)
+        return state_maps
@@ -32,6 +32,10 @@ class Procedure:
         self.dummyNodes_state: Optional[Dict[Hashable, MultiLevelCacheState]] = None
         self.dummyNodes_state_nc: Optional[Dict[Hashable, List[MultiLevelCacheState]]] = None
 
+        # 前驱/后继索引（结点名 -> 结点名元组），在CFG构建完成后首次访问时一次性建立
+        self.__predecessors: Optional[Dict[Hashable, Tuple[Hashable, ...]]] = None
+        self.__successors: Optional[Dict[Hashable, Tuple[Hashable, ...]]] = None
+
     def set_as_plt(self):
         warnings.warn(f"This procedure is considered as a plt-procedure. Procedure name: {self.__name}")
         self.__is_plt = True
@@ -55,6 +59,33 @@ class Procedure:
         """ Return a tuple containing all instructions of the procedure in order. Modifications to it is illegal. """
         return self.__instructions
 
+    def __build_adjacency(self):
+        """
+        根据 ``self.edges`` 一次性建立前驱和后继索引。同一对结点之间的重复边只记录一次，顺序与边的添加顺序一致。
+        该索引在首次访问时建立，因此只能在CFG构建（即所有边都已添加）完成之后访问。
+        """
+        predecessors: Dict[Hashable, Dict[Hashable, None]] = {node.name: dict() for node in self.nodes}
+        successors: Dict[Hashable, Dict[Hashable, None]] = {node.name: dict() for node in self.nodes}
+        for edge in self.edges:
+            successors.setdefault(edge.src.name, dict())[edge.dst.name] = None
+            predecessors.setdefault(edge.dst.name, dict())[edge.src.name] = None
+        self.__predecessors = {name: tuple(preds) for name, preds in predecessors.items()}
+        self.__successors = {name: tuple(succs) for name, succs in successors.items()}
+
+    @property
+    def predecessors(self) -> Dict[Hashable, Tuple[Hashable, ...]]:
+        """ Return the mapping from node name to the names of its predecessors inside the procedure. """
+        if self.__predecessors is None:
+            self.__build_adjacency()
+        return self.__predecessors
+
+    @property
+    def successors(self) -> Dict[Hashable, Tuple[Hashable, ...]]:
+        """ Return the mapping from node name to the names of its successors inside the procedure. """
+        if self.__successors is None:
+            self.__build_adjacency()
+        return self.__successors
+
     def add_proc_segmentation(self, all_nodes):
         self.nodes = all_nodes
         if self.nodes == []:
@@ -1,8 +1,30 @@
 from src.cfg import *
 from src.isa_base import InstructionType
 from src.read_segment import SegmentReader
+import os
 import re
-from multiprocessing import Pool as MPPool, Manager as MPManager
+import multiprocessing
+from typing import List, Tuple, Optional
+
+" 一条 load/store 指令的回溯结果：(结点名, 指令地址, 是否找到, 基地址, 偏移, 是否为数组等范围访问) "
+TraceRecord = Tuple[str, int, bool, int, int, bool]
+
+"""
+除去 load/store 指令最多的函数之外，其余函数中的 load/store 指令少于该值时顺序回溯。
+一个函数只能由一个进程回溯，进程池的耗时不会少于最大的函数，只有其余函数的回溯可以与它重叠。
+在 benchmark/MRTC 上测得：创建进程池约需 15 ms，顺序回溯平均每条 load/store 指令 12~50 µs；
+nsichneu 的 3685 条、fdct 的 366 条 load/store 指令几乎全部的回溯时间都在一个函数中，进程池从未更快。
+两个工作进程时收支平衡点在 1000~2500 条之间，MRTC 中最多的 adpcm 只有 598 条，因此 MRTC 全部顺序回溯。
+"""
+SERIAL_LS_THRESHOLD = 2000
+
+" fork 前设置为当前的 Addr_Finder，工作进程通过它直接访问已经加载好的 CFG（写时复制），任务只需传递函数的序号 "
+_ACTIVE_FINDER: Optional['Addr_Finder'] = None
+
+
+def _trace_procedure(proc_index: int) -> List[TraceRecord]:
+    """ 工作进程中执行的任务。 """
+    return _ACTIVE_FINDER.trace_procedure(_ACTIVE_FINDER.procedures[proc_index])
 
 
 class Reg_Addr:
@@ -107,38 +129,65 @@ class Reg_Tracker:
 
 
 class Addr_Finder:
-    def __init__(self, proc_net, seg_reader, output_path, node_name2obj, ins_name2obj):
+    def __init__(self, proc_net, seg_reader, output_path, node_name2obj, ins_name2obj,
+                 jobs: Optional[int] = None, serial_threshold: int = SERIAL_LS_THRESHOLD):
+        """
+        Args:
+            jobs: 回溯 load/store 指令时最多使用的进程数，None 表示 CPU 核数。
+            serial_threshold: 可以并行回溯的 load/store 指令少于该值时顺序回溯，见 ``SERIAL_LS_THRESHOLD`` 。
+        """
         self.__proc_net = proc_net
+        self.__jobs = jobs
+        self.__serial_threshold = serial_threshold
         self.__re_num = re.compile(r"(((?:#[1-9]\d*)|(?:#0x[0-9a-fA-F]*)|(?:[1-9]\d*)|(?:0x[0-9a-fA-F]*)))")
         self.__seg_reader = seg_reader
         self.__output_path = output_path
         self.node_name2obj = node_name2obj
         self.ins_name2obj = ins_name2obj
+        self.__segments: Optional[Tuple[list, list]] = None  # (bss, data)，第一次使用时从 D.asm 中解析
         self.find_global_ins_mb()
         self.mp_find_mb()
         # for proc in self.__proc_net.procedures:
         #     self.find_global_data_mb(proc)
 
+    @property
+    def procedures(self) -> List[Procedure]:
+        return self.__proc_net.procedures
+
     def mp_find_mb(self):
-        mppQueue = MPManager().Queue()
-        mpPool = MPPool()
-        proc_num = 0
-        for proc in self.__proc_net.procedures:
-            mpPool.apply_async(self.find_global_data_mb, args=(proc, mppQueue))
-        mpPool.close()  # 关闭pool使其不接受新的线程
-        mpPool.join()  # 等所有的进程执行完毕
-
-        temp_list = []
-        while not mppQueue.empty():
-            temp = mppQueue.get()
-            temp_list.append(temp)
-        for temp in temp_list:
-            reg_tracker = temp[0]
-            node = temp[1]
-            real_node = self.node_name2obj[node.name]
-            read_ins = self.ins_name2obj[reg_tracker.ins.addr.val()]
-
-            self.tracker2mb(self.__seg_reader, reg_tracker, real_node, read_ins)
+        """ 回溯所有 load/store 指令的访存地址，并将结果记录到对应的结点中。 """
+        results = self.trace_all(self.__jobs, self.__serial_threshold)
+        for records in results:
+            for record in records:
+                real_node = self.node_name2obj[record[0]]
+                read_ins = self.ins_name2obj[record[1]]
+                self.record2mb(record, real_node, read_ins)
+
+    def trace_all(self, jobs: Optional[int] = None, serial_threshold: int = SERIAL_LS_THRESHOLD) \
+            -> List[List[TraceRecord]]:
+        """
+        回溯所有含有 load/store 指令的函数，返回各函数的回溯结果，按函数序号的顺序排列，与是否并行无关。
+
+        各函数的回溯互相独立：进程池只在 fork 时创建一次，工作进程继承已经构建好的 CFG，任务只传递函数序号，
+        结果为紧凑的元组列表。除去最大的函数之外的 load/store 指令少于 ``serial_threshold`` 或者只有一个进程可用时
+        直接顺序回溯。
+        """
+        global _ACTIVE_FINDER
+        ls_number = [sum(1 for ins in proc.instruction if ins.is_ls) for proc in self.procedures]
+        proc_indexes = [idx for idx, number in enumerate(ls_number) if number]
+        workers = min(jobs or os.cpu_count() or 1, len(proc_indexes))
+        # 最大的函数只能由一个进程回溯，只有其余函数的回溯可以与它并行
+        parallel_ls = sum(ls_number) - max(ls_number, default=0)
+
+        if parallel_ls < serial_threshold or workers <= 1 or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            return [self.trace_procedure(self.procedures[idx]) for idx in proc_indexes]
+        _ACTIVE_FINDER = self
+        try:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                return pool.map(_trace_procedure, proc_indexes)
+        finally:
+            _ACTIVE_FINDER = None
 
     def find_global_ins_mb(self):
         '''找ins addr'''
@@ -154,8 +203,9 @@ class Addr_Finder:
             for node in proc.nodes:
                 find_ins_node_addr(node)
 
-    def find_global_data_mb(self, proc, mppQueue):
+    def trace_procedure(self, proc) -> List[TraceRecord]:
         """找load/store 寄存器对应的addr"""
+        records: List[TraceRecord] = []
         for node in proc.nodes:
             for ins in node.instructions:
                 if ins.is_ls:
@@ -172,8 +222,9 @@ class Addr_Finder:
                                 is_sp = True
                     reg_tracker = Reg_Tracker(reg_str_list, ins.ls_addr_offset, ins, is_sp)
                     self.find_ins_data_mb(node, ins, reg_tracker)
-                    mppQueue.put((reg_tracker, node))
-                    # self.tracker2mb(self.__seg_reader, reg_tracker, node)
+                    records.append((node.name, ins.addr.val(), reg_tracker.is_find, reg_tracker.base_addr,
+                                    reg_tracker.offset, reg_tracker.is_range))
+        return records
 
     def find_ins_data_mb(self, node, target_ins, reg_tracker):
         """这部分主要是确定了需要符号执行的指令之后用来遍历用的"""
@@ -272,18 +323,22 @@ class Addr_Finder:
 
         return offset
 
-    def tracker2mb(self, seg_reader, reg_tracker, node, read_ins):
+    def __get_segments(self) -> Tuple[list, list]:
+        """ .bss 和 .data 段中的变量，只解析一次 D.asm。 """
+        if self.__segments is None:
+            self.__segments = (self.__seg_reader.get_bss(), self.__seg_reader.get_data())
+        return self.__segments
+
+    def record2mb(self, record: TraceRecord, node, read_ins):
         ins = read_ins
 
-        base_addr = reg_tracker.base_addr
-        addr_offset = reg_tracker.offset
+        _, _, is_find, base_addr, addr_offset, find_range = record
         addr = addr_offset + base_addr
         cur_node = node
-        find_range = reg_tracker.is_range
 
-        if reg_tracker.is_find:
+        if is_find:
             is_add = False
-            bss = seg_reader.get_bss()
+            bss, data = self.__get_segments()
             # if ins.addr.hex_str() == "4006c4":
             #     print("here",base_addr)
             for i in bss:
@@ -307,7 +362,6 @@ class Addr_Finder:
 
                     break
 
-            data = seg_reader.get_data()
             for i in data:
                 addr_lowerer = i[2]
                 addr_upper = i[3]
@@ -0,0 +1,101 @@
+import os
+import glob
+import pickle
+import hashlib
+import functools
+import zlib
+import warnings
+import dataclasses
+from typing import Optional, Set, List
+
+from src.cfg import ProcedureNetwork, InnerProcCFG, Procedure, InnerProcLoop
+
+" 缓存格式的版本号，前端的数据结构发生变化时需要增加，使旧的缓存失效 "
+FRONTEND_CACHE_VERSION = 1
+
+" 前端的源文件，其内容也参与缓存键的计算，修改前端代码后旧的缓存自动失效 "
+FRONTEND_SOURCES = ('read_asm.py', 'read_segment.py', 'isa.py', 'isa_base.py', 'cfg.py', 'find_addr.py',
+                    'frontend_cache.py')
+
+
+@functools.lru_cache(maxsize=None)
+def frontend_source_digest() -> bytes:
+    """ 前端源文件内容的哈希值，每个进程只计算一次。 """
+    digest = hashlib.sha256()
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in FRONTEND_SOURCES:
+        with open(os.path.join(src_dir, name), 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.digest()
+
+
+@dataclasses.dataclass
+class FrontendArtifacts:
+    """ 前端（读取汇编文件、构建 CFG、查找访存地址）的全部结果。 """
+    proc_network: ProcedureNetwork
+    cfg: InnerProcCFG
+    related_procs: Set[Procedure]
+    regular_loops: Set[InnerProcLoop]
+
+
+class FrontendCache:
+    """
+    以汇编文件内容的哈希值为键，在磁盘上缓存前端的结果。
+
+    缓存保存在 ``cache_dir`` 下的 ``frontend-<hash>.bin`` 中，内容为经过 zlib 压缩的 pickle。
+    哈希值由 .asm、D.asm 文件的内容、需要跳过的 plt 函数、``FRONTEND_CACHE_VERSION`` 以及前端源文件
+    （``FRONTEND_SOURCES``）的内容计算得到，任何一个发生变化时都会得到新的键，旧的缓存文件在写入新缓存时被删除。
+    """
+
+    def __init__(self, cache_dir: str, asm_path: str, asm_d_path: str, skip_as_plt: List[str]):
+        self.__cache_dir = cache_dir
+
+        digest = hashlib.sha256()
+        digest.update(str(FRONTEND_CACHE_VERSION).encode())
+        digest.update(frontend_source_digest())
+        for path in (asm_path, asm_d_path):
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        digest.update(repr(sorted(skip_as_plt)).encode())
+        self.__key = digest.hexdigest()
+
+    @property
+    def key(self) -> str:
+        return self.__key
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.__cache_dir, 'frontend-{}.bin'.format(self.__key[:32]))
+
+    def load(self) -> Optional[FrontendArtifacts]:
+        """ 读取缓存，缓存不存在或者无法读取时返回 None。 """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                data = zlib.decompress(f.read())
+            artifacts = pickle.loads(data)
+        except Exception as e:
+            warnings.warn("Ignore broken frontend cache {}: {!r}".format(self.path, e))
+            return None
+        return artifacts if isinstance(artifacts, FrontendArtifacts) else None
+
+    def store(self, artifacts: FrontendArtifacts):
+        """ 写入缓存，并删除同一目录下其他（已经失效的）缓存文件。 """
+        try:
+            data = pickle.dumps(artifacts, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # 结点、边之间互相引用，规模很大的 CFG 可能超出 pickle 的递归深度
+            warnings.warn("The CFG is too deep to be cached.")
+            return
+
+        os.makedirs(self.__cache_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(self.__cache_dir, 'frontend-*.bin')):
+            if stale != self.path:
+                os.remove(stale)
+        # 先写入临时文件再重命名，避免中断时留下不完整的缓存
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(zlib.compress(data, 1))
+        os.replace(temp_path, self.path)
+
@@ -7,8 +7,9 @@
 """
 import os.path
 import re
+import mmap
 from enum import Enum, auto
-from typing import List
+from typing import List, Tuple, Iterator
 
 class StatementType(Enum):
 
@@ -17,6 +18,41 @@ class StatementType(Enum):
     Other = auto()
 
 
+" 一条语句的解析结果：(语句类型, 正则表达式匹配得到的各个分组, 去掉首尾空白的原始语句) "
+AsmRecord = Tuple[StatementType, tuple, str]
+
+
+def stream_asm_statements(file_path: str) -> Iterator[AsmRecord]:
+    """
+    逐行读取内存映射（mmap）的汇编文件，惰性地返回每条非空语句的解析结果。
+
+    两种正则表达式都要求语句中含有冒号，并且只有以 ``>:`` 结尾的语句才可能是 sub-procedure 的标签，
+    因此先用这两个简单的判断决定语句的类型，每条语句最多只进行一次正则匹配。
+    """
+    re_inst, re_subproc = AsmFileReader.re_inst, AsmFileReader.re_subproc
+    with open(file_path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                s = line.decode('utf-8').strip()
+                if not s:
+                    continue
+                if ':' not in s:
+                    yield StatementType.Other, (), s
+                    continue
+                if s.endswith('>:'):
+                    matched = re_subproc.match(s)
+                    if matched:
+                        yield StatementType.SubProcedure, matched.groups(), s
+                        continue
+                matched = re_inst.match(s)
+                if matched:
+                    yield StatementType.Instruction, matched.groups(), s
+                else:
+                    yield StatementType.Other, (), s
+
+
 class AsmFileReader:
     # Use to match instructions in asm file.
     restr_inst = r"^\s*([0-9a-fA-F]*):\s*([00-9a-fA-F]{8})\s*([A-Za-z0-9]+)(?:\.([A-Za-z0-9]+))?\s*(.*?)(?://.*)?$"
@@ -34,19 +70,10 @@ class AsmFileReader:
         if not (os.path.isfile(self.__fpath)):
             raise FileNotFoundError("Unexpected file path {}.".format(self.__fpath))
 
-        with open(self.__fpath, 'rt', encoding='utf-8') as fp:
-            self.__statements = [s.strip() for s in fp.readlines() if len(s.strip()) != 0]
-        
-        for s in self.__statements:
-            is_instruction = re.match(self.re_inst, s)
-            is_subproc = re.match(self.re_subproc, s)
-            if is_instruction:
-                self.__parsed_statements.append((StatementType.Instruction, is_instruction.groups()))
-            elif is_subproc:
-                self.__parsed_statements.append((StatementType.SubProcedure, is_subproc.groups()))
+        for ty, tokens, s in stream_asm_statements(self.__fpath):
+            self.__statements.append(s)
             # 实验性，之前并未考虑到不只有ins和subpro两种情况，
-            else:
-                self.__parsed_statements.append((StatementType.Other, ""))
+            self.__parsed_statements.append((ty, tokens) if ty != StatementType.Other else (ty, ""))
 
 
     @property
@@ -20,6 +20,27 @@ class TestbenchConfig:
     execution_intervals: Optional[List[dict[str, int]]] = None
 
 
+def read_instruction_data(instruction_data_path):
+    """ 读取 instruction_data.json，返回 (target_range, execution_intervals)，地址均转换为整数 """
+    with open(instruction_data_path, 'r') as f:
+        instruction_data = json.load(f)
+    # 将target_range和execution_intervals中的地址转换为十六进制
+    target_range = (
+        int(instruction_data['target_range']['start_address'], 16),
+        int(instruction_data['target_range']['end_address'], 16)
+    )
+
+    execution_intervals = [
+        {
+            'start_address': int(interval['start_address'], 16),
+            'end_address': int(interval['end_address'], 16),
+            'execution_count': interval['execution_count']
+        }
+        for interval in instruction_data['execution_intervals']
+    ]
+    return target_range, execution_intervals
+
+
 def read_config(tbf, **kwargs):
 
     config_path = os.path.join(tbf, 'config.json')
@@ -32,28 +53,13 @@ def read_config(tbf, **kwargs):
         target_range = None
         execution_intervals = None
     else:
-        with open(instruction_data_path, 'r') as f:
-            instruction_data = json.load(f)
-        # 将target_range和execution_intervals中的地址转换为十六进制
-        target_range = (
-            int(instruction_data['target_range']['start_address'], 16),
-            int(instruction_data['target_range']['end_address'], 16)
-        )
-
-        execution_intervals = [
-            {
-                'start_address': int(interval['start_address'], 16),
-                'end_address': int(interval['end_address'], 16),
-                'execution_count': interval['execution_count']
-            }
-            for interval in instruction_data['execution_intervals']
-        ]
+        target_range, execution_intervals = read_instruction_data(instruction_data_path)
 
     config = TestbenchConfig(
         benchmark_name=data['benchmark'],
         asm_path=os.path.join(tbf, data['asm']),
         asm_d_path=os.path.join(tbf, data['asm_detailed']),
-        procedure_cfg=data['procedure_cfg'],
+        procedure_cfg=data.get('procedure_cfg', []),
         user_plt=data['skip_as_plt'],
         target_range = target_range,
         execution_intervals = execution_intervals
@@ -0,0 +1,122 @@
+"""
+Abstract Cache State 写时复制、哈希值、列映射以及两种存储方式一致性的回归测试。
+
+用法（在 ARM64 目录下运行）：
+    python -m tests.abstract_state_test
+"""
+import gc
+import pickle
+import random
+
+from src.cache.abstract_state import CacheState, ArrayCacheState, TagColumns, MultiLevelCacheState
+from src.cache.cache_config import CacheConfig, MultiLevelCacheConfig
+from src.cache.constants import CacheAnalysisMethod, CacheHierarchy, CacheStateBackend
+from src.cache.memory_block import MemoryBlock
+
+cache_config = CacheConfig(CacheHierarchy.L1D, set_number=4, line_size=64, associativity=4)
+inst_cache_config = CacheConfig(CacheHierarchy.L1I, set_number=4, line_size=64, associativity=4)
+
+
+def blocks(tags, set_index=0):
+    return [MemoryBlock(tag, set_index, CacheHierarchy.L1D) for tag in tags]
+
+
+def test_self_join(state_class, analysis_type):
+    """ Join 的两个操作数共享 set 时，之后对任意一个操作数的写入都不能改变 Join 的结果。 """
+    state = state_class(cache_config, analysis_type)
+    for mb in blocks([1, 2]) + blocks([3], set_index=1):
+        state.updateL1(mb)
+
+    joined = state + state
+    expected = joined.get_all_set_lines()
+    for mb in blocks([4, 5]) + blocks([6], set_index=1):
+        state.updateL1(mb)
+    assert joined.get_all_set_lines() == expected, (state_class.__name__, analysis_type)
+    assert state.get_all_set_lines() != expected
+
+    # 反过来，写入 Join 的结果也不能改变操作数
+    other = state_class(cache_config, analysis_type)
+    other.updateL1(blocks([7])[0])
+    joined = other + other
+    expected = other.get_all_set_lines()
+    joined.updateL1(blocks([8])[0])
+    assert other.get_all_set_lines() == expected, (state_class.__name__, analysis_type)
+
+
+def test_fingerprint_width(analysis_type):
+    """ 其他实例登记新的 tag 之后，已有状态的哈希值不变，内容相同的状态的哈希值相同。 """
+    tag_columns = TagColumns()
+    state = ArrayCacheState(cache_config, analysis_type, tag_columns)
+    for mb in blocks([0x100, 0x101]):
+        state.updateL1(mb)
+    fingerprint = state.fingerprint()
+
+    other = ArrayCacheState(cache_config, analysis_type, tag_columns)
+    for mb in blocks([0x100, 0x101, 0x102]):
+        other.updateL1(mb)
+    assert state.fingerprint() == fingerprint, analysis_type
+
+    # 在新登记的 tag 之后才写入的状态，矩阵更宽，但内容与 state 相同
+    same = ArrayCacheState(cache_config, analysis_type, tag_columns)
+    for mb in blocks([0x100, 0x101]):
+        same.updateL1(mb)
+    assert same == state and same.fingerprint() == fingerprint, analysis_type
+
+
+def test_backend_parity(analysis_type, seeds=200, steps=40):
+    """ 随机的 updateL1/L2/L3/U 以及 Join 序列下，两种存储方式的状态完全相同。 """
+    for seed in range(seeds):
+        rng = random.Random(seed)
+        tag_columns = TagColumns()
+        dict_states = [CacheState(cache_config, analysis_type) for _ in range(2)]
+        array_states = [ArrayCacheState(cache_config, analysis_type, tag_columns) for _ in range(2)]
+        for step in range(steps):
+            idx = rng.randrange(2)
+            if rng.random() < 0.1:
+                dict_states[idx] = dict_states[0] + dict_states[1]
+                array_states[idx] = array_states[0] + array_states[1]
+            else:
+                mb = blocks([rng.randrange(10)], set_index=rng.randrange(cache_config.set_number))[0]
+                update = rng.choice(['updateL1', 'updateL2', 'updateL3', 'updateU'])
+                getattr(dict_states[idx], update)(mb)
+                getattr(array_states[idx], update)(mb)
+            assert dict_states[idx].get_all_set_lines() == array_states[idx].get_all_set_lines(), \
+                (analysis_type, seed, step)
+
+
+def test_tag_columns_per_analysis():
+    """ 列映射属于一次分析的配置：不同分析互不影响，配置释放后映射也被释放，序列化后仍共享同一个映射。 """
+    multilevel_configs = [MultiLevelCacheConfig({CacheHierarchy.L1I: inst_cache_config,
+                                                 CacheHierarchy.L1D: cache_config},
+                                                state_backend=CacheStateBackend.ARRAY)
+                          for _ in range(2)]
+    states = [MultiLevelCacheState(config) for config in multilevel_configs]
+    for tag in range(8):
+        states[0].get_state(CacheAnalysisMethod.MUST, CacheHierarchy.L1D).updateL1(blocks([tag])[0])
+    tag_columns = [config.tag_columns[CacheHierarchy.L1D] for config in multilevel_configs]
+    assert tag_columns[0] is not tag_columns[1]
+    assert len(tag_columns[0]) == 8 and len(tag_columns[1]) == 0
+
+    must = states[0].get_state(CacheAnalysisMethod.MUST, CacheHierarchy.L1D)
+    copied = pickle.loads(pickle.dumps(must))
+    assert copied == must and (copied + must).get_all_set_lines() == must.get_all_set_lines()
+    try:
+        must + states[1].get_state(CacheAnalysisMethod.MUST, CacheHierarchy.L1D)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("States of different analyses must not be joined.")
+
+    token = pickle.dumps(tag_columns[0])
+    del states, multilevel_configs, tag_columns, must, copied
+    gc.collect()
+    assert len(pickle.loads(token)) == 0, "The tag columns must be released with the analysis."
+
+
+for analysis_type in (CacheAnalysisMethod.MUST, CacheAnalysisMethod.MAY, CacheAnalysisMethod.PERSISTENT):
+    test_self_join(CacheState, analysis_type)
+    test_self_join(ArrayCacheState, analysis_type)
+    test_fingerprint_width(analysis_type)
+    test_backend_parity(analysis_type)
+test_tag_columns_per_analysis()
+print("ok")
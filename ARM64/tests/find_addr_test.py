@@ -0,0 +1,45 @@
+"""
+Addr_Finder 并行回溯的回归测试：强制使用进程池时，回溯结果必须与顺序回溯的结果完全相同。
+
+用法（在 ARM64 目录下运行）：
+    python -m tests.find_addr_test [-r benchmark/MRTC]
+"""
+import sys
+import time
+import argparse
+import warnings
+
+from src.util import read_config
+from src.read_asm import AsmFileReader
+from src.read_segment import SegmentReader
+from src.cfg import ProcedureNetwork, InnerProcCFG
+from src.find_addr import Addr_Finder
+from toolset.batch_run import discover_testbenches
+
+warnings.filterwarnings('ignore', category=UserWarning)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-r', '--root', default='benchmark/MRTC')
+args = parser.parse_args()
+
+testbenches = discover_testbenches(args.root)
+assert testbenches, "No testbench under {}.".format(args.root)
+for tbpath in testbenches:
+    config = read_config(tbpath)
+    proc_network = ProcedureNetwork(AsmFileReader(config.asm_path), skip_as_plt=[])
+    InnerProcCFG(proc_network)
+    procedures = proc_network.procedures
+    node_name2obj = {node.name: node for proc in procedures for node in proc.nodes}
+    ins_name2obj = {inst.addr.val(): inst for proc in procedures for inst in proc.instruction}
+    finder = Addr_Finder(proc_network, SegmentReader(config.asm_d_path), None, node_name2obj, ins_name2obj,
+                         serial_threshold=sys.maxsize)
+
+    start = time.perf_counter()
+    serial = finder.trace_all(jobs=1)
+    serial_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pooled = finder.trace_all(jobs=2, serial_threshold=0)
+    pooled_time = time.perf_counter() - start
+
+    assert serial == pooled, config.benchmark_name
+    print("{:<15} serial: {:.4f} s, pool: {:.4f} s".format(config.benchmark_name, serial_time, pooled_time))
@@ -0,0 +1,85 @@
+"""
+对比汇编文件读取的速度：逐行两次正则匹配的原实现与 ``stream_asm_statements``。
+
+用法（在 ARM64 目录下运行）：
+    python -m toolset.asm_reader_benchmark [-r benchmark/MRTC] [-n 5]
+
+对 root 下所有 .asm 文件（包括 D.asm）分别用两种方法读取 n 次，确认结果相同，并输出每秒处理的行数。
+"""
+import os
+import re
+import glob
+import time
+import argparse
+
+from tabulate import tabulate
+
+from src.read_asm import AsmFileReader, StatementType, stream_asm_statements
+
+
+def legacy_read(file_path: str):
+    """ 原 ``AsmFileReader.__init__`` 的实现：readlines() 后每条语句依次匹配两个正则表达式。 """
+    statements, parsed_statements = list(), list()
+    with open(file_path, 'rt', encoding='utf-8') as fp:
+        statements = [s.strip() for s in fp.readlines() if len(s.strip()) != 0]
+    for s in statements:
+        is_instruction = re.match(AsmFileReader.re_inst, s)
+        is_subproc = re.match(AsmFileReader.re_subproc, s)
+        if is_instruction:
+            parsed_statements.append((StatementType.Instruction, is_instruction.groups()))
+        elif is_subproc:
+            parsed_statements.append((StatementType.SubProcedure, is_subproc.groups()))
+        else:
+            parsed_statements.append((StatementType.Other, ""))
+    return statements, parsed_statements
+
+
+def stream_read(file_path: str):
+    statements, parsed_statements = list(), list()
+    for ty, tokens, s in stream_asm_statements(file_path):
+        statements.append(s)
+        parsed_statements.append((ty, tokens) if ty != StatementType.Other else (ty, ""))
+    return statements, parsed_statements
+
+
+def best_time(func, file_path: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--root', default=os.path.join('benchmark', 'MRTC'),
+                        help='The folder containing the .asm files, default is benchmark/MRTC.')
+    parser.add_argument('-n', '--repeat', type=int, default=5,
+                        help='Read every file n times and keep the best time, default is 5.')
+    args = parser.parse_args()
+
+    rows = []
+    total_lines, total_legacy, total_stream = 0, 0.0, 0.0
+    for file_path in sorted(glob.glob(os.path.join(args.root, '**', '*.asm'), recursive=True)):
+        expected = legacy_read(file_path)
+        if stream_read(file_path) != expected:
+            raise RuntimeError("Different statements are read from {}.".format(file_path))
+
+        lines = len(expected[0])
+        legacy_time = best_time(legacy_read, file_path, args.repeat)
+        stream_time = best_time(stream_read, file_path, args.repeat)
+        total_lines += lines
+        total_legacy += legacy_time
+        total_stream += stream_time
+        rows.append([os.path.relpath(file_path, args.root), lines,
+                     round(lines / legacy_time), round(lines / stream_time), round(legacy_time / stream_time, 2)])
+
+    rows.append(['Total', total_lines, round(total_lines / total_legacy), round(total_lines / total_stream),
+                 round(total_legacy / total_stream, 2)])
+    header = ['File', 'Lines', 'Legacy (lines/s)', 'Stream (lines/s)', 'Speedup']
+    print(tabulate(rows, headers=header, tablefmt='psql'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+批量运行 root 下所有包含 config.json 的测试用例，并输出汇总结果。
+
+用法（在 ARM64 目录下运行）：
+    python run_benchmark_cli.py --batch benchmark/MRTC [--batch_jobs 4] [--timeout 600] [--memory_limit 4096]
+
+每个测试用例在一个由 fork 创建的子进程中运行，子进程直接继承父进程中已经导入的模块，无需重新启动解释器。
+超时或超出内存限制的测试用例会被终止，并在汇总结果中记录其状态。每个测试用例的输出保存在
+output/<benchmark>/batch.log 中，汇总结果保存为 <summary>.json 和 <summary>.csv。
+"""
+import os
+import sys
+import csv
+import json
+import time
+import signal
+import resource
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import List, Dict, Optional
+
+from src.util import read_config, Logger
+from src.cache.constants import CacheStateBackend, CHMC
+from core import end2end_run
+
+SUMMARY_FIELDS = ['benchmark', 'path', 'status', 'wall_time', 'peak_rss_mb', 'iterations'] + \
+                 [chmc.name for chmc in CHMC] + ['error']
+
+
+def discover_testbenches(root: str) -> List[str]:
+    """ 返回 root 下所有包含 config.json 的文件夹，按名称排序。以符号链接形式放在 root 下的文件夹同样会被找到。 """
+    testbenches = []
+    for dirpath, _, filenames in os.walk(root, followlinks=True):
+        if 'config.json' in filenames:
+            testbenches.append(dirpath)
+    return sorted(testbenches)
+
+
+def peak_rss_mb() -> float:
+    """ 当前进程及其已结束的子进程（函数级并行时的工作进程）中最大的常驻内存，单位为 MB。 """
+    rss_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(rss_kb / 1024, 1)
+
+
+def run_testbench(tbpath: str, state_backend: CacheStateBackend, jobs: int, use_frontend_cache: bool,
+                  memory_limit: Optional[int], gen_procedure_cfg: bool, skip_user_plt: bool, conn):
+    """ 子进程中运行单个测试用例，并通过 conn 返回统计信息。 """
+    # 子进程及其创建的工作进程属于同一个进程组，超时时可以一起终止
+    os.setpgrp()
+    if memory_limit is not None:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    result = {'status': 'ok', 'benchmark': os.path.basename(tbpath)}
+    try:
+        config = read_config(tbpath, gen_procedure_cfg=gen_procedure_cfg, skip_user_plt=skip_user_plt)
+        result['benchmark'] = config.benchmark_name
+        log_dir = os.path.join('output', config.benchmark_name)
+        os.makedirs(log_dir, exist_ok=True)
+        with open(os.path.join(log_dir, 'batch.log'), 'w') as log_file:
+            sys.stdout = sys.stderr = log_file
+            cache_analyser = end2end_run(config, Logger(verbose=1), state_backend=state_backend, jobs=jobs,
+                                         use_frontend_cache=use_frontend_cache)
+        result['iterations'] = cache_analyser.iteration_count
+        result.update(cache_analyser.chmc_statistics())
+    except MemoryError:
+        result.update(status='memory', error='MemoryError')
+    except Exception as e:
+        result.update(status='error', error=repr(e))
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    result['peak_rss_mb'] = peak_rss_mb()
+    conn.send(result)
+    conn.close()
+
+
+def run_batch(root: str, batch_jobs: int, timeout: Optional[float] = None, memory_limit: Optional[int] = None,
+              state_backend: CacheStateBackend = CacheStateBackend.DICT, jobs: int = 1,
+              summary_path: str = os.path.join('output', 'batch-summary'),
+              use_frontend_cache: bool = True, gen_procedure_cfg: bool = False,
+              skip_user_plt: bool = False) -> List[Dict]:
+    """
+    使用最多 batch_jobs 个子进程并行地运行 root 下的所有测试用例。
+
+    参数:
+        timeout: 单个测试用例的最长运行时间（秒），None 表示不限制
+        memory_limit: 单个测试用例的地址空间上限（MB），None 表示不限制
+        jobs: 每个测试用例内部函数级不动点迭代使用的进程数
+        summary_path: 汇总结果的路径（不含扩展名）
+        use_frontend_cache: 是否使用缓存的前端结果
+        gen_procedure_cfg, skip_user_plt: 与单个测试用例模式下的同名命令行参数相同，应用于每个测试用例
+    """
+    context = multiprocessing.get_context('fork')
+    pending = discover_testbenches(root)
+    running = dict()  # sentinel -> (process, tbpath, start, conn)
+    results: Dict[str, Dict] = dict()
+
+    while pending or running:
+        while pending and len(running) < max(1, batch_jobs):
+            tbpath = pending.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_testbench,
+                                      args=(tbpath, state_backend, jobs, use_frontend_cache, memory_limit,
+                                            gen_procedure_cfg, skip_user_plt, sender))
+            process.start()
+            sender.close()
+            running[process.sentinel] = (process, tbpath, time.perf_counter(), receiver)
+
+        wait(list(running.keys()), timeout=0.5)
+        now = time.perf_counter()
+        for sentinel, (process, tbpath, start, receiver) in list(running.items()):
+            if receiver.poll():
+                result = receiver.recv()
+            elif not process.is_alive():
+                result = {'status': 'crashed', 'error': 'exit code {}'.format(process.exitcode)}
+            elif timeout is not None and now - start > timeout:
+                os.killpg(process.pid, signal.SIGKILL)
+                result = {'status': 'timeout', 'error': 'exceeded {} s'.format(timeout)}
+            else:
+                continue
+            process.join()
+            receiver.close()
+            del running[sentinel]
+
+            result.setdefault('benchmark', os.path.basename(tbpath))
+            result.update(path=tbpath, wall_time=round(now - start, 3))
+            results[tbpath] = result
+            print("{:<20} {:<8} {:>9.3f} s".format(result['benchmark'], result['status'], result['wall_time']))
+
+    rows = [results[tbpath] for tbpath in sorted(results)]
+    write_summary(rows, summary_path)
+    return rows
+
+
+def write_summary(rows: List[Dict], summary_path: str):
+    """ 将汇总结果写入 <summary_path>.json 和 <summary_path>.csv。 """
+    os.makedirs(os.path.dirname(summary_path) or '.', exist_ok=True)
+    with open(summary_path + '.json', 'w') as file:
+        json.dump(rows, file, indent=1)
+    with open(summary_path + '.csv', 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, '') for field in SUMMARY_FIELDS})
@@ -0,0 +1,96 @@
+"""
+对 benchmark 目录下的所有测试用例进行缓存分析不动点迭代的计时。
+
+用法（在 ARM64 目录下运行）：
+    python -m toolset.fixpoint_benchmark [-r benchmark/MRTC] [-b bs fibcall ...] [--state_backend array] [-j 4]
+
+对同一组测试用例分别在改动前后的版本上运行，即可对比不动点迭代部分的耗时。
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import warnings
+
+from tabulate import tabulate
+
+from src.util import read_config
+from src.read_asm import AsmFileReader
+from src.read_segment import SegmentReader
+from src.cfg import ProcedureNetwork, InnerProcCFG
+from src.find_addr import Addr_Finder
+from src.analyser import CacheAnalyser
+from src.cache.constants import CacheStateBackend
+from core import default_cache_config, collect_references
+from toolset.batch_run import discover_testbenches
+
+
+def time_testbench(tbpath: str, debug_path: str, state_backend: CacheStateBackend = CacheStateBackend.DICT,
+                   jobs: int = 1):
+    config = read_config(tbpath)
+
+    start = time.perf_counter()
+    reader = AsmFileReader(config.asm_path)
+    seg_reader = SegmentReader(config.asm_d_path)
+    proc_network = ProcedureNetwork(reader, skip_as_plt=config.user_plt)
+    cfg = InnerProcCFG(proc_network)
+    procedures = proc_network.procedures
+    related_procs = cfg.find_related_procs()
+    regular_loops = {loop for loop in cfg.find_related_loops() if loop.head is not None}
+    node_name2obj = {node.name: node for proc in procedures for node in proc.nodes}
+    ins_name2obj = {inst.addr.val(): inst for proc in procedures for inst in proc.instruction}
+    Addr_Finder(proc_network, seg_reader, debug_path, node_name2obj, ins_name2obj)
+    multilevel_cache_config = default_cache_config(state_backend)
+    proc_inst_ref, proc_data_ref = collect_references(related_procs, multilevel_cache_config)
+    frontend_time = time.perf_counter() - start
+
+    cache_analyser = CacheAnalyser(cfg, multilevel_cache_config, proc_inst_ref, proc_data_ref,
+                                   related_procs, regular_loops, debug_path, debug=False, jobs=jobs)
+    start = time.perf_counter()
+    cache_analyser.do_analysis()
+    fixpoint_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache_analyser.persistent_analysis()
+    persistent_time = time.perf_counter() - start
+
+    nodes = sum(len(proc.nodes) for proc in related_procs)
+    edges = sum(len(proc.edges) for proc in related_procs)
+    return [config.benchmark_name, len(related_procs), nodes, edges,
+            round(frontend_time, 3), round(fixpoint_time, 3), round(persistent_time, 3)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--root', default=os.path.join('benchmark', 'MRTC'),
+                        help='The folder containing the testbenches, default is benchmark/MRTC.')
+    parser.add_argument('-b', '--bench', nargs='*', default=None,
+                        help='Only time the testbenches with the given names.')
+    parser.add_argument('--state_backend', choices=['dict', 'array'], default='dict',
+                        help='The storage of abstract cache states, default is dict.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='The number of processes used to analyze independent procedures, default is 1.')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    rows = []
+    with tempfile.TemporaryDirectory() as debug_path:
+        for tbpath in discover_testbenches(args.root):
+            if args.bench and os.path.basename(tbpath) not in args.bench:
+                continue
+            try:
+                rows.append(time_testbench(tbpath, debug_path, CacheStateBackend[args.state_backend.upper()],
+                                           args.jobs))
+            except Exception as e:
+                print(f"{tbpath} failed: {e!r}", file=sys.stderr)
+            else:
+                print(tabulate([rows[-1]], tablefmt='plain'), file=sys.stderr)
+
+    header = ['Benchmark', 'Procs', 'Nodes', 'Edges', 'Front-end (s)', 'Fixpoint (s)', 'Persistent (s)']
+    print(tabulate(rows, headers=header, tablefmt='psql'))
+    print(f"Total fixpoint time: {sum(row[5] for row in rows):.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+对比 ``CacheAnalyser.Statistical`` 中统计指令执行次数、估计 cache misses 的原实现与前缀和实现。
+
+用法（在 ARM64 目录下运行）：
+    python -m toolset.statistical_benchmark [-n 20000] [-m 2000] [-o output/synthetic_instruction_data.json]
+
+生成一个包含 n 条指令、m 个执行区间的 instruction_data.json 以及随机的 L1I/L1D 分类结果，
+分别用两种方法计算，确认 L1I/L1D 的估计结果完全相同，并输出各自的运行时间。
+原实现的时间复杂度为 O(n * m)，规模较大时可以使用 --skip_legacy 只测试新实现。
+"""
+import os
+import json
+import time
+import random
+import argparse
+from typing import Tuple, List, Dict
+
+from tabulate import tabulate
+
+from src.util import read_instruction_data
+from src.analyser import instruction_execution_counts, estimate_cache_misses
+
+BASE_ADDRESS = 0x400000
+CHMC_CHOICES = ['AH', 'AM', 'PS', 0.25, 0.5, 0.75]
+
+
+def generate_instruction_data(path: str, inst_number: int, interval_number: int, seed: int):
+    """ 生成 instruction_data.json：区间端点随机，且不一定与指令地址对齐。 """
+    rng = random.Random(seed)
+    end = BASE_ADDRESS + 4 * (inst_number - 1)
+    intervals = []
+    for _ in range(interval_number):
+        low = rng.randrange(BASE_ADDRESS - 64, end + 64)
+        high = min(end + 64, low + rng.randrange(0, 4 * max(1, inst_number // 8)))
+        intervals.append({'start_address': hex(low), 'end_address': hex(high),
+                          'execution_count': rng.randrange(1, 1000)})
+    instruction_data = {
+        'target_range': {'start_address': hex(BASE_ADDRESS), 'end_address': hex(end)},
+        'execution_intervals': intervals
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(instruction_data, f)
+
+
+def generate_chmc(target_range: Tuple[int, int], seed: int) -> Tuple[Dict[int, float | str], Dict[int, float | str]]:
+    """ 每条指令都有 L1I 分类，约四分之一的指令有 L1D 分类；相邻指令的 L1I 分类经常相同。 """
+    rng = random.Random(seed)
+    L1I_chmc, L1D_chmc = dict(), dict()
+    category = rng.choice(CHMC_CHOICES)
+    for addr in range(target_range[0], target_range[1] + 1, 4):
+        if rng.random() < 0.2:
+            category = rng.choice(CHMC_CHOICES)
+        L1I_chmc[addr] = category
+        if rng.random() < 0.25:
+            L1D_chmc[addr] = rng.choice(CHMC_CHOICES)
+    return L1I_chmc, L1D_chmc
+
+
+def legacy_get_inst_number(addr_range: Tuple[int, int], intervals: List[dict[str, int]]) -> Dict[str, int]:
+    """ 原实现：对每条指令遍历所有执行区间。 """
+    instruction_execution_counts: Dict[str, int] = {}
+    for addr in range(addr_range[0], addr_range[1] + 1, 4):
+        hex_str = hex(addr)[2:]
+        instruction_execution_counts[hex_str] = 0
+        for interval in intervals:
+            if interval['start_address'] <= addr <= interval['end_address']:
+                instruction_execution_counts[hex_str] += interval['execution_count']
+    return instruction_execution_counts
+
+
+def legacy_estimate(target_range: Tuple[int, int], inst_number: Dict[str, int],
+                    L1I_inst_chmc: Dict[str, float | str], L1D_inst_chmc: Dict[str, float | str]) -> Dict[str, float]:
+    """ 原实现：以十六进制字符串为键，先按内存块分组，再估计 L1I、L1D 的 cache misses。 """
+    L1_icache_loads = 0
+    for address in range(target_range[0], target_range[1] + 1, 4):
+        hex_str_no_prefix = hex(address)[2:]
+        if hex_str_no_prefix in L1I_inst_chmc and hex_str_no_prefix in inst_number:
+            L1_icache_loads += inst_number[hex_str_no_prefix]
+
+    mb_list: Dict[int, List[int]] = {}
+    for addr in range(target_range[0], target_range[1] + 1, 4):
+        mb_list.setdefault(addr >> 6, []).append(addr)
+
+    L1_icache_misses = 0
+    L1_icache_misses_noNC = 0
+    for cache_address, inst_addrs in mb_list.items():
+        inst_addrs.sort()
+        start_addr = hex(inst_addrs[0])[2:]
+        current_category = L1I_inst_chmc[start_addr]
+        current_exec_count = inst_number[start_addr]
+        current_miss = 0
+        current_miss_noNC = 0
+        if current_category == 'AH':
+            pass
+        elif current_category == 'AM':
+            current_miss += current_exec_count
+            current_miss_noNC += current_exec_count
+        elif current_category == 'PS':
+            current_miss += 1
+            current_miss_noNC += current_exec_count
+        else:
+            current_miss += current_exec_count * (1 - current_category)
+            current_miss_noNC += current_exec_count
+
+        for i in range(1, len(inst_addrs)):
+            addr = hex(inst_addrs[i])[2:]
+            if L1I_inst_chmc[addr] != current_category or inst_number[addr] != current_exec_count:
+                if L1I_inst_chmc[addr] == 'AH':
+                    pass
+                elif L1I_inst_chmc[addr] == 'AM':
+                    current_miss += inst_number[addr]
+                    current_miss_noNC += inst_number[addr]
+                elif L1I_inst_chmc[addr] == 'PS':
+                    current_miss += 1
+                    current_miss_noNC += 1
+                else:
+                    current_miss += inst_number[addr] * (1 - L1I_inst_chmc[addr])
+                    current_miss_noNC += inst_number[addr]
+                start_addr = addr
+                current_category = L1I_inst_chmc[start_addr]
+                current_exec_count = inst_number[start_addr]
+
+        L1_icache_misses += current_miss
+        L1_icache_misses_noNC += current_miss_noNC
+
+    L1_dcache_loads = 0
+    L1_dcache_misses = 0
+    L1_dcache_misses_noNC = 0
+    for address in range(target_range[0], target_range[1] + 1, 4):
+        hex_str_no_prefix = hex(address)[2:]
+        if hex_str_no_prefix in L1D_inst_chmc and hex_str_no_prefix in inst_number:
+            L1_dcache_loads += inst_number[hex_str_no_prefix]
+            if L1D_inst_chmc[hex_str_no_prefix] == 'AM':
+                L1_dcache_misses += inst_number[hex_str_no_prefix]
+                L1_dcache_misses_noNC += inst_number[hex_str_no_prefix]
+            elif L1D_inst_chmc[hex_str_no_prefix] == 'PS':
+                L1_dcache_misses += 1
+                L1_dcache_misses_noNC += 1
+            elif L1D_inst_chmc[hex_str_no_prefix] == 'AH':
+                pass
+            else:
+                L1_dcache_misses += inst_number[hex_str_no_prefix] * (1 - L1D_inst_chmc[hex_str_no_prefix])
+                L1_dcache_misses_noNC += inst_number[hex_str_no_prefix]
+
+    return {
+        "L1_icache_loads": L1_icache_loads,
+        "L1_icache_misses": L1_icache_misses,
+        "L1_icache_rate": L1_icache_misses / L1_icache_loads,
+        "L1_icache_misses_noNC": L1_icache_misses_noNC,
+        "L1_icache_rate_noNC": L1_icache_misses_noNC / L1_icache_loads,
+        "L1_dcache_loads": L1_dcache_loads,
+        "L1_dcache_misses": L1_dcache_misses,
+        "L1_dcache_rate": L1_dcache_misses / L1_dcache_loads,
+        "L1_dcache_misses_noNC": L1_dcache_misses_noNC,
+        "L1_dcache_rate_noNC": L1_dcache_misses_noNC / L1_dcache_loads
+    }
+
+
+def legacy_statistical(target_range, intervals, L1I_chmc, L1D_chmc):
+    inst_number = legacy_get_inst_number(target_range, intervals)
+    return legacy_estimate(target_range, inst_number,
+                           {hex(addr)[2:]: chmc for addr, chmc in L1I_chmc.items()},
+                           {hex(addr)[2:]: chmc for addr, chmc in L1D_chmc.items()})
+
+
+def prefix_sum_statistical(target_range, intervals, L1I_chmc, L1D_chmc):
+    exec_counts = instruction_execution_counts(target_range, intervals)
+    return estimate_cache_misses(target_range, exec_counts, L1I_chmc, L1D_chmc)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--instructions', type=int, default=20000,
+                        help='The number of instructions in the target range, default is 20000.')
+    parser.add_argument('-m', '--intervals', type=int, default=2000,
+                        help='The number of execution intervals, default is 2000.')
+    parser.add_argument('-o', '--output', default=os.path.join('output', 'synthetic_instruction_data.json'),
+                        help='Where to write the synthetic instruction_data.json.')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--skip_legacy', action='store_true',
+                        help='Only run the prefix-sum implementation.')
+    args = parser.parse_args()
+
+    generate_instruction_data(args.output, args.instructions, args.intervals, args.seed)
+    target_range, intervals = read_instruction_data(args.output)
+    L1I_chmc, L1D_chmc = generate_chmc(target_range, args.seed)
+
+    stats, new_time = timed(prefix_sum_statistical, target_range, intervals, L1I_chmc, L1D_chmc)
+    rows = [['Prefix sum', round(new_time, 4), '']]
+    if not args.skip_legacy:
+        expected, legacy_time = timed(legacy_statistical, target_range, intervals, L1I_chmc, L1D_chmc)
+        if stats != expected:
+            raise RuntimeError("Different cache statistics: {} != {}".format(stats, expected))
+        rows.insert(0, ['Legacy', round(legacy_time, 4), ''])
+        rows[1][2] = round(legacy_time / new_time, 2)
+
+    print("{} instructions, {} execution intervals".format(args.instructions, args.intervals))
+    print(tabulate(rows, headers=['Implementation', 'Time (s)', 'Speedup'], tablefmt='psql'))
+    print(json.dumps(stats, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,56 @@
+import functools
+import multiprocessing
 import warnings
-from typing import Optional, List, Set, Dict, Hashable, Tuple
+from typing import Optional, List, Set, Dict, Hashable, Tuple, NamedTuple, Callable
 
 from sample.cache.abstract_state import CacheState
 from sample.cache.cache_cfg import CacheCFG
 from sample.cache.cache_config import CacheConfig
-from sample.cache.constants import CacheAnalysisMethod, MemoryModel
+from sample.cache.constants import CacheAnalysisMethod, CacheStateBackend, MemoryModel
 from sample.cache.fixpoint import Fixpoint, FixpointState
 from sample.cache.memory_block import MemoryBlock
 from sample.cache.memory_ref import InstMemoryRef, DataMemoryRef
 from sample.frontend.cfg import TCFGNode, Prog, TCFGEdgeKind, SimpProg
 from sample.frontend.isa import Addr
 from sample.frontend.loops import LoopHrchy
-from sample.ilp.ilp import ILPModel, LPSolve
+from sample.ilp.ilp import ILPModel, LPSolve, LinearModel
 from sample.pipeline.abstract_interpretation import EPInPipeline, FPInPipeline, tcfg_node_to_eps_in_pipeline, eps_in_pipeline_to_fps_in_pipeline, fps_in_pipeline_to_cache_line
 from sample.pipeline.simulator import do_pipeline_simulation_in_block
 from sample.pipeline.sploop import SPLoopType, sp_loop_scan
 from sample.pipeline.tracer import PipelineTracer
+from sample.pipeline.trace_sink import TraceSink
 from sample.isa.isa_syntax import Instruction
 from sample.isa.stream_proc import ASMFileReader
 from sample.cache.address import Address_analyser
 
 
+class BlockAnalysisResult(NamedTuple):
+    """ Result of the in-block analysis of a single block. Data references are identified by instruction addresses. """
+    block_id: int
+    cycle: List[int]
+    overlap_cycle: int
+    behaviors: List[PipelineTracer]
+    inst_cache_cons: Optional[Dict[MemoryBlock, Hashable]]
+    data_cache_cons: Optional[Dict[int, Hashable]]
+
+
+# each worker gets several chunks of blocks to balance the load
+BLOCK_CHUNKS_PER_WORKER = 4
+# the analyser inherited by the forked workers
+_ACTIVE_ANALYSER: Optional["WCETAnalyser"] = None
+
+
+def _analyse_blocks(block_ids: List[int], log: bool, status_log: bool) -> Tuple[List[BlockAnalysisResult], int, int]:
+    """ run in worker processes: analyse a chunk of blocks, return their results and the simulation cache hits and misses """
+    analyser = _ACTIVE_ANALYSER
+    hits, misses = analyser.simulation_cache_stats
+    results = [analyser.analyse_block(block_id, log=log, status_log=status_log) for block_id in block_ids]
+    new_hits, new_misses = analyser.simulation_cache_stats
+    return results, new_hits - hits, new_misses - misses
+
+
 class WCETAnalyser:
-    behavior_record: bool = True
+    behavior_record: bool = False
     append_status_after_each_iteration: bool = False
 
     def __init__(self,
@@ -32,7 +60,9 @@ class WCETAnalyser:
                  dline_dir: Optional[str] = None, slist_dir: Optional[str] = None,
                  i_must: bool = True, i_persistent: bool = True,
                  d_must: bool = True, d_persistent: bool = True,
-                 start_name: str = "main", finish_addr: Optional[Addr] = None):
+                 start_name: str = "main", finish_addr: Optional[Addr] = None,
+                 state_backend: CacheStateBackend = CacheStateBackend.DICT, jobs: int = 1,
+                 memoize_simulation: bool = True):
         """"""
 
         """  --------------
@@ -53,6 +83,12 @@ class WCETAnalyser:
         self.__i_persistent = i_persistent
         self.__d_must = d_must
         self.__d_persistent = d_persistent
+        # Storage of abstract cache states used by fixpoint analysis.
+        self.__state_backend = state_backend
+        # The number of processes used by address analysis and in-block analysis.
+        self.__jobs = jobs
+        # If the in-block pipeline simulations of identical contexts are shared.
+        self.__memoize_simulation = memoize_simulation
         # TODO.
         self.__start_name = start_name
         self.__finish_addr = finish_addr
@@ -79,6 +115,11 @@ class WCETAnalyser:
         self.__data_mem_ref: Optional[DataMemoryRef] = None
         self.__data_must_states: Optional[Dict[Hashable, FixpointState]] = None
         self.__data_persistent_states: Optional[Dict[Hashable, Dict[Hashable,FixpointState]]] = dict()
+        # (hits, misses) of the expansion cache of the address analysis.
+        self.__expansion_cache_stats: Tuple[int, int] = (0, 0)
+        # Fixpoint iterations of the global cache analyses of each cache ("inst" and "data"):
+        # [rounds, sets hashed, sets which hashing the whole states would hash].
+        self.__fixpoint_stats: Dict[str, List[int]] = {"inst": [0, 0, 0], "data": [0, 0, 0]}
 
 
         """   -------------------------
@@ -110,6 +151,12 @@ class WCETAnalyser:
         self.__ii: Optional[int] = None  # Iteration interval.
         self.__sp_loop_type: Optional[SPLoopType] = None  # SPLoop type.
         self.__max_iter: Optional[int] = None  # Maximum iteration of SPLoop body.
+        # After inlining, a basic block appears in the T-CFG once per call context.
+        # Abstract interpretations are cached by block start address, and simulation results by block signature.
+        self.__abstract_interpretation_cache: Dict[Addr, Tuple] = dict()
+        self.__simulation_cache: Dict[Tuple, Tuple[int, int, PipelineTracer]] = dict()
+        self.__simulation_cache_hits: int = 0
+        self.__simulation_cache_misses: int = 0
 
         """   -------------------------
         For inter-block.
@@ -123,6 +170,7 @@ class WCETAnalyser:
 
         self.__cycle_cons: Dict[int, List[int]] = dict()
         self.__ilp_model: Optional[ILPModel] = None
+        self.__linear_model: Optional[LinearModel] = None
         self.__ilp_str: Optional[str] = None
         self.__lp_solver: Optional[LPSolve] = None
         #  for inst cache constrains   Dict[node_id, Dict[MemoryBlock, persistent loop_level]]
@@ -196,14 +244,17 @@ class WCETAnalyser:
             self.__cache_cfg.read_from_front_end(self.__prog, self.__lphr)
         """ MUST analysis results of instruction memory accesses to the program. """
         self.__inst_mem_ref = InstMemoryRef(self.__prog, self.__inst_cache_config)
-        fixpoint = Fixpoint(self.__cache_cfg, self.__inst_cache_config)
+        fixpoint = Fixpoint(self.__cache_cfg, self.__inst_cache_config, state_backend=self.__state_backend)
         if self.__i_must:
             self.__inst_must_states = fixpoint.do_analysis_inst(analysis_type=CacheAnalysisMethod.MUST, inst_refs=self.__inst_mem_ref)
+            self.__count_fixpoint_rounds("inst", fixpoint)
         if self.__i_persistent:
-            self.__inst_persistent_states = {loop_level : fixpoint.do_analysis_inst(analysis_type=CacheAnalysisMethod.PERSISTENT, 
-                                                                                 inst_refs=self.__inst_mem_ref,
-                                                                                level = loop_level)
-                                                for loop_level in self.__lphr.loops.keys() if loop_level}
+            self.__inst_persistent_states = dict()
+            for loop_level in self.__lphr.loops.keys():
+                if loop_level:
+                    self.__inst_persistent_states[loop_level] = fixpoint.do_analysis_inst(
+                        analysis_type=CacheAnalysisMethod.PERSISTENT, inst_refs=self.__inst_mem_ref, level=loop_level)
+                    self.__count_fixpoint_rounds("inst", fixpoint)
     
     def data_cache_analysis_global(self):
         if not self.__cache_cfg:
@@ -212,18 +263,41 @@ class WCETAnalyser:
 
         address_analyser = Address_analyser(self.__analysis_file_dir, self.__slist_dir, 
                                             self.__prog ,self.__data_cache_config, 
-                                            self.__cache_cfg, self.__memory_model)
+                                            self.__cache_cfg, self.__memory_model, jobs=self.__jobs)
         
         self.__data_mem_ref = DataMemoryRef(address_analyser.do_address_analysis())
+        self.__expansion_cache_stats = address_analyser.expansion_cache_stats
 
-        fixpoint = Fixpoint(self.__cache_cfg, self.__data_cache_config)
+        fixpoint = Fixpoint(self.__cache_cfg, self.__data_cache_config, state_backend=self.__state_backend)
         if self.__d_must:
             self.__data_must_states = fixpoint.do_analysis_data(analysis_type=CacheAnalysisMethod.MUST, data_refs=self.__data_mem_ref)
+            self.__count_fixpoint_rounds("data", fixpoint)
         if self.__d_persistent:
-            self.__data_persistent_states = {loop_level : fixpoint.do_analysis_data(analysis_type=CacheAnalysisMethod.PERSISTENT, 
-                                                                                 data_refs=self.__data_mem_ref,
-                                                                                level = loop_level)
-                                                for loop_level in self.__lphr.loops.keys() if loop_level}
+            self.__data_persistent_states = dict()
+            for loop_level in self.__lphr.loops.keys():
+                if loop_level:
+                    self.__data_persistent_states[loop_level] = fixpoint.do_analysis_data(
+                        analysis_type=CacheAnalysisMethod.PERSISTENT, data_refs=self.__data_mem_ref, level=loop_level)
+                    self.__count_fixpoint_rounds("data", fixpoint)
+
+    @property
+    def expansion_cache_stats(self) -> Tuple[int, int]:
+        """ (hits, misses) of the expansion cache of the last address analysis """
+        return self.__expansion_cache_stats
+
+    def __count_fixpoint_rounds(self, cache: str, fixpoint: Fixpoint):
+        """ Add the rounds of the last fixpoint analysis to the statistics of cache. """
+        stats = self.__fixpoint_stats[cache]
+        for hashed, full_hashed in fixpoint.round_statistics:
+            stats[0] += 1
+            stats[1] += hashed
+            stats[2] += full_hashed
+
+    @property
+    def fixpoint_stats(self) -> Dict[str, Tuple[int, int, int]]:
+        """ (rounds, sets hashed, sets which hashing the whole states would hash) of the global cache analyses
+        of the instruction ("inst") and data ("data") caches """
+        return {cache: tuple(stats) for cache, stats in self.__fixpoint_stats.items()}
 
     @property
     def inst_mem_ref(self):
@@ -254,9 +328,16 @@ class WCETAnalyser:
 
     def abstract_interpretation_gen(self):
         """ Abstract Interpretation. """
-        self.__execute_packets = tcfg_node_to_eps_in_pipeline(self.__prog.tcfg_nodes[self.__current_bock_id])
-        self.__fetch_packets = eps_in_pipeline_to_fps_in_pipeline(self.__execute_packets)
-        self.__fps_line_addr, self.__fps_is_line_head = fps_in_pipeline_to_cache_line(self.__fetch_packets, self.__inst_cache_config)
+        node = self.__prog.tcfg_nodes[self.__current_bock_id]
+        interpretation = self.__abstract_interpretation_cache.get(node.start_addr) if self.__memoize_simulation else None
+        if interpretation is None:
+            execute_packets = tcfg_node_to_eps_in_pipeline(node)
+            fetch_packets = eps_in_pipeline_to_fps_in_pipeline(execute_packets)
+            fps_line_addr, fps_is_line_head = fps_in_pipeline_to_cache_line(fetch_packets, self.__inst_cache_config)
+            interpretation = execute_packets, fetch_packets, fps_line_addr, fps_is_line_head
+            if self.__memoize_simulation:
+                self.__abstract_interpretation_cache[node.start_addr] = interpretation
+        self.__execute_packets, self.__fetch_packets, self.__fps_line_addr, self.__fps_is_line_head = interpretation
 
     @property
     def fps_is_line_head(self):
@@ -481,12 +562,20 @@ class WCETAnalyser:
             print("")
 
         """ Analysis under must hit blocks. """
-        cycles, overlap_cycle, behaviors = \
-            do_pipeline_simulation_in_block(self.__current_bock_id, self.__fetch_packets, self.__fps_is_line_head,
-                                            self.__fps_line_addr, hit_blocks, hit_data_reference,
-                                            self.__inst_cache_config, self.__data_cache_config,
-                                            self.__is_in_sp_loop, self.__sp_loop_type, self.__ii, self.__max_iter,
-                                            log=log, status_log=status_log)
+        key = self.simulation_signature(hit_blocks, hit_data_reference, log, status_log)
+        if key in self.__simulation_cache:
+            self.__simulation_cache_hits += 1
+            cycles, overlap_cycle, behaviors = self.__simulation_cache[key]
+        else:
+            cycles, overlap_cycle, behaviors = \
+                do_pipeline_simulation_in_block(self.__current_bock_id, self.__fetch_packets, self.__fps_is_line_head,
+                                                self.__fps_line_addr, hit_blocks, hit_data_reference,
+                                                self.__inst_cache_config, self.__data_cache_config,
+                                                self.__is_in_sp_loop, self.__sp_loop_type, self.__ii, self.__max_iter,
+                                                log=log, status_log=status_log)
+            if self.__memoize_simulation:
+                self.__simulation_cache_misses += 1
+                self.__simulation_cache[key] = (cycles, overlap_cycle, behaviors)
         self.__cycle.append(cycles)
         self.__behaviors.append(behaviors)
         self.__overlap_cycles.append(overlap_cycle)
@@ -501,6 +590,26 @@ class WCETAnalyser:
         # self.__cycle.append(cycles)
         # self.__behaviors.append(behaviors)
 
+    def simulation_signature(self, hit_blocks: Set[MemoryBlock], hit_data_reference: Set[Hashable],
+                             log: bool, status_log: bool) -> Optional[Tuple]:
+        """
+        Signature of the in-block pipeline simulation of current block, None if the simulation is not memoized.
+        Only the hit status of the cache lines fetched by the block affects the simulation, the rest of hit_blocks is dropped.
+        The tracer of a shared simulation records the ID of the first block simulated under that signature.
+        """
+        if not self.__memoize_simulation:
+            return None
+        node = self.__prog.tcfg_nodes[self.__current_bock_id]
+        fetched_hit_blocks = frozenset(block for block, is_line_head in zip(self.__fps_line_addr, self.__fps_is_line_head)
+                                       if is_line_head and block in hit_blocks)
+        return (node.start_addr, fetched_hit_blocks, frozenset(hit_data_reference),
+                self.__is_in_sp_loop, self.__sp_loop_type, self.__ii, self.__max_iter, log, status_log)
+
+    @property
+    def simulation_cache_stats(self) -> Tuple[int, int]:
+        """ (hits, misses) of the in-block pipeline simulation cache """
+        return self.__simulation_cache_hits, self.__simulation_cache_misses
+
     @property
     def cycle_must(self):
         return self.__cycle[0]
@@ -525,20 +634,96 @@ class WCETAnalyser:
     def behaviors(self):
         return self.__behaviors
 
+    def analyse_block(self, block_id: int, log: Optional[bool] = None, status_log: Optional[bool] = None) -> BlockAnalysisResult:
+        """
+        In-block analysis of a single block after the global analyses.
+        The result depends only on block_id and the global analyses, so blocks can be analysed in any order or process.
+        Tracers are only returned if log is set.
+        """
+        log = log if log is not None else self.behavior_record
+        self.move_block_cursor_to(block_id)
+        self.abstract_interpretation_gen()
+        self.sp_loop_analysis_bb()
+        self.inst_cache_analysis_bb()
+        self.data_cache_analysis_bb()
+        self.in_block_wcet_analysis(log=log, status_log=status_log)
+
+        data_cache_cons = self.__data_cache_cons.get(block_id)
+        if data_cache_cons is not None:
+            data_cache_cons = {inst.address: loop_level for inst, loop_level in data_cache_cons.items()}
+        return BlockAnalysisResult(block_id, self.__cycle.copy(), self.__overlap_cycles[-1], self.__behaviors.copy() if log else [],
+                                   self.__inst_cache_cons.get(block_id), data_cache_cons)
+
+    def in_block_analysis(self, log: Optional[bool] = None, status_log: Optional[bool] = None, jobs: Optional[int] = None,
+                          progress: Optional[Callable[[int], None]] = None,
+                          trace_sink: Optional[TraceSink] = None) -> Dict[int, List[PipelineTracer]]:
+        """
+        In-block analysis of all blocks. cycle_constrain and overlap_cycle are assembled in block order,
+        and the tracers of each block are returned (empty lists without log).
+        If trace_sink is given, the tracer of each block is written to it as soon as the block is analysed
+        instead of being returned.
+
+        If jobs (default is the jobs of the analyser) > 1, the blocks are sorted by start address, so that the contexts
+        of the same basic block mostly share a chunk and its simulation cache, and the chunks are analysed by a pool
+        of processes forked once. progress is called with the number of blocks finished.
+        """
+        global _ACTIVE_ANALYSER
+
+        def finish(result: BlockAnalysisResult) -> BlockAnalysisResult:
+            if trace_sink is None or not result.behaviors:
+                return result
+            trace_sink.write(result.block_id, result.behaviors[0])  # The tracer under must analysis.
+            return result._replace(behaviors=[])
+
+        block_ids = list(range(len(self.__blocks)))
+        workers = min(jobs if jobs is not None else self.__jobs, len(block_ids))
+
+        self.__overlap_cycles = list()
+        results: List[BlockAnalysisResult] = list()
+        if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            for block_id in block_ids:
+                results.append(finish(self.analyse_block(block_id, log=log, status_log=status_log)))
+                if progress is not None:
+                    progress(1)
+        else:
+            ordered = sorted(block_ids, key=lambda idx: self.__blocks[idx].start_addr.to_dec())
+            chunk_size = max(1, -(-len(ordered) // (workers * BLOCK_CHUNKS_PER_WORKER)))
+            chunks = [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+            _ACTIVE_ANALYSER = self
+            try:
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    for chunk_results, hits, misses in pool.imap_unordered(
+                            functools.partial(_analyse_blocks, log=log, status_log=status_log), chunks):
+                        self.__simulation_cache_hits += hits
+                        self.__simulation_cache_misses += misses
+                        results += [finish(result) for result in chunk_results]
+                        if progress is not None:
+                            progress(len(chunk_results))
+            finally:
+                _ACTIVE_ANALYSER = None
+
+            results.sort(key=lambda result: result.block_id)
+            # The cache CFG is built from these instructions, which are equal to the instructions of its nodes.
+            insts = {inst.address: inst for inst in self.__instructions}
+            for result in results:
+                if result.inst_cache_cons is not None:
+                    self.__inst_cache_cons[result.block_id] = result.inst_cache_cons
+                if result.data_cache_cons is not None:
+                    self.__data_cache_cons[result.block_id] = {insts[address]: loop_level
+                                                               for address, loop_level in result.data_cache_cons.items()}
+
+        self.__overlap_cycles = [result.overlap_cycle for result in results]
+        for result in results:
+            self.__cycle_cons[result.block_id] = result.cycle
+        return {result.block_id: result.behaviors for result in results}
+
     def block_cycle_cons_gen(self, cons: Optional[Dict[int, List[int]]] = None):
         """ """
         self.__cycle_cons: Dict[int, List[int]] = dict()
         if cons is not None:
             self.__cycle_cons.update(cons)
         else:
-            for idx in range(len(self.__blocks)):
-                self.move_block_cursor_to(idx)
-                self.abstract_interpretation_gen()
-                self.sp_loop_analysis_bb()
-                self.inst_cache_analysis_bb()
-                self.data_cache_analysis_bb()
-                self.in_block_wcet_analysis(log=False)
-                self.__cycle_cons[idx] = self.__cycle  # The first is under must and the second is under persistent.
+            self.in_block_analysis(log=False)  # The first is under must and the second is under persistent.
             self.inter_block_analysis()
 
     def inter_block_analysis(self):
@@ -562,12 +747,17 @@ class WCETAnalyser:
                                     inst_cache_config=self.__inst_cache_config,
                                     data_cache_config=self.__data_cache_config,
                                     loop_cons_file=self.__cons_dir, pred_cycle=self.__cycle_cons)
-        self.__ilp_str = self.__ilp_model.gen_ilp_model()
+        self.__linear_model = self.__ilp_model.gen_linear_model()
+        self.__ilp_str = self.__linear_model.render_lp()
 
     @property
     def ilp_model(self):
         return self.__ilp_model
 
+    @property
+    def linear_model(self):
+        return self.__linear_model
+
     @property
     def ilp_str(self):
         return self.__ilp_str
@@ -1,6 +1,9 @@
+import itertools
+import os
 import warnings
+import weakref
 from copy import deepcopy
-from typing import Set, Union, Dict, List, Optional
+from typing import Set, Union, Dict, List, Optional, Tuple
 import numpy as np
 from tabulate import tabulate
 
@@ -27,6 +30,9 @@ class SetState:
         * Scope-aware sim: 见论文 `Scope-aware Data Cache Analysis for WCET Estimation`
     """
 
+    hashed_count: int = 0
+    """ 实际计算 ``runtime_ident`` 哈希值的次数，用于统计不动点迭代中被重新哈希的 set 的数目。 """
+
     @staticmethod
     def __overlap_by_ident(ident1: MemoryBlockWithScopeIdent, ident2: MemoryBlockWithScopeIdent,
                            loop_level: int = -1) -> bool:
@@ -61,6 +67,8 @@ class SetState:
         self.__abstract_state = dict() if init_state is None else deepcopy(init_state)
         self.__set_index = set_index
         self.__associativity = associativity
+        """ ``runtime_ident`` 的哈希值的缓存。状态发生变化（dirty）时置为 None，下一次访问 ``runtime_hash`` 时重新计算。 """
+        self.__hashed: Optional[int] = None
 
     @property
     def set_index(self) -> int:
@@ -119,6 +127,14 @@ class SetState:
                     key=lambda x: x[0])
             )
 
+    @property
+    def runtime_hash(self) -> int:
+        """ 返回 ``runtime_ident.__hash__()`` ，只有当状态在上一次计算之后发生了变化时才会重新计算。 """
+        if self.__hashed is None:
+            self.__hashed = self.runtime_ident.__hash__()
+            SetState.hashed_count += 1
+        return self.__hashed
+
     @property
     def abstract_state(self) -> SetAbsState:
         """ 该函数返回一个当前状态的深拷贝。通常不应该使用这个函数，因为这会带来较大的复制开销，并且返回的内容不具有可读性。 """
@@ -283,6 +299,10 @@ class SetState:
             loop_level: 用于Scope-aware analysis的最深循环等级。对于must/may/persistent analysis来说，该参数被忽略。
 
         """
+        """ 对于must/may/persistent analysis，没有访问任何内存块时状态不变，哈希值的缓存仍然有效。 """
+        if len(mem_blocks) != 0 or self.__analysis_type == CacheAnalysisMethod.SCOPE_AWARE:
+            self.__hashed = None
+
         if self.__analysis_type == CacheAnalysisMethod.MUST:
             """ Must-sim:
             To determine if a memory block is definitely in the __cache we use abstract __cache states where the positions
@@ -376,11 +396,27 @@ class SetState:
         该方法返回一个新的 ``SetState`` 的实例，而不会修改传入的其中任何一个实例。
         """
 
-        blocks_ident1 = set(self.__abstract_state.keys())
-        blocks_ident2 = set(other.__abstract_state.keys())
         # 这里默认认为other应该和self有相同的分析类型、组相连度和集合下标。
         new_set_state = \
             SetState(analysis_type=self.__analysis_type, associativity=self.__associativity, set_index=self.__set_index)
+
+        """
+        对于must/may/persistent analysis，当其中一个Set State为空时，Join的结果是确定的：Must sim 的结果为空，May/Persistent sim
+        的结果与另一个Set State相同。此时直接复制结果及其哈希值的缓存，不需要重新计算（大多数的set都是空的）。
+        """
+        if self.__analysis_type != CacheAnalysisMethod.SCOPE_AWARE and \
+                (len(self.__abstract_state) == 0 or len(other.__abstract_state) == 0):
+            if self.__analysis_type == CacheAnalysisMethod.MUST or \
+                    (len(self.__abstract_state) == 0 and len(other.__abstract_state) == 0):
+                new_set_state.__hashed = ().__hash__()
+            else:
+                non_empty = self if len(self.__abstract_state) != 0 else other
+                new_set_state.__abstract_state = non_empty.__abstract_state.copy()
+                new_set_state.__hashed = non_empty.__hashed
+            return new_set_state
+
+        blocks_ident1 = set(self.__abstract_state.keys())
+        blocks_ident2 = set(other.__abstract_state.keys())
         if self.__analysis_type == CacheAnalysisMethod.MUST:
             """ Must-sim
             Must sim 只取同时存在于两个Set State中的内存块，并且新的相对年龄是该内存块在两个Set State中的相对年龄的较大值。
@@ -457,7 +493,7 @@ class CacheState:
         该方法针对每一个set调用 ``SetState.runtime_ident`` 方法， 并对返回的元组调用 ``__hash__()`` 方法。这样，用户既可以比较两个
         Cache State是否相同，也可以进一步地比较哪一个set发生了变化。
         """
-        return tuple([state.runtime_ident.__hash__() for state in self.__states])
+        return tuple([state.runtime_hash for state in self.__states])
 
     def update(self, mem_blocks: Sequence[MemoryBlock], loop_level: int = -1):
         if self.__analysis_type == CacheAnalysisMethod.SCOPE_AWARE:
@@ -533,3 +569,263 @@ class CacheState:
             return tabulate(values, headers=headers, showindex=row_index, tablefmt=style)
         else:
             return "\n".join([title, tabulate(values, headers=headers, showindex=row_index, tablefmt=style)])
+
+
+class TagColumns:
+    """
+    内存块 ``tag`` 到 ``ArrayCacheState`` 矩阵列下标的映射。
+
+    同一次不动点分析中的所有 ``ArrayCacheState`` 共享同一个映射（由 ``Fixpoint`` 持有），这样不同实例的矩阵的同一列
+    总是对应同一个 ``tag`` ，Join 和比较时无需对齐。映射中的列只会增加，不会删除，分析结束、状态被释放后映射随之释放，
+    不会在批量运行中越积越多。
+
+    序列化时只保存映射的标识 ``token`` ：在同一进程或 fork 得到的子进程中反序列化时得到的仍是同一个映射。
+    """
+
+    __counter = itertools.count()
+
+    def __init__(self, token: Optional[Tuple[int, int]] = None) -> None:
+        self.__token = token if token is not None else (os.getpid(), next(TagColumns.__counter))
+        self.__columns: Dict[int, int] = dict()
+        self.__tags: List[int] = []
+        _tag_columns_registry[self.__token] = self
+
+    def __reduce__(self):
+        return _lookup_tag_columns, (self.__token,)
+
+    def get(self, tag: int) -> Optional[int]:
+        return self.__columns.get(tag, None)
+
+    def add(self, tag: int) -> int:
+        """ 返回 ``tag`` 对应的列下标，如果 ``tag`` 第一次出现，则为其分配新的一列。 """
+        column = self.__columns.get(tag, None)
+        if column is None:
+            column = len(self.__tags)
+            self.__columns[tag] = column
+            self.__tags.append(tag)
+        return column
+
+    def tag(self, column: int) -> int:
+        return self.__tags[column]
+
+    def __len__(self) -> int:
+        return len(self.__tags)
+
+
+_tag_columns_registry: 'weakref.WeakValueDictionary[Tuple[int, int], TagColumns]' = weakref.WeakValueDictionary()
+""" 当前进程中仍然存活的 ``TagColumns`` ，键为 ``token`` 。 """
+
+
+def _lookup_tag_columns(token: Tuple[int, int]) -> TagColumns:
+    """ 反序列化 ``TagColumns`` ：返回当前进程中 ``token`` 对应的映射，不存在时新建一个。 """
+    tag_columns = _tag_columns_registry.get(token)
+    return tag_columns if tag_columns is not None else TagColumns(token)
+
+
+class ArrayCacheState:
+    """
+    Abstract Cache State 的 NumPy 矩阵实现，对外提供与 ``CacheState`` 相同的接口，只支持 Must/May/Persistent 分析。
+
+    矩阵的行对应 Cache Set，列对应 ``TagColumns`` 中登记的 ``tag``，元素为内存块的 relative age。不在状态中的内存块用
+    ``absent`` 表示：Must/May 分析中为 associativity + 1，Persistent 分析中为 0。这样 Must/Persistent 的 Join 就是逐元素
+    取 max，May 的 Join 就是逐元素取 min，比较两个状态只需要比较一次矩阵。
+    """
+
+    hashed_count: int = 0
+    """ 与 ``SetState.hashed_count`` 相同，实际计算哈希值的 set（行）的次数。 """
+
+    def __init__(self, cache_config: CacheConfig, analysis_type: CacheAnalysisMethod,
+                 tag_columns: Optional[TagColumns] = None):
+        """
+        Args:
+            tag_columns: 与同一次分析中其他状态共享的列映射。为 None 时使用新的映射，此时只能与自身的拷贝进行 Join。
+        """
+        self.__cache_config = cache_config
+        if analysis_type not in {CacheAnalysisMethod.MUST, CacheAnalysisMethod.MAY, CacheAnalysisMethod.PERSISTENT}:
+            raise ValueError("Unsupported sim type {} for array backend.".format(analysis_type))
+        if cache_config.associativity + 1 > np.iinfo(np.uint8).max:
+            raise ValueError("Associativity {} is too large for array backend.".format(cache_config.associativity))
+        self.__analysis_type = analysis_type
+        self.__associativity = cache_config.associativity
+        self.__absent = 0 if analysis_type == CacheAnalysisMethod.PERSISTENT else self.__associativity + 1
+        self.__columns = tag_columns if tag_columns is not None else TagColumns()
+        """ 矩阵按照整个状态的粒度进行写时复制，``__owned`` 表示当前实例是否独占该矩阵。 """
+        self.__ages = np.full((cache_config.set_number, 0), self.__absent, dtype=np.uint8)
+        self.__owned = True
+        """ 每一行的哈希值的缓存，以及计算时的列数。 ``__dirty`` 中的行在缓存之后被写入过，需要重新计算。 """
+        self.__row_hashes: Optional[List[int]] = None
+        self.__hashed_width = 0
+        self.__dirty: Set[int] = set()
+
+    def __writable_ages(self) -> np.ndarray:
+        """ 私有方法。返回可以直接写入的矩阵：如果矩阵与其他实例共享则先复制，如果列数少于已登记的 tag 数则补齐。 """
+        width = len(self.__columns)
+        if self.__ages.shape[1] < width:
+            padding = np.full((self.__ages.shape[0], width - self.__ages.shape[1]), self.__absent, dtype=np.uint8)
+            self.__ages = np.hstack((self.__ages, padding))
+            self.__owned = True
+        elif not self.__owned:
+            self.__ages = self.__ages.copy()
+            self.__owned = True
+        return self.__ages
+
+    def __aligned(self, width: int) -> np.ndarray:
+        """ 私有方法。返回补齐到 ``width`` 列的矩阵（只读）。 """
+        if self.__ages.shape[1] >= width:
+            return self.__ages
+        padding = np.full((self.__ages.shape[0], width - self.__ages.shape[1]), self.__absent, dtype=np.uint8)
+        return np.hstack((self.__ages, padding))
+
+    @property
+    def cache_config(self) -> CacheConfig:
+        return self.__cache_config
+
+    @property
+    def analysis_type(self) -> CacheAnalysisMethod:
+        return self.__analysis_type
+
+    @property
+    def runtime_ident(self) -> Tuple[int, ...]:
+        """ 与 ``CacheState.runtime_ident`` 相同，返回每个 set 对应的哈希值。 """
+        width = len(self.__columns)
+        ages = self.__aligned(width)
+        if self.__row_hashes is None or self.__hashed_width != width:
+            # 列数变化后所有行的内容都会变长，需要全部重新计算
+            self.__row_hashes = [row.tobytes().__hash__() for row in ages]
+            ArrayCacheState.hashed_count += len(self.__row_hashes)
+        else:
+            for set_index in self.__dirty:
+                self.__row_hashes[set_index] = ages[set_index].tobytes().__hash__()
+            ArrayCacheState.hashed_count += len(self.__dirty)
+        self.__hashed_width = width
+        self.__dirty = set()
+        return tuple(self.__row_hashes)
+
+    def __add_relative_age(self, set_index: int, cmp_rel_age: int, inclusive: bool) -> None:
+        """
+        私有方法。将 set 中所有 relative age 小于（ ``inclusive == True`` 时为小于或等于） ``cmp_rel_age`` 的内存块的年龄加1，
+        年龄最大不超过 associativity + 1。对于 Must/May 分析，该值就是 ``absent``，即内存块被驱逐。
+        """
+        row = self.__ages[set_index]
+        mask = row <= cmp_rel_age if inclusive else row < cmp_rel_age
+        mask &= row != self.__absent
+        columns = np.flatnonzero(mask)
+        if columns.size:
+            aged = np.minimum(row[columns], self.__associativity) + 1
+            self.__writable_ages()[set_index, columns] = aged
+            self.__dirty.add(set_index)
+
+    def update(self, mem_blocks: Sequence[MemoryBlock], loop_level: int = -1):
+        """ 与 ``SetState.update`` 的 Must/May/Persistent 分析相同，按顺序访问 ``mem_blocks`` 中的所有内存块。 """
+        if not all([isinstance(o, MemoryBlock) for o in mem_blocks]):
+            raise TypeError("All elements in mem_blocks must be instances of class:MemoryBlock.")
+        if any([isinstance(o, MemoryBlockWithScope) for o in mem_blocks]):
+            warnings.warn("For sim type {}, all instances of class:MemoryBlockWithScope will be converted "
+                          "to instances of class:MemoryBlock, which means all temporal scopes are ignored."
+                          .format(self.__analysis_type), RuntimeWarning)
+
+        inclusive = self.__analysis_type == CacheAnalysisMethod.MAY
+        for mem_block in mem_blocks:
+            set_index, column = mem_block.set_index, self.__columns.add(mem_block.tag)
+            rel_age = int(self.__ages[set_index, column]) if column < self.__ages.shape[1] else self.__absent
+            """ 如果内存块m不在 Set State 中，那么将年龄视为 SetState.associativity + 1 """
+            if rel_age == self.__absent:
+                rel_age = self.__associativity + 1
+            self.__add_relative_age(set_index, rel_age, inclusive=inclusive)
+            self.__writable_ages()[set_index, column] = 1
+            self.__dirty.add(set_index)
+
+    def __add__(self, other):
+        if not isinstance(other, ArrayCacheState):
+            raise TypeError("Operands must be instances of class:ArrayCacheState.")
+        if not all([self.__analysis_type == other.__analysis_type,
+                    self.__cache_config.ident == other.__cache_config.ident]):
+            raise TypeError("Two operands must have the same sim type and __cache configuration.")
+        if self.__columns is not other.__columns:
+            raise TypeError("Two operands must share the same tag columns.")
+
+        new_state = ArrayCacheState(cache_config=self.__cache_config, analysis_type=self.__analysis_type,
+                                    tag_columns=self.__columns)
+        width = max(self.__ages.shape[1], other.__ages.shape[1])
+        if self.__analysis_type == CacheAnalysisMethod.MAY:
+            new_state.__ages = np.minimum(self.__aligned(width), other.__aligned(width))
+        else:
+            new_state.__ages = np.maximum(self.__aligned(width), other.__aligned(width))
+        return new_state
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ArrayCacheState):
+            return False
+        width = max(self.__ages.shape[1], other.__ages.shape[1])
+        return np.array_equal(self.__aligned(width), other.__aligned(width))
+
+    def __deepcopy__(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) in memo:
+            return memo[id(self)]
+
+        new_state = ArrayCacheState(cache_config=self.__cache_config, analysis_type=self.__analysis_type,
+                                    tag_columns=self.__columns)
+        # 写时复制：拷贝与原状态共享矩阵，双方都失去对矩阵的独占。
+        new_state.__ages = self.__ages
+        new_state.__owned = False
+        self.__owned = False
+        # 拷贝同时共享哈希值的缓存
+        if self.__row_hashes is not None:
+            new_state.__row_hashes = self.__row_hashes.copy()
+            new_state.__hashed_width = self.__hashed_width
+            new_state.__dirty = self.__dirty.copy()
+
+        memo[id(self)] = new_state
+        return new_state
+
+    def __getstate__(self):
+        """
+        ``TagColumns`` 的内容只在当前进程内有效（fork 之后子进程中登记的列父进程看不到），因此序列化时将列下标转换回
+        ``tag`` ，反序列化时再在目标进程的同一个映射中重新登记。
+        """
+        tags = [self.__columns.tag(column) for column in range(self.__ages.shape[1])]
+        return self.__cache_config, self.__analysis_type, self.__columns, tags, self.__ages
+
+    def __setstate__(self, state):
+        cache_config, analysis_type, tag_columns, tags, ages = state
+        self.__init__(cache_config, analysis_type, tag_columns)
+        columns = [self.__columns.add(tag) for tag in tags]
+        self.__writable_ages()[:, columns] = ages
+
+    def get_set_lines(self, set_index: int, do_sort: bool = True) -> List[List[MemoryBlock]]:
+        """ 与 ``SetState.get_set_lines`` 相同。 """
+        if self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
+            rtn_list = [list() for _ in range(self.__associativity + 1)]
+        else:
+            rtn_list = [list() for _ in range(self.__associativity)]
+        row = self.__ages[set_index]
+        for column in np.flatnonzero(row != self.__absent).tolist():
+            rtn_list[int(row[column]) - 1].append(MemoryBlock(self.__columns.tag(column), set_index))
+
+        if do_sort:
+            rtn_list = [sorted(item, key=lambda x: x.tag) for item in rtn_list]
+        return rtn_list
+
+    def get_all_set_lines(self, do_sort=True) -> List[List[List[MemoryBlock]]]:
+        """ 与 ``CacheState.get_all_set_lines`` 相同。 """
+        return [self.get_set_lines(set_index, do_sort=do_sort) for set_index in range(self.__cache_config.set_number)]
+
+    def format_all_set_lines(self, title: Optional[str] = None, style="grid", simple=False):
+        """ 与 ``CacheState.format_all_set_lines`` 相同。 """
+        row_index = list(range(self.__cache_config.set_number))
+        headers = [""] + ["l_{}".format(age) for age in range(1, self.__cache_config.associativity + 1)]
+        if self.__analysis_type == CacheAnalysisMethod.PERSISTENT:
+            headers.append("Evicted")
+
+        values = [["\n".join([str(b) if not simple else str(b.tag) for b in item]) for item in set_lines]
+                  for set_lines in self.get_all_set_lines()]
+
+        if title is None:
+            return tabulate(values, headers=headers, showindex=row_index, tablefmt=style)
+        else:
+            return "\n".join([title, tabulate(values, headers=headers, showindex=row_index, tablefmt=style)])
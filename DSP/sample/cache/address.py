@@ -4,14 +4,15 @@ from sample.frontend.cfg import Prog
 from sample.isa.isa_syntax import Instruction, RegModificationEnum
 from sample.cache.cache_config import CacheConfig
 from sample.cache.cache_cfg import CacheCFG
-from typing import Optional, List, Dict, Hashable
+from typing import Optional, List, Dict, Hashable, Tuple
 from sample.isa.isa_type import InstType
-from sample.cache.memory_block import MemoryBlock, MemoryBlockWithScope, ScopeTy
+from sample.cache.memory_block import MemoryBlock, MemoryBlockWithScope, ScopeTy, MemBlockAddr
 from sample.cache.constants import MemoryModel
 from z3 import z3, z3util
 from typing import Set
 import re
 import warnings
+import multiprocessing
 
 Implemented_inst = {
     "ADD",
@@ -194,10 +195,38 @@ def gen_addr(inst: Instruction):
         raise RuntimeError("Unknown address generation {}".format(inst))
 
 
+# position in the instructions considered by expansion: (id of the path suffix, offset in its first node)
+InstPosition = Tuple[int, int]
+# the memory blocks accessed by a node: (instruction address, block addresses) of each memory access
+NodeRecords = List[Tuple[int, Tuple[MemBlockAddr, ...]]]
+
+# each worker gets several chunks of nodes to balance the load
+NODE_CHUNKS_PER_WORKER = 4
+# the analyser inherited by the forked workers
+_ACTIVE_ANALYSER: Optional["Address_analyser"] = None
+
+
+def _analyse_nodes(node_idents: List[Hashable]) -> Tuple[List[Tuple[Hashable, NodeRecords]], int, int]:
+    """ run in worker processes: analyse a chunk of nodes, return their records and the expansion cache hits and misses """
+    analyser = _ACTIVE_ANALYSER
+    hits, misses = analyser.expansion_cache_stats
+    records = [(node_id, [(inst.address, tuple(sorted(block.block_addr for block in blocks)))
+                          for inst, blocks in analyser.analyse_node(node_id).items()])
+               for node_id in node_idents]
+    new_hits, new_misses = analyser.expansion_cache_stats
+    return records, new_hits - hits, new_misses - misses
+
+
 class Address_analyser():
+    """
+    If memoize is set, the results of expansion are cached. The instructions considered by expansion
+    are determined by a path suffix and an offset in its first node, and the expansion from a position
+    only depends on the current expression, so the result is shared by all instructions and paths
+    reaching the same position with the same expression.
+    """
 
     def __init__(self, file: str, slist: str, prog: Prog, cache_config: CacheConfig,
-                 cache_cfg: CacheCFG, memory_model: MemoryModel):
+                 cache_cfg: CacheCFG, memory_model: MemoryModel, memoize: bool = True, jobs: int = 1):
         prefix = file.split('.')[0]
         reader = ASMFileReader(file)
         self.__section_table: Dict[str, Section_info] = parse_section_table('%s.dline' % prefix)
@@ -208,6 +237,14 @@ class Address_analyser():
         self.__slist_dir = slist
         self.__symbol_list = SymbolList(self.__slist_dir)
         self.__memory_model = memory_model
+        self.__memoize = memoize
+        self.__jobs = jobs
+        # path suffixes are interned as (node, id of the remaining suffix) -> id
+        self.__suffix_ids: Dict[Tuple[int, int], int] = dict()
+        # (expression id, base reg modified, skipped insts, position) -> (expression, expanded expression)
+        self.__expansion_cache: Dict[Tuple[int, bool, int, InstPosition], Tuple[z3.ExprRef, z3.ExprRef]] = dict()
+        self.__cache_hits = 0
+        self.__cache_misses = 0
         if memory_model == MemoryModel.SMALL_MEMORY_MODEL:
             self.__base_stack_pointer, self.__base_global_pointer = self.init_pointer()
 
@@ -243,10 +280,12 @@ class Address_analyser():
         return regs
 
     def expansion(self, inst: Instruction, considered_insts: List[Instruction],
-                  linear_expression: Optional[z3.ArithRef] = None):
+                  linear_expression: Optional[z3.ArithRef] = None,
+                  positions: Optional[Dict[int, InstPosition]] = None):
         '''
         There are three types of expressions: constants, registers, and indirect address; 
           indirect address is not extended for now
+        positions maps indexes of considered_insts to their positions, where the expansion is memoized
         '''
         debug = True
         if linear_expression is None:
@@ -258,8 +297,23 @@ class Address_analyser():
             print("    Data reference = %s" % (linear_expression))
 
         skip_remaining = 0
+        base_reg_modified = not inst.base_reg_modification == RegModificationEnum.NoMod
+        pending: List[Tuple[Tuple[int, bool, int, InstPosition], z3.ExprRef]] = []
 
         for index, update_inst in enumerate(considered_insts):
+            if positions is not None and index in positions:
+                key = (linear_expression.get_id(), base_reg_modified, skip_remaining, positions[index])
+                cached = self.__expansion_cache.get(key)
+                if cached is not None:
+                    self.__cache_hits += 1
+                    if debug:
+                        print("                   = %s      # reuse expansion\n" % (cached[1]))
+                    for pending_key, expr in pending:
+                        self.__expansion_cache[pending_key] = (expr, cached[1])
+                    return cached[1]
+                self.__cache_misses += 1
+                pending.append((key, linear_expression))
+
             target_registers = self.get_expand_regs(linear_expression)
             if not target_registers:
                 break
@@ -278,7 +332,7 @@ class Address_analyser():
                 break
 
             if update_inst.is_memory_access and \
-                    not inst.base_reg_modification == RegModificationEnum.NoMod and \
+                    base_reg_modified and \
                     update_inst.inda_gen_operand.inda_base_reg in target_registers:
                 indir_addr = update_inst.inda_gen_operand
                 if indir_addr.inda_post == "++" or indir_addr.inda_pre == "++":
@@ -304,7 +358,7 @@ class Address_analyser():
                     break
                 if update_inst.name in Implemented_inst:
                     update_info = inst_semantics(update_inst) if update_inst.name != "MVKH" \
-                        else MVKH_handler(update_inst, considered_insts)
+                        else MVKH_handler(update_inst, considered_insts[index:])
                     linear_expression = z3.substitute(linear_expression, (Reg(reg), update_info))
                     while (considered_insts[index].is_ep_paralleled and
                            considered_insts[index + 1].operands[-1].ty == OperandTyEnum.Register and
@@ -323,7 +377,16 @@ class Address_analyser():
 
         if debug:
             print("expansion finished\n")
-        return z3.simplify(linear_expression)
+        linear_expression = z3.simplify(linear_expression)
+        # the pending expressions are kept in the cache, so that their ids are not reused
+        for key, expr in pending:
+            self.__expansion_cache[key] = (expr, linear_expression)
+        return linear_expression
+
+    @property
+    def expansion_cache_stats(self) -> Tuple[int, int]:
+        """ (hits, misses) of the expansion cache """
+        return self.__cache_hits, self.__cache_misses
 
     def expand_success(self, expr: z3.ArithRef, expand_complete=False):
         """
@@ -379,6 +442,32 @@ class Address_analyser():
 
         return insts
 
+    def path_suffix_ids(self, path: List[int]) -> List[int]:
+        """ The interned id of path[i:] for each i """
+        ids = [-1] * (len(path) + 1)
+        for i in range(len(path) - 1, -1, -1):
+            ids[i] = self.__suffix_ids.setdefault((path[i], ids[i + 1]), len(self.__suffix_ids))
+        return ids[:-1]
+
+    def considered_insts(self, path: List[int], inst: Instruction) \
+            -> Tuple[Tuple[Instruction, ...], Optional[Dict[int, InstPosition]]]:
+        """ The instructions considered by the expansion of inst along path, and the positions
+        at the start of expansion and of every node if memoized """
+        insts = self.collect_path_insts(path)
+        considered = get_considered_insts(insts, inst)
+        if not self.__memoize:
+            return considered, None
+
+        offset = len(insts) - len(considered)
+        positions: Dict[int, InstPosition] = dict()
+        node_start = 0
+        for node, suffix_id in zip(path, self.path_suffix_ids(path)):
+            node_end = node_start + len(self.__cache_cfg.get_node(node).insts)
+            if node_end > offset:
+                positions[max(node_start - offset, 0)] = (suffix_id, max(offset - node_start, 0))
+            node_start = node_end
+        return considered, positions
+
     def gen_mb_for_local_var(self):
 
         start_addr = self.__section_table["stack"].load_addr
@@ -386,55 +475,93 @@ class Address_analyser():
 
         return addr_mb_map(start_addr, stack_size, self.__cache_config)
 
+    def analyse_node(self, node_id: Hashable) -> Dict[Instruction, Set[MemoryBlock]]:
+        """ The memory blocks accessed by each memory access instruction of a node """
+        try:
+            loops = self.__cache_cfg.get_node_map_loop(node_id)
+        except:
+            loops = list()
+        # node in loop,considering all path in loop
+        if loops:
+            trie = self.__cache_cfg.get_loop_path_trie(loops[0].ident)
+            handles = trie.handles_of(node_id)
+            paths = [trie.path(handle) for handle in handles]
+            common_path = trie.common_prefix(handles)
+        # node not in loop,considering up to 'depth' pre node 
+        else:
+            paths = self.__cache_cfg.get_all_paths_node(node_id)
+            common_path, _ = get_most_common_prefix(paths)
+        if not paths:
+            warnings.warn("The path corresponding to the node{} in the loop{} not found \
+                            Consider loop{} has more than one tail ".format(node_id, loops[0].ident,
+                                                                            loops[0].ident))
+            paths = [[node_id, ]]
+            common_path = [node_id, ]
+        current_node_map: Dict[Instruction, Set[MemoryBlock]] = dict()
+        for inst in self.__cache_cfg.get_node(node_id).insts:
+            if inst.is_memory_access:
+                considered_insts, positions = self.considered_insts(common_path, inst)
+                expr = self.expansion(inst, considered_insts, positions=positions)
+                blocks: Set[MemoryBlock] = set()
+                if self.expand_success(expr):
+                    blocks = self.get_mb_from_linear_expr(expr)
+                else:
+                    expr_list = set()
+                    for path in paths:
+                        uknown_expr = False
+                        considered_insts, positions = self.considered_insts(path, inst)
+                        expr = self.expansion(inst, considered_insts, positions=positions)
+                        if not self.get_mb_from_linear_expr(expr):
+                            uknown_expr = True
+                            break
+                        expr_list.add(expr)
+
+                    if uknown_expr:
+                        blocks = set()
+                    else:
+                        for _expr in list(expr_list):
+                            blocks = blocks.union(self.get_mb_from_linear_expr(_expr))
+
+                current_node_map[inst] = blocks
+
+        return current_node_map
+
     def do_address_analysis(self) -> Dict[Hashable, Dict[Instruction, Set[MemoryBlock]]]:
+        """
+        Nodes are analysed independently. If jobs > 1, the nodes are partitioned into contiguous chunks
+        and analysed by a pool of processes forked once, which return (instruction address, block
+        addresses) records of each node.
+        """
+        global _ACTIVE_ANALYSER
+        node_idents = list(self.__cache_cfg.node_idents)
+        workers = min(self.__jobs, len(node_idents))
 
-        data_memory_ref: Dict[Hashable, Dict[Instruction, Set(MemoryBlock)]] = dict()
+        # the expansion cache and its statistics cover one analysis, so the cache does not grow across analyses
+        self.__expansion_cache.clear()
+        self.__cache_hits, self.__cache_misses = 0, 0
 
-        for node_id in self.__cache_cfg.node_idents:
+        data_memory_ref: Dict[Hashable, Dict[Instruction, Set(MemoryBlock)]] = dict()
+        if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            for node_id in node_idents:
+                data_memory_ref[node_id] = self.analyse_node(node_id)
+        else:
+            chunk_size = max(1, -(-len(node_idents) // (workers * NODE_CHUNKS_PER_WORKER)))
+            chunks = [node_idents[i:i + chunk_size] for i in range(0, len(node_idents), chunk_size)]
+            _ACTIVE_ANALYSER = self
             try:
-                loops = self.__cache_cfg.get_node_map_loop(node_id)
-            except:
-                loops = list()
-            # node in loop,considering all path in loop
-            if loops:
-                paths = self.__cache_cfg.get_all_paths_loop_node(node_id, loops[0].ident)
-            # node not in loop,considering up to 'depth' pre node 
-            else:
-                paths = self.__cache_cfg.get_all_paths_node(node_id)
-            if not paths:
-                warnings.warn("The path corresponding to the node{} in the loop{} not found \
-                                Consider loop{} has more than one tail ".format(node_id, loops[0].ident,
-                                                                                loops[0].ident))
-                paths = [[node_id, ]]
-            current_node_map: Dict[Instruction, Set[MemoryBlock]] = dict()
-            for inst in self.__cache_cfg.get_node(node_id).insts:
-                if inst.is_memory_access:
-                    common_path, _ = get_most_common_prefix(paths)
-                    insts = self.collect_path_insts(common_path)
-                    expr = self.expansion(inst, get_considered_insts(insts, inst))
-                    blocks: Set[MemoryBlock] = set()
-                    if self.expand_success(expr):
-                        blocks = self.get_mb_from_linear_expr(expr)
-                    else:
-                        expr_list = set()
-                        for path in paths:
-                            uknown_expr = False
-                            insts = self.collect_path_insts(path)
-                            expr = self.expansion(inst, get_considered_insts(insts, inst))
-                            if not self.get_mb_from_linear_expr(expr):
-                                uknown_expr = True
-                                break
-                            expr_list.add(expr)
-
-                        if uknown_expr:
-                            blocks = set()
-                        else:
-                            for _expr in list(expr_list):
-                                blocks = blocks.union(self.get_mb_from_linear_expr(_expr))
-
-                    current_node_map[inst] = blocks
-
-            data_memory_ref[node_id] = current_node_map
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    results = pool.map(_analyse_nodes, chunks)
+            finally:
+                _ACTIVE_ANALYSER = None
+
+            for records, hits, misses in results:
+                self.__cache_hits += hits
+                self.__cache_misses += misses
+                for node_id, node_records in records:
+                    insts = {inst.address: inst for inst in self.__cache_cfg.get_node(node_id).insts}
+                    data_memory_ref[node_id] = {insts[address]: {MemoryBlock(tag=tag, set_index=set_index)
+                                                                 for tag, set_index in blocks}
+                                                for address, blocks in node_records}
 
         return data_memory_ref
 
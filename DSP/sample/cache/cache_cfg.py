@@ -1,12 +1,11 @@
 import os.path
-from copy import deepcopy
-from typing import List, Hashable, Optional, Dict, Set, Tuple
+from typing import List, Hashable, Optional, Dict, Set, Tuple, FrozenSet, NamedTuple
 
 from graphviz import Digraph
 
 from sample.frontend.cfg import Prog, TCFGEdgeKind, TCFGNode
 from sample.frontend.loops import LoopHrchy
-from sample.frontend.loop_bound import LoopAnalysis
+from sample.frontend.loop_bound import LoopAnalysis, LoopPathTrie
 from sample.isa.isa_syntax import Instruction
 
 
@@ -45,7 +44,7 @@ class CacheCFGLoop:
         self.__head_node_ident = head_ident
         self.__tail_node_ident = tail_ident
         self.__father_loop: Optional[Hashable] = father_loop
-        self.__paths: Tuple[Tuple[int, ...], ...] = None
+        self.__path_trie: Optional[LoopPathTrie] = None
         self.__loop_bound = None
         self.node_in_loop: Set[Hashable] = set()
         self.ancestor: List[Hashable] = list()
@@ -73,15 +72,57 @@ class CacheCFGLoop:
     def father_loop(self):
         return self.__father_loop
 
-    def set_paths(self, paths):
-        self.__paths = paths
+    def set_path_trie(self, path_trie: LoopPathTrie):
+        self.__path_trie = path_trie
 
     @property
-    def paths(self):
-        return self.__paths
+    def path_trie(self) -> Optional[LoopPathTrie]:
+        """ Prefix trie of the loop paths, which is read-only after set. """
+        return self.__path_trie
+
+    @property
+    def paths(self) -> Optional[Tuple[Tuple[int, ...], ...]]:
+        return self.__path_trie.paths() if self.__path_trie is not None else None
+
+
+class CacheCFGNodeView(NamedTuple):
+    """ Read-only snapshot of a CacheCFGNode, in_nodes and out_nodes keep the iteration order of the node. """
+    ident: Hashable
+    dupl_from: Optional[Hashable]
+    root: Hashable
+    insts: Optional[Tuple[Instruction, ...]]
+    in_nodes: Tuple[Hashable, ...]
+    out_nodes: Tuple[Hashable, ...]
+
+    @staticmethod
+    def of(node: CacheCFGNode) -> "CacheCFGNodeView":
+        return CacheCFGNodeView(node.ident, node.dupl_from, node.root,
+                                tuple(node.insts) if node.insts is not None else None,
+                                tuple(node.in_nodes), tuple(node.out_nodes))
+
+
+class CacheCFGLoopView(NamedTuple):
+    """ Read-only snapshot of a CacheCFGLoop """
+    ident: Hashable
+    head: Hashable
+    tail: Hashable
+    father_loop: Optional[Hashable]
+    path_trie: Optional[LoopPathTrie]
+    node_in_loop: FrozenSet[Hashable]
+    ancestor: Tuple[Hashable, ...]
+    descendant: Tuple[Hashable, ...]
+
+    @staticmethod
+    def of(loop: CacheCFGLoop) -> "CacheCFGLoopView":
+        return CacheCFGLoopView(loop.ident, loop.head, loop.tail, loop.father_loop, loop.path_trie,
+                                frozenset(loop.node_in_loop), tuple(loop.ancestor), tuple(loop.descendant))
 
 
 class CacheCFG:
+    """
+    ``get_node`` and ``get_loop`` return read-only views which are shared by all readers. The views are
+    created on first access and dropped whenever the graph is modified.
+    """
     def __init__(self, instructions: List[Instruction]):
         self.__entry_node_ident = None
         self.__node_pool: Dict[Hashable, CacheCFGNode] = dict()
@@ -89,12 +130,20 @@ class CacheCFG:
         self.__removed_edges: List[Tuple[Hashable, Hashable]] = list()
         self.__instructions: List[Instruction] = instructions
         self.__node_loop_map: Dict[Hashable, List[CacheCFGLoop]] = dict()
+        self.__node_views: Dict[Hashable, CacheCFGNodeView] = dict()
+        self.__loop_views: Dict[Hashable, CacheCFGLoopView] = dict()
+
+    def __invalidate_views(self):
+        self.__node_views.clear()
+        self.__loop_views.clear()
 
     def __add_edge(self, src: Hashable, dst: Hashable):
+        self.__invalidate_views()
         self.__node_pool[src].out_nodes.add(dst)
         self.__node_pool[dst].in_nodes.add(src)
 
     def __remove_edge(self, src: Hashable, dst: Hashable, restrict: bool = False, record: bool = True):
+        self.__invalidate_views()
         if restrict:
             self.__node_pool[src].out_nodes.remove(dst)
             self.__node_pool[dst].in_nodes.remove(src)
@@ -117,25 +166,20 @@ class CacheCFG:
                 right = mid - 1
         raise LookupError
 
+    def get_loop_path_trie(self, loop_id) -> LoopPathTrie:
+        return self.__loop_pool[loop_id].path_trie
+
     def get_all_paths_loop_node(self, target_node, loop_id):
         '''
+        The distinct paths from target_node back to the loop head.
         This implementation does not work for some node  when the loop has multiple tails
         '''
-        loop = self.get_loop(loop_id)
-        loop_paths = loop.paths
-        paths = set()
-        for path in loop_paths:
-            try:
-                index = path.index(target_node)
-            except:
-                continue
-            else:
-                paths.add(path[:index + 1][::-1])
-        return list(paths)
+        trie = self.__loop_pool[loop_id].path_trie
+        return [trie.path(handle) for handle in trie.handles_of(target_node)]
 
     def get_all_paths_node(self, node_id, max_depth=4):
         paths = []
-        start_node = self.get_node(node_id)
+        start_node = self.__node_pool[node_id]
 
         def dfs(current_node: CacheCFGNode, current_path: List[Hashable], depth):
             current_path.append(current_node.ident)
@@ -145,7 +189,7 @@ class CacheCFG:
                 return
             else:
                 for child in current_node.in_nodes:
-                    dfs(self.get_node(child), current_path, depth - 1)
+                    dfs(self.__node_pool[child], current_path, depth - 1)
 
             current_path.pop()
 
@@ -170,6 +214,7 @@ class CacheCFG:
             )
 
     def read_from_front_end(self, prog: Prog, loop_hr: LoopHrchy):
+        self.__invalidate_views()
         """ Nodes """
         for node in prog.tcfg_nodes:
             start_inst = 0
@@ -207,7 +252,7 @@ class CacheCFG:
             # If parent is 0, then it has no parent loop.
             father_loop = None if loop.parent.lid == 0 else loop.parent.lid
             self.__loop_pool[ident] = CacheCFGLoop(ident, head.nid, tail.nid, father_loop=father_loop)
-            self.__loop_pool[ident].set_paths(LoopAnalysis(loop).enumerate_path())
+            self.__loop_pool[ident].set_path_trie(LoopAnalysis(loop).enumerate_path_trie())
         self.__loop_relation_analysis()
 
         """ Mapping of Nodes and Loop """
@@ -227,6 +272,7 @@ class CacheCFG:
             '''From outermost to innermost Loop'''
             loop_list.reverse()
             self.__node_loop_map[ident] = loop_list
+        self.__invalidate_views()
 
     def __loop_topsort(self) -> List[Hashable]:
         """ """
@@ -252,6 +298,7 @@ class CacheCFG:
             if new_ident not in self.__node_pool:
                 break
             times += 1
+        self.__invalidate_views()
         self.__node_pool[new_ident] = CacheCFGNode(new_ident, dupl_from_ident=node.ident, root=node.root)
         return new_ident
 
@@ -327,6 +374,7 @@ class CacheCFG:
         loop_topsorted = self.__loop_topsort()
         for loop_ident in loop_topsorted:
             self.__loop_unrolling_basic(loop_ident, keep_tail_out_edges=keep_tail_out_edges)
+        self.__invalidate_views()
 
     def draw_loop_relationship(self, fig_name: str = "Loop Relationship",
                                head_and_tail: bool = True,
@@ -413,11 +461,17 @@ class CacheCFG:
     def entry_node_ident(self):
         return self.__entry_node_ident
 
-    def get_node(self, ident):
-        return deepcopy(self.__node_pool[ident])
-
-    def get_loop(self, ident):
-        return deepcopy(self.__loop_pool[ident])
+    def get_node(self, ident) -> CacheCFGNodeView:
+        view = self.__node_views.get(ident)
+        if view is None:
+            view = self.__node_views[ident] = CacheCFGNodeView.of(self.__node_pool[ident])
+        return view
+
+    def get_loop(self, ident) -> CacheCFGLoopView:
+        view = self.__loop_views.get(ident)
+        if view is None:
+            view = self.__loop_views[ident] = CacheCFGLoopView.of(self.__loop_pool[ident])
+        return view
 
     def get_node_map_loop(self, ident):
         """
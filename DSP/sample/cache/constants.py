@@ -11,3 +11,8 @@ class CacheAnalysisMethod(Enum):
 class MemoryModel(Enum):
     SMALL_MEMORY_MODEL = auto()
     LARGE_MEMORY_MODEL = auto()
+
+
+class CacheStateBackend(Enum):
+    DICT = auto()
+    ARRAY = auto()
@@ -1,20 +1,26 @@
 from collections import deque, defaultdict
 from copy import deepcopy
-from typing import List, Dict, Hashable, Optional, Set
+from typing import List, Dict, Hashable, Optional, Set, Tuple
 
-from sample.cache.abstract_state import CacheConfig, CacheState
-from sample.cache.cache_cfg import CacheCFG, CacheCFGNode, CacheCFGLoop
-from sample.cache.constants import CacheAnalysisMethod
+from sample.cache.abstract_state import CacheConfig, CacheState, ArrayCacheState, SetState, TagColumns
+from sample.cache.cache_cfg import CacheCFG, CacheCFGNodeView, CacheCFGLoopView
+from sample.cache.constants import CacheAnalysisMethod, CacheStateBackend
 from sample.cache.memory_ref import InstMemoryRef, DataMemoryRef
 
 
 class FixpointState:
     """ 不动点的 instate和 outstate """
-    def __init__(self, cache_config: Optional[CacheConfig] = None, analysis_type: Optional[CacheAnalysisMethod] = None, init_state: Optional[CacheState] = None):
+    def __init__(self, cache_config: Optional[CacheConfig] = None, analysis_type: Optional[CacheAnalysisMethod] = None,
+                 init_state: Optional[CacheState] = None, state_backend: CacheStateBackend = CacheStateBackend.DICT,
+                 tag_columns: Optional[TagColumns] = None):
 
         if cache_config is not None and analysis_type is not None:
-            self.in_state = CacheState(cache_config=cache_config, analysis_type=analysis_type)
-            self.out_state = CacheState(cache_config=cache_config, analysis_type=analysis_type)
+            if state_backend == CacheStateBackend.ARRAY:
+                self.in_state = ArrayCacheState(cache_config, analysis_type, tag_columns)
+                self.out_state = ArrayCacheState(cache_config, analysis_type, tag_columns)
+            else:
+                self.in_state = CacheState(cache_config=cache_config, analysis_type=analysis_type)
+                self.out_state = CacheState(cache_config=cache_config, analysis_type=analysis_type)
         elif init_state is not None:
             self.in_state = deepcopy(init_state)
             self.out_state = deepcopy(init_state)
@@ -25,11 +31,27 @@ class FixpointState:
 
 class Fixpoint:
     """ 用于不动点迭代 """
-    def __init__(self, cfg: CacheCFG, cache_config: CacheConfig):
+    def __init__(self, cfg: CacheCFG, cache_config: CacheConfig, state_backend: CacheStateBackend = CacheStateBackend.DICT):
         self.__cfg = cfg
         self.__cache_config = cache_config
-        self.__nodes_dict: Dict[Hashable, CacheCFGNode] = {ident: cfg.get_node(ident) for ident in cfg.node_idents}
-        self.__loops_dict: Dict[Hashable, CacheCFGLoop] = {ident: cfg.get_loop(ident) for ident in cfg.loop_idents}
+        # Abstract Cache State 的存储方式，见 ``ArrayCacheState``
+        self.__state_backend = state_backend
+        # 本次分析中所有 ``ArrayCacheState`` 共享的列映射
+        self.__tag_columns = TagColumns() if state_backend == CacheStateBackend.ARRAY else None
+        self.__nodes_dict: Dict[Hashable, CacheCFGNodeView] = {ident: cfg.get_node(ident) for ident in cfg.node_idents}
+        self.__loops_dict: Dict[Hashable, CacheCFGLoopView] = {ident: cfg.get_loop(ident) for ident in cfg.loop_idents}
+        self.__round_statistics: List[Tuple[int, int]] = list()
+
+    @property
+    def round_statistics(self) -> List[Tuple[int, int]]:
+        """
+        最近一次不动点分析中每一轮迭代的统计：(实际重新计算哈希值的 set 数, 每次都哈希完整状态时需要计算的 set 数)。
+        """
+        return self.__round_statistics
+
+    @staticmethod
+    def __hashed_count() -> int:
+        return SetState.hashed_count + ArrayCacheState.hashed_count
 
     def do_analysis_inst(self, analysis_type: CacheAnalysisMethod, inst_refs: InstMemoryRef,
                          level: Optional[Hashable] = None) -> Dict[Hashable, FixpointState]:
@@ -41,15 +63,19 @@ class Fixpoint:
             else self.__loops_dict[level].node_in_loop
         " 从Node ident到Abstract State的映射 "
         state_map: Dict[Hashable, FixpointState] = defaultdict(
-            lambda: FixpointState(cache_config=self.__cache_config, analysis_type=analysis_type)
+            lambda: FixpointState(cache_config=self.__cache_config, analysis_type=analysis_type,
+                                  state_backend=self.__state_backend, tag_columns=self.__tag_columns)
         )
 
         """ 判断是否已经达到全局不动点，即检查到的所有的状态都没有发生变化，那么就认为到达了不动点。 """
         global_reach_fixpoint = False
+        set_number = self.__cache_config.set_number
+        self.__round_statistics = list()
 
         while not global_reach_fixpoint:
             global_reach_fixpoint = True
             checked = set()
+            hashed_before, full_hashed = self.__hashed_count(), 0
             q = deque([entry_node])
             while len(q) != 0:
                 """ 获取当前考察的结点。 """
@@ -59,9 +85,10 @@ class Fixpoint:
                 """ 获取该结点的in_state以及哈希值，以供后续比较。 """
                 old_in_state: CacheState = state_map[cur_node_ident].in_state
                 old_in_state_hashed = old_in_state.runtime_ident.__hash__()
+                full_hashed += set_number
 
                 """ 获取该结点所有的前驱结点，并进一步获得在considered中的所有前驱结点的out_state。 """
-                predecessor: Set[Hashable] = cur_node.in_nodes
+                predecessor: Tuple[Hashable, ...] = cur_node.in_nodes
                 to_join_states: List[CacheState] = [state_map[o].out_state
                                                     for o in predecessor if o in node_considered]
 
@@ -69,6 +96,7 @@ class Fixpoint:
                 if len(to_join_states) != 0:
                     new_in_state = sum(to_join_states[1:], start=to_join_states[0])
                     new_in_state_hashed = new_in_state.runtime_ident.__hash__()
+                    full_hashed += set_number
                     state_map[cur_node_ident].in_state = new_in_state
                 else:
                     """ 如果该节点没有任何的前驱结点，那么不改变它的Cache State。 """
@@ -96,6 +124,8 @@ class Fixpoint:
                 """ 将该节点所有的后继结点加入队列q中。 """
                 q.extend(node for node in cur_node.out_nodes if node in node_considered)
 
+            self.__round_statistics.append((self.__hashed_count() - hashed_before, full_hashed))
+
         return dict(state_map)
 
     
@@ -109,15 +139,19 @@ class Fixpoint:
             else self.__loops_dict[level].node_in_loop
         " 从Node ident到Abstract State的映射 "
         state_map: Dict[Hashable, FixpointState] = defaultdict(
-            lambda: FixpointState(cache_config=self.__cache_config, analysis_type=analysis_type)
+            lambda: FixpointState(cache_config=self.__cache_config, analysis_type=analysis_type,
+                                  state_backend=self.__state_backend, tag_columns=self.__tag_columns)
         )
 
         """ 判断是否已经达到全局不动点，即检查到的所有的状态都没有发生变化，那么就认为到达了不动点。 """
         global_reach_fixpoint = False
+        set_number = self.__cache_config.set_number
+        self.__round_statistics = list()
 
         while not global_reach_fixpoint:
             global_reach_fixpoint = True
             checked = set()
+            hashed_before, full_hashed = self.__hashed_count(), 0
             q = deque([entry_node])
             while len(q) != 0:
                 """ 获取当前考察的结点。 """
@@ -127,9 +161,10 @@ class Fixpoint:
                 """ 获取该结点的in_state以及哈希值，以供后续比较。 """
                 old_in_state: CacheState = state_map[cur_node_ident].in_state
                 old_in_state_hashed = old_in_state.runtime_ident.__hash__()
+                full_hashed += set_number
 
                 """ 获取该结点所有的前驱结点，并进一步获得在considered中的所有前驱结点的out_state。 """
-                predecessor: Set[Hashable] = cur_node.in_nodes
+                predecessor: Tuple[Hashable, ...] = cur_node.in_nodes
                 to_join_states: List[CacheState] = [state_map[o].out_state
                                                     for o in predecessor if o in node_considered]
 
@@ -137,6 +172,7 @@ class Fixpoint:
                 if len(to_join_states) != 0:
                     new_in_state = sum(to_join_states[1:], start=to_join_states[0])
                     new_in_state_hashed = new_in_state.runtime_ident.__hash__()
+                    full_hashed += set_number
                     state_map[cur_node_ident].in_state = new_in_state
                 else:
                     """ 如果该节点没有任何的前驱结点，那么不改变它的Cache State。 """
@@ -177,4 +213,6 @@ class Fixpoint:
                 """ 将该节点所有的后继结点加入队列q中。 """
                 q.extend(node for node in cur_node.out_nodes if node in node_considered)
 
+            self.__round_statistics.append((self.__hashed_count() - hashed_before, full_hashed))
+
         return dict(state_map)
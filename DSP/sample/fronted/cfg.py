@@ -12,6 +12,7 @@ TODO: 1. add spurious edge for unreachable code which is the rest of a node
 """
 from __future__ import annotations
 
+import bisect
 import copy
 import itertools
 import json
@@ -19,7 +20,7 @@ import os
 import string
 from collections import deque
 from enum import Enum, Flag, auto
-from typing import List, Optional, Tuple, Deque, Set, Dict, no_type_check, Sequence, Union
+from typing import List, Optional, Tuple, Deque, Set, Dict, no_type_check, Sequence, Union, Iterable
 
 import graphviz
 
@@ -1480,6 +1481,70 @@ class Proc:
         raise CFGException("Can't find cfg node starting from %s" % addr)
 
 
+class TCFGIndex:
+    """Lookup structures over a growing sequence of t-CFG nodes.
+
+    - start address -> t-CFG nodes starting there, in insertion order (the
+      duplicates of one cfg node created by inlining)
+    - node id -> t-CFG node
+    - address range -> cfg node: the distinct cfg nodes sorted by start address,
+      together with the running maximum of their end addresses, so the nodes
+      containing an address are found by bisection.
+
+    Addresses are keyed by their integer value. The range index is rebuilt
+    lazily on the first query after new nodes are added.
+    """
+
+    def __init__(self, nodes: Iterable[TCFGNode] = ()) -> None:
+        self.clear()
+        self.add(nodes)
+
+    def clear(self) -> None:
+        self.__by_addr: Dict[int, List[TCFGNode]] = dict()
+        self.__by_id: Dict[int, TCFGNode] = dict()
+        self.__bbs: Dict[CFGNode, None] = dict()
+        self.__range_nodes: List[CFGNode] = []
+        self.__starts: List[int] = []
+        self.__ends: List[int] = []
+        self.__max_ends: List[int] = []
+        self.__ranges_dirty = False
+
+    def add(self, nodes: Iterable[TCFGNode]) -> None:
+        for node in nodes:
+            self.__by_addr.setdefault(node.start_addr.to_dec(), []).append(node)
+            self.__by_id.setdefault(node.nid, node)
+            if node.bb.code and node.bb not in self.__bbs:
+                self.__bbs[node.bb] = None
+                self.__ranges_dirty = True
+
+    def tnodes_at(self, addr: Addr) -> Tuple[TCFGNode, ...]:
+        """Return the t-CFG nodes starting from given address."""
+        return tuple(self.__by_addr.get(addr.to_dec(), ()))
+
+    def tnode_by_id(self, nid: int) -> Optional[TCFGNode]:
+        return self.__by_id.get(nid)
+
+    def cfg_nodes_at(self, addr: Addr) -> List[CFGNode]:
+        """Return the cfg nodes whose address range contains given address."""
+        if self.__ranges_dirty:
+            self.__build_ranges()
+        val = addr.to_dec()
+        nodes = []
+        i = bisect.bisect_right(self.__starts, val)
+        while i > 0 and self.__max_ends[i - 1] >= val:
+            i -= 1
+            if self.__ends[i] >= val:
+                nodes.append(self.__range_nodes[i])
+        return nodes
+
+    def __build_ranges(self) -> None:
+        self.__range_nodes = sorted(self.__bbs, key=lambda bb: bb.start_addr.to_dec())
+        self.__starts = [bb.start_addr.to_dec() for bb in self.__range_nodes]
+        self.__ends = [bb.code[-1].addr.to_dec() for bb in self.__range_nodes]
+        self.__max_ends = list(itertools.accumulate(self.__ends, max))
+        self.__ranges_dirty = False
+
+
 class Prog:
     """Program type.
 
@@ -1491,7 +1556,11 @@ class Prog:
 
         self.procs: List[Proc] = []
         self.tcfg_nodes: List[TCFGNode] = []
+        self.tcfg_index = TCFGIndex()
         self.dslots: int = dslots
+        # name -> proc and start address -> proc, maintained by read_file
+        self.__proc_by_name: Dict[str, Proc] = dict()
+        self.__proc_by_addr: Dict[int, Proc] = dict()
 
         if jtable is not None:
             assert jtable.endswith(".json")
@@ -1562,6 +1631,10 @@ class Prog:
             self.procs.append(Proc(pid, proc_name, code, labels, self.dslots))
 
         self.proc_map = {proc.start_addr: proc for proc in self.procs}
+        self.__proc_by_name, self.__proc_by_addr = dict(), dict()
+        for proc in self.procs:
+            self.__proc_by_name.setdefault(proc.name, proc)
+            self.__proc_by_addr.setdefault(proc.start_addr.to_dec(), proc)
 
     def read_jtable(self, jtable: str) -> None:
         """Read the (common) jump table."""
@@ -1606,15 +1679,11 @@ class Prog:
         proc.create_cfg()
 
     def has_proc(self, name: str) -> bool:
-        for proc in self.procs:
-            if proc.name == name:
-                return True
-        return False
+        return name in self.__proc_by_name
 
     def get_proc(self, name: str) -> Proc:
-        for proc in self.procs:
-            if proc.name == name:
-                return proc
+        if name in self.__proc_by_name:
+            return self.__proc_by_name[name]
 
         raise CFGException("Proc %s is not found" % name)
 
@@ -1669,6 +1738,7 @@ class Prog:
             new_tcfg_edge(call_bbi, entry_tnode, TCFGEdgeKind.CALL)
 
         self.tcfg_nodes += [bb for _, bb in tcfg_dict.items()]
+        self.tcfg_index.add(tcfg_dict.values())
 
         for _, t_node in tcfg_dict.items():
             for ep in t_node.bb.eps:
@@ -1743,13 +1813,13 @@ class Prog:
         return self.find_proc(next_proc_start_addr)
 
     def find_proc(self, addr: Addr) -> Proc:
-        for proc in self.procs:
-            if proc.start_addr == addr:
-                return proc
+        if addr.to_dec() in self.__proc_by_addr:
+            return self.__proc_by_addr[addr.to_dec()]
         raise CFGException("can't find proc at %s" % addr)
 
     def build_tcfg(self, start: str = "main", end_addr: Optional[Addr] = None) -> None:
         self.tcfg_nodes = []
+        self.tcfg_index.clear()
         self.inline_relation.clear()
         self.proc_inline(start, None, None, end_addr=end_addr)
         assert all(node.nid == i for i, node in enumerate(self.tcfg_nodes))
@@ -1858,16 +1928,14 @@ class Prog:
         return dot
 
     def get_tnode(self, addr: Addr) -> Optional[TCFGNode]:
-        for node in self.tcfg_nodes:
-            if node.start_addr == addr:
-                return node
-        return None
+        nodes = self.tcfg_index.tnodes_at(addr)
+        return nodes[0] if nodes else None
 
     def get_tnode_by_id(self, nid: int) -> TCFGNode:
-        for node in self.tcfg_nodes:
-            if node.nid == nid:
-                return node
-        raise ValueError
+        node = self.tcfg_index.tnode_by_id(nid)
+        if node is None:
+            raise ValueError
+        return node
 
     @no_type_check
     def dump_tcfg_json(self, dump: bool = True):
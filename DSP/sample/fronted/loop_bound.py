@@ -692,6 +692,109 @@ def find_loop_insts(insts: tuple[Instruction, ...],
 
 ID = int
 Path = tuple[ID, ...]
+PathHandle = int
+
+
+class LoopPathTrie:
+    """
+    Prefix trie of the paths of a loop, from the head to the tail. A trie node is identified by
+    a handle, and stands for the path prefix from the head to it. Prefixes shared by several paths
+    are stored once, so that a query only returns handles and paths are built on demand.
+    """
+
+    ROOT: PathHandle = -1
+
+    def __init__(self) -> None:
+        self.labels: list[ID] = []
+        self.parents: list[PathHandle] = []
+        self.depths: list[int] = []
+        self.__children: dict[tuple[PathHandle, ID], PathHandle] = dict()
+        # handles where the paths end, in the order of enumeration
+        self.leaves: list[PathHandle] = []
+        # handles of the first occurrence of each node in complete paths, built on first query
+        self.__occurrences: dict[ID, list[PathHandle]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def child(self, handle: PathHandle, nid: ID) -> PathHandle:
+        """ The handle of prefix(handle) + (nid,), which is created if it does not exist. """
+        key = (handle, nid)
+        if key not in self.__children:
+            self.__children[key] = len(self.labels)
+            self.labels.append(nid)
+            self.parents.append(handle)
+            self.depths.append(self.depths[handle] + 1 if handle != self.ROOT else 1)
+            self.__occurrences = None
+        return self.__children[key]
+
+    def add_leaf(self, handle: PathHandle) -> None:
+        self.leaves.append(handle)
+        self.__occurrences = None
+
+    def add_path(self, path: Path) -> PathHandle:
+        handle = self.ROOT
+        for nid in path:
+            handle = self.child(handle, nid)
+        self.add_leaf(handle)
+        return handle
+
+    def path(self, handle: PathHandle) -> Path:
+        """ The prefix of handle in reversed order, i.e. from its last node back to the head. """
+        nids = []
+        while handle != self.ROOT:
+            nids.append(self.labels[handle])
+            handle = self.parents[handle]
+        return tuple(nids)
+
+    def prefix(self, handle: PathHandle) -> Path:
+        return self.path(handle)[::-1]
+
+    def paths(self) -> tuple[Path, ...]:
+        """ All the paths from the head to the tail, the same as ``LoopAnalysis.enumerate_path``. """
+        return tuple(self.prefix(leaf) for leaf in self.leaves)
+
+    def handles_of(self, nid: ID) -> tuple[PathHandle, ...]:
+        """ The distinct prefixes of complete paths which end at the first occurrence of nid in the path. """
+        if self.__occurrences is None:
+            self.__build_occurrences()
+        return tuple(self.__occurrences.get(nid, ()))
+
+    def __build_occurrences(self) -> None:
+        complete = [False] * len(self.labels)
+        for leaf in self.leaves:
+            handle = leaf
+            while handle != self.ROOT and not complete[handle]:
+                complete[handle] = True
+                handle = self.parents[handle]
+
+        # a node occurs for the first time if no ancestor has the same label
+        first = [False] * len(self.labels)
+        occurrences: dict[ID, list[PathHandle]] = dict()
+        for handle in range(len(self.labels)):  # parents are always created before their children
+            if not complete[handle]:
+                continue
+            ancestor = self.parents[handle]
+            while ancestor != self.ROOT and self.labels[ancestor] != self.labels[handle]:
+                ancestor = self.parents[ancestor]
+            first[handle] = ancestor == self.ROOT
+            if first[handle]:
+                occurrences.setdefault(self.labels[handle], []).append(handle)
+        self.__occurrences = occurrences
+
+    def common_prefix(self, handles: tuple[PathHandle, ...] | list[PathHandle]) -> list[ID]:
+        """ The longest common prefix of ``path(handle)`` of all handles. """
+        current = set(handles)
+        prefix: list[ID] = []
+        while current and self.ROOT not in current:
+            if len(current) == 1:
+                return prefix + list(self.path(current.pop()))
+            labels = {self.labels[handle] for handle in current}
+            if len(labels) != 1:
+                break
+            prefix.append(labels.pop())
+            current = {self.parents[handle] for handle in current}
+        return prefix
 
 
 class LoopAnalysis:
@@ -746,6 +849,26 @@ class LoopAnalysis:
                 worklist.append((dst, cur_path + (dst.nid,)))
         return tuple(path)
 
+    def enumerate_path_trie(self) -> LoopPathTrie:
+        """ The same traversal as ``enumerate_path``, but the paths are stored in a prefix trie. """
+        assert self.lp.tail is not None, "tail does not exist"
+        tail_id = self.lp.tail.nid
+        trie = LoopPathTrie()
+        worklist: deque[tuple[TCFGNode, PathHandle]] = \
+            deque([(self.lp.head, trie.child(LoopPathTrie.ROOT, self.lp.head.nid))])
+        while worklist:
+            node, handle = worklist.pop()
+            if node.nid == tail_id:
+                trie.add_leaf(handle)
+                continue
+            for edge in node.out_edges:
+                if edge.is_back_edge() or edge.is_never_taken \
+                        or edge in self.lp.exit_edges:
+                    continue
+                dst = edge.dst
+                worklist.append((dst, trie.child(handle, dst.nid)))
+        return trie
+
     def path_node(self, path: tuple[int, ...]) -> tuple[TCFGNode, ...]:
         assert path and path[0] == self.lp.head.nid
         if path in self.nodes:
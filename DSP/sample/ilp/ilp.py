@@ -1,12 +1,14 @@
+from __future__ import annotations
+
 import warnings
-from typing import List, Set, Tuple, Dict, Sequence, Union, Optional
+from typing import List, Set, Tuple, Dict, Sequence, Union, Optional, NamedTuple, Iterable
 import subprocess
 import json
 import re
 import time
 
 from sample.frontend.isa import Addr
-from sample.frontend.cfg import TCFGNode, TCFGEdgeKind, CFGNode
+from sample.frontend.cfg import TCFGNode, TCFGEdgeKind, CFGNode, TCFGIndex
 from sample.frontend.dline import DLine
 from sample.frontend.loops import LoopHrchy
 from sample.cache.memory_block import MemoryBlock
@@ -31,6 +33,165 @@ def natural_keys(text: str) -> Tuple[Union[int, str], ...]:
     return tuple([atoi(c) for c in re.split(r'(\d+)', text)])
 
 
+# A linear term (coefficient, variable name).
+Term = Tuple[Union[int, float], str]
+
+
+def render_terms(terms: Sequence[Term], explicit_coef: bool = False) -> str:
+    """ Render terms in CPLEX LP format, e.g. 'b1 - d0_1 - 10 d2_1'.
+    Coefficients 1 and -1 are omitted unless explicit_coef is set. """
+    parts: List[str] = []
+    for coef, var in terms:
+        magnitude = -coef if coef < 0 else coef
+        term = var if magnitude == 1 and not explicit_coef else "%s %s" % (magnitude, var)
+        if parts:
+            parts.append("%s %s" % ("-" if coef < 0 else "+", term))
+        else:
+            parts.append("-%s" % term if coef < 0 else term)
+    return " ".join(parts)
+
+
+class LinearConstraint(NamedTuple):
+    """ A linear constraint: sum(coef * var) <sense> rhs, where sense is one of '=', '<=' and '>='. """
+    terms: Tuple[Term, ...]
+    sense: str
+    rhs: Union[int, float]
+
+    def __str__(self) -> str:
+        return "%s %s %s" % (render_terms(self.terms), self.sense, self.rhs)
+
+
+class LinearModel:
+    """ In-memory representation of an ILP model, which is handed to solvers without text serialization.
+
+    Variables are numbered in order of their first appearance, and the constraint rows are stored
+    in CSR form: the terms of row i are (coefs[k], indices[k]) for k in [indptr[i], indptr[i + 1]).
+    Rows are grouped by the section they are rendered in, and both LP and MPS output are rendered
+    from these arrays.
+    """
+
+    def __init__(self) -> None:
+        self.var_names: List[str] = []
+        self.__var_index: Dict[str, int] = dict()
+
+        # objective function to maximize
+        self.obj_indices: List[int] = []
+        self.obj_coefs: List[Union[int, float]] = []
+
+        # constraint rows
+        self.indptr: List[int] = [0]
+        self.indices: List[int] = []
+        self.coefs: List[Union[int, float]] = []
+        self.senses: List[str] = []
+        self.rhs: List[Union[int, float]] = []
+        self.sections: Dict[str, List[int]] = dict()
+
+        self.__integers: Set[str] = set()
+
+    def var(self, name: str) -> int:
+        """ Return the index of variable name, which is created if it does not exist. """
+        idx = self.__var_index.get(name)
+        if idx is None:
+            idx = self.__var_index[name] = len(self.var_names)
+            self.var_names.append(name)
+        return idx
+
+    @property
+    def objective(self) -> List[Term]:
+        return [(coef, self.var_names[idx]) for idx, coef in zip(self.obj_indices, self.obj_coefs)]
+
+    @objective.setter
+    def objective(self, terms: Iterable[Term]) -> None:
+        self.obj_indices, self.obj_coefs = [], []
+        for coef, var in terms:
+            self.obj_indices.append(self.var(var))
+            self.obj_coefs.append(coef)
+
+    @property
+    def integers(self) -> Set[str]:
+        return self.__integers
+
+    def add_integers(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.var(name)
+            self.__integers.add(name)
+
+    @property
+    def row_num(self) -> int:
+        return len(self.senses)
+
+    def add_constraint(self, section: str, terms: Iterable[Term], sense: str, rhs: Union[int, float]) -> int:
+        """ Append the row sum(coef * var) <sense> rhs to section and return its index. """
+        for coef, var in terms:
+            self.indices.append(self.var(var))
+            self.coefs.append(coef)
+        self.indptr.append(len(self.indices))
+        self.senses.append(sense)
+        self.rhs.append(rhs)
+        self.sections.setdefault(section, []).append(len(self.senses) - 1)
+        return len(self.senses) - 1
+
+    def add_constraints(self, section: str, constraints: Iterable[LinearConstraint]) -> None:
+        for con in constraints:
+            self.add_constraint(section, con.terms, con.sense, con.rhs)
+        self.sections.setdefault(section, [])
+
+    def row(self, i: int) -> LinearConstraint:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return LinearConstraint(tuple((self.coefs[k], self.var_names[self.indices[k]]) for k in range(start, end)),
+                                self.senses[i], self.rhs[i])
+
+    @property
+    def constraints(self) -> List[LinearConstraint]:
+        """ All constraints in order of sections. """
+        return [self.row(i) for rows in self.sections.values() for i in rows]
+
+    def variables(self) -> List[str]:
+        return list(self.var_names)
+
+    def copy(self) -> LinearModel:
+        model = LinearModel()
+        model.var_names = list(self.var_names)
+        model.__var_index = dict(self.__var_index)
+        model.obj_indices, model.obj_coefs = list(self.obj_indices), list(self.obj_coefs)
+        model.indptr, model.indices, model.coefs = list(self.indptr), list(self.indices), list(self.coefs)
+        model.senses, model.rhs = list(self.senses), list(self.rhs)
+        model.sections = {section: list(rows) for section, rows in self.sections.items()}
+        model.__integers = set(self.__integers)
+        return model
+
+    def __render_row(self, i: int) -> str:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        terms = [(self.coefs[k], self.var_names[self.indices[k]]) for k in range(start, end)]
+        return "%s %s %s" % (render_terms(terms), self.senses[i], self.rhs[i])
+
+    def render_lp(self) -> str:
+        """ Render the model as a CPLEX LP file. """
+        lp_model = ["Maximize\n\n", render_terms(self.objective, explicit_coef=True), "\n\n\nSubject to\n\n"]
+        for i, (section, rows) in enumerate(self.sections.items()):
+            lp_model.append("%s\\ === %s ===\n" % ("\n\n\n" if i else "", section))
+            lp_model.append("\n".join(self.__render_row(row) for row in rows))
+        lp_model += [
+            "\n\n\nGenerals\n\n\n",
+            "\n".join(sorted(self.__integers, key=natural_keys)),
+            "\n\n\nEnd\n",
+            "\\ total cons: %s    total vars: %s\n" % (self.row_num, len(self.__integers))
+        ]
+        return "".join(lp_model)
+
+    def columns(self) -> List[List[Tuple[int, Union[int, float]]]]:
+        """ Transpose the rows: the (row index, coefficient) pairs of each variable, in order of rows. """
+        cols: List[List[Tuple[int, Union[int, float]]]] = [[] for _ in self.var_names]
+        for i in range(self.row_num):
+            for k in range(self.indptr[i], self.indptr[i + 1]):
+                cols[self.indices[k]].append((i, self.coefs[k]))
+        return cols
+
+    def render_mps(self, prob_name: str = "TEST") -> str:
+        """ Render the model as a free MPS file. """
+        return MPS(self, prob_name).gen_mps_file()
+
+
 class ILPModel:
     """ Representation of ILP model w.r.t the predicted number of running cycles for each block. """
 
@@ -42,6 +203,9 @@ class ILPModel:
         # TCFG nodes
         self.__tcfg_nodes: Tuple[TCFGNode, ...] = tuple(lp_hrchy.tcfg_nodes)
 
+        # address -> TCFG nodes and address range -> CFG node
+        self.__tcfg_index: TCFGIndex = TCFGIndex(self.__tcfg_nodes)
+
         # Loop Hierarchy
         self.__lp_hrchy: LoopHrchy = lp_hrchy
 
@@ -104,7 +268,7 @@ class ILPModel:
         # data cache config
         self.__data_cache_config = data_cache_config
 
-    def gen_obj_func(self) -> str:
+    def gen_obj_func(self) -> List[Term]:
         """ 
         Generate object function.
         The object function is of the form: c_0 * b_0 + c_1 * b_1 + ... + c_n * b_n
@@ -112,34 +276,32 @@ class ILPModel:
         b_i is the number of times block B_i is executed when the program take the maximum time to complete.
         """
 
-        costs: List[str] = []
+        costs: List[Term] = []
         for node in self.__tcfg_nodes:
             """ Remove all unreachable nodes from integer variables. """
             if len(node.in_edges) == 1 and node.in_edges[0].edge_kind == TCFGEdgeKind.NEVER_TAKEN:
                 # Current node is an unreachable node.
-                self.__int_vars.remove("b{}".format(node.nid))
+                self.__int_vars.discard("b{}".format(node.nid))
                 continue
             c_i = self.__pred_cycle[node.nid]
             # TODO: One times for under must analysis, one times for under persistent analysis.
-            # context term
-            costs.extend(["%s b%s.v%d" % (c_i[idx], node.nid ,idx)  if len(c_i)>1 else "%s b%s" % (c_i[0], node.nid) 
-                   for idx in range(len(c_i))])
+            # context term (negative execute cycles may occur)
+            costs.extend([(c_i[idx], "b%s.v%d" % (node.nid, idx)) if len(c_i) > 1 else (c_i[0], "b%s" % node.nid)
+                          for idx in range(len(c_i))])
         
         # inst cache term 
         for node_id, inst_con in self.__inst_cache_cons.items():
-            costs.extend(["%s x%d_%d.m"%(self.__inst_cache_config.penalty, node_id, block_id) 
-                                for block_id in range(len(inst_con))])
+            costs.extend([(self.__inst_cache_config.penalty, "x%d_%d.m" % (node_id, block_id))
+                          for block_id in range(len(inst_con))])
             
         # data cache term 
         for node_id, data_con in self.__data_cache_cons.items():
-            costs.extend(["%s dr%d_%d.m"%(self.__data_cache_config.penalty, node_id, inst_id) 
-                                for inst_id in range(len(data_con))])
+            costs.extend([(self.__data_cache_config.penalty, "dr%d_%d.m" % (node_id, inst_id))
+                          for inst_id in range(len(data_con))])
         
-        obj_func = " + ".join(costs)
-        obj_func = obj_func.replace("+ -","- ") # # Negative execute cycles may occur
-        return obj_func
+        return costs
 
-    def gen_tcfg_cons(self) -> Tuple[str, ...]:
+    def gen_tcfg_cons(self) -> Tuple[LinearConstraint, ...]:
         """ Generate the linear constraints which describe the relation between tcfg nodes and edges.
         
         The constraints are of the form
@@ -148,27 +310,29 @@ class ILPModel:
         where b_i has the same meaning as it in object function, d_i_jk means the number of times edge b_i -> b_jk is executed.
         """
 
-        cons: List[str] = ["dSta_0 = 1", "b0 - dSta_0 = 0"]  # the head of TCFG can only be executed once
+        # the head of TCFG can only be executed once
+        cons: List[LinearConstraint] = [LinearConstraint(((1, "dSta_0"),), "=", 1),
+                                        LinearConstraint(((1, "b0"), (-1, "dSta_0")), "=", 0)]
 
         for node in self.__tcfg_nodes:
 
-            in_edge_times = " - ".join("d%s_%s" % (edge.src.nid, node.nid)
-                                       for edge in node.in_edges if edge.edge_kind != TCFGEdgeKind.NEVER_TAKEN)
+            in_edge_times = [(-1, "d%s_%s" % (edge.src.nid, node.nid))
+                             for edge in node.in_edges if edge.edge_kind != TCFGEdgeKind.NEVER_TAKEN]
             if in_edge_times:
-                cons.append("b%s - %s = 0" % (node.nid, in_edge_times))
+                cons.append(LinearConstraint(((1, "b%s" % node.nid), *in_edge_times), "=", 0))
 
-            out_edge_times = " - ".join("d%s_%s" % (node.nid, edge.dst.nid)
-                                        for edge in node.out_edges if edge.edge_kind != TCFGEdgeKind.NEVER_TAKEN)
+            out_edge_times = [(-1, "d%s_%s" % (node.nid, edge.dst.nid))
+                              for edge in node.out_edges if edge.edge_kind != TCFGEdgeKind.NEVER_TAKEN]
             if out_edge_times:
-                cons.append("b%s - %s = 0" % (node.nid, out_edge_times))
+                cons.append(LinearConstraint(((1, "b%s" % node.nid), *out_edge_times), "=", 0))
 
         return tuple(cons)
 
     def find_tcfg_node(self, addr: Addr) -> Tuple[TCFGNode, ...]:
-        return tuple(node for node in self.__tcfg_nodes if node.start_addr == addr)
+        return self.__tcfg_index.tnodes_at(addr)
 
     def find_cfg_nodes(self, addrs:Sequence[Addr]) -> Set[CFGNode]:
-        return set([node.bb for node in self.__tcfg_nodes for addr in addrs if node.bb.is_in_node(addr)])
+        return set(bb for addr in addrs for bb in self.__tcfg_index.cfg_nodes_at(addr))
 
     def find_loop_addr(self, addrs: Sequence[Addr]) -> Tuple[Addr, Addr]:
         """Given the related address of loop condition, locating the loop and return the pair (head_addr, tail_addr).
@@ -226,7 +390,7 @@ class ILPModel:
         # so it should be able to guarantee the success of zip pairing.
         return tuple(zip(self.find_tcfg_node(head_addr), self.find_tcfg_node(tail_addr)))
 
-    def add_loop_bound(self, loop_head: TCFGNode, loop_tail: TCFGNode, bound: int) -> str:
+    def add_loop_bound(self, loop_head: TCFGNode, loop_tail: TCFGNode, bound: int) -> LinearConstraint:
         """ Given a loop head node and its upper bound, generate corresponding loop constraint in which
         the execution times of loop head would be less than (bound - 1) times of its predecessor.
         """
@@ -234,14 +398,10 @@ class ILPModel:
             raise NotImplementedError("More than two incoming edges is not supported now.")
         tail_addr = loop_tail.start_addr
         pred_edges = tuple([edge for edge in loop_head.in_edges if edge.src.start_addr != tail_addr])
-        cons = "b%s - " % loop_head.nid
-
-        if loop_head.is_self_loop():
-            return "%s%s <= 0" % (cons, " - ".join("%s d%s_%s" % (bound, edge.src.nid, edge.dst.nid) for edge in pred_edges))
-        else:
-            return "%s%s <= 0" % (cons, " - ".join("%s d%s_%s" % (bound , edge.src.nid, edge.dst.nid) for edge in pred_edges))
+        return LinearConstraint(((1, "b%s" % loop_head.nid),
+                                 *((-bound, "d%s_%s" % (edge.src.nid, edge.dst.nid)) for edge in pred_edges)), "<=", 0)
 
-    def gen_loop_bounds(self) -> Tuple[str, ...]:
+    def gen_loop_bounds(self) -> Tuple[LinearConstraint, ...]:
 
         if self.__loop_cons_file is None:
             warnings.warn("No loop bound file specified. For programs with loops, this may cause ILP solving to fail.")
@@ -251,7 +411,7 @@ class ILPModel:
             loop_cons_info = json.load(f)
         dline_info = DLine(self.__dline_file)
 
-        bounds: List[str] = []
+        bounds: List[LinearConstraint] = []
         for loop_cons in loop_cons_info["src"]:
             src_name = loop_cons["name"]
             lnp = dline_info[src_name]  # A dict mapping from line number in src code to address (maybe more than one) in asm file.
@@ -279,7 +439,7 @@ class ILPModel:
                             self.__loop_bounds[self.__lp_hrchy.loop_map[head.nid].lid] = bound
         return tuple(bounds)
     
-    def gen_context_cons(self) -> str:
+    def gen_context_cons(self) -> Tuple[LinearConstraint, ...]:
         """ Generate the linear constraints for duplicates.
         
         The constraints are of the form
@@ -288,15 +448,16 @@ class ILPModel:
         where b_i and d_i_jk have the same meaning as it in object function,the vi suffix represents its duplicate
         """
  
-        cons: List[str] = []  
+        cons: List[LinearConstraint] = []
 
         for node in self.__tcfg_nodes:
             if (len(self.__pred_cycle[node.nid]))>1:
-                duplicate_times=" - ".join("b%d.v%d"%(node.nid ,duplicate ) for duplicate in range(len(self.__pred_cycle[node.nid])))
+                duplicate_times = [(-1, "b%d.v%d" % (node.nid, duplicate))
+                                   for duplicate in range(len(self.__pred_cycle[node.nid]))]
 
-                cons.append("b%s - %s = 0" % (node.nid, duplicate_times))
-                cons.extend(["b%d.v%d - d%s_%s = 0" % (node.nid,idx,edge.src.nid, node.nid) for idx,edge in enumerate(node.in_edges) 
-                            if edge.edge_kind != TCFGEdgeKind.NEVER_TAKEN])
+                cons.append(LinearConstraint(((1, "b%s" % node.nid), *duplicate_times), "=", 0))
+                cons.extend([LinearConstraint(((1, "b%d.v%d" % (node.nid, idx)), (-1, "d%s_%s" % (edge.src.nid, node.nid))), "=", 0)
+                             for idx, edge in enumerate(node.in_edges) if edge.edge_kind != TCFGEdgeKind.NEVER_TAKEN])
                     
         return tuple(cons)
     
@@ -310,7 +471,7 @@ class ILPModel:
         
         return miss_bound
 
-    def gen_inst_cache_cons(self):
+    def gen_inst_cache_cons(self) -> Tuple[LinearConstraint, ...]:
         """ Generate the cache constraints for persistent blocks.
         
         The constraints are of the form
@@ -324,18 +485,18 @@ class ILPModel:
         miss_bounds: Dict[int, int] = {loop_level : self.gen_miss_bounds(loop_level) 
                                                 for loop_level in self.__lp_hrchy.loops.keys()
                                                     if loop_level}
-        cons: List[str] = []
+        cons: List[LinearConstraint] = []
 
         for node_id, inst_con in self.__inst_cache_cons.items():
             for block_id, loop_level in enumerate(list(inst_con.values())) :
                 memory_block_hit = "x%d_%d.h"%(node_id, block_id)
                 memory_block_miss = "x%d_%d.m"%(node_id, block_id)
-                cons.append("b%s - %s - %s = 0" % (node_id, memory_block_hit, memory_block_miss))
-                cons.append("%s <= %d" % (memory_block_miss, miss_bounds[loop_level]))
+                cons.append(LinearConstraint(((1, "b%s" % node_id), (-1, memory_block_hit), (-1, memory_block_miss)), "=", 0))
+                cons.append(LinearConstraint(((1, memory_block_miss),), "<=", miss_bounds[loop_level]))
 
         return tuple(cons)
     
-    def gen_data_cache_cons(self):
+    def gen_data_cache_cons(self) -> Tuple[LinearConstraint, ...]:
         """ Generate the data cache constraints for persistent blocks.
         
         The constraints are of the form
@@ -348,18 +509,18 @@ class ILPModel:
         miss_bounds: Dict[int, int] = {loop_level : self.gen_miss_bounds(loop_level) 
                                                 for loop_level in self.__lp_hrchy.loops.keys()
                                                     if loop_level}
-        cons: List[str] = []
+        cons: List[LinearConstraint] = []
 
         for node_id, data_con in self.__data_cache_cons.items():
             for inst_id, loop_level in enumerate(list(data_con.values())) :
                 data_refer_hit = "dr%d_%d.h"%(node_id, inst_id)
                 data_refer_miss = "dr%d_%d.m"%(node_id, inst_id)
-                cons.append("b%s - %s - %s = 0" % (node_id, data_refer_hit, data_refer_miss))
-                cons.append("%s <= %d" % (data_refer_miss, miss_bounds[loop_level]))
+                cons.append(LinearConstraint(((1, "b%s" % node_id), (-1, data_refer_hit), (-1, data_refer_miss)), "=", 0))
+                cons.append(LinearConstraint(((1, data_refer_miss),), "<=", miss_bounds[loop_level]))
 
         return tuple(cons)
 
-    def gen_ilp_model(self) -> str:
+    def gen_linear_model(self) -> LinearModel:
         """ Generating ilp model consists of the following steps.
             1. Generate object function.
             2. Generate tcfg constraints.
@@ -367,32 +528,22 @@ class ILPModel:
             4. Generate context constraints.
             5. Generate cache constraints.
             6. Tell lp solver about the integer variables.
-            7. Generate the statistics which include the number of constraints and the number of variables.
         """
 
-        tcfg_cons = self.gen_tcfg_cons()
-        loop_bounds = self.gen_loop_bounds()
-        context_cons = self.gen_context_cons()
-        inst_cache_cons = self.gen_inst_cache_cons()
-        data_cache_cons = self.gen_data_cache_cons()
-        obj_func = self.gen_obj_func()
-
-        lp_model = [
-            "Maximize\n\n", obj_func,
-            "\n\n\nSubject to\n\n",
-            "\\ === tcfg constraints ===\n", "\n".join(con for con in tcfg_cons),
-            "\n\n\n\\ === header constraints ===\n", "\n".join(bound for bound in loop_bounds),
-            "\n\n\n\\ === context constraints ===\n", "\n".join(context for context in context_cons),
-            "\n\n\n\\ === inst cache constraints ===\n", "\n".join(cache for cache in inst_cache_cons),
-            "\n\n\n\\ === data cache constraints ===\n", "\n".join(cache for cache in data_cache_cons),
-            "\n\n\nGenerals\n\n\n",
-            "\n".join(sorted(self.__int_vars, key=natural_keys)),
-            "\n\n\nEnd\n",
-            "\\ total cons: %s    total vars: %s\n" % (len(tcfg_cons) + len(loop_bounds) + len(context_cons) +
-                                                        len(context_cons) +len(inst_cache_cons) + len(data_cache_cons),
-                                                          len(self.__int_vars))
-        ]
-        return "".join(lp_model)
+        model = LinearModel()
+        model.add_constraints("tcfg constraints", self.gen_tcfg_cons())
+        model.add_constraints("header constraints", self.gen_loop_bounds())
+        model.add_constraints("context constraints", self.gen_context_cons())
+        model.add_constraints("inst cache constraints", self.gen_inst_cache_cons())
+        model.add_constraints("data cache constraints", self.gen_data_cache_cons())
+        # the object function removes unreachable nodes from integer variables, so it is generated last
+        model.objective = self.gen_obj_func()
+        model.add_integers(sorted(self.__int_vars, key=natural_keys))
+        return model
+
+    def gen_ilp_model(self) -> str:
+        """ Generate the ilp model in CPLEX LP format. """
+        return self.gen_linear_model().render_lp()
 
 
 class LPSolve:
@@ -400,11 +551,16 @@ class LPSolve:
     
     Parameters:
     - lp_file: the path of file xxx.lp which is of CPLEX LP format.
+    - solver_loc: the location of lp_solve executable.
     """
 
-    def __init__(self, lp_file: str) -> None:
+    def __init__(self, lp_file: str, solver_loc: str = "lp_solve") -> None:
         assert lp_file.endswith(".lp") or lp_file.endswith(".mps")
         self.lp_file = lp_file
+        self.solver_loc = solver_loc
+
+        # the raw output of lp_solve
+        self.output: Optional[str] = None
 
         # denote whether the constraints are feasible
         self.__is_sat: Optional[bool] = None
@@ -547,14 +703,15 @@ class LPSolve:
             ]
 
         start = time.perf_counter()
-        with subprocess.Popen("lp_solve %s" % " ".join(args),
-                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True) as p:
+        with subprocess.Popen([self.solver_loc] + args,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE) as p:
             out, err_msg = p.communicate()
         end = time.perf_counter()
 
         if err_msg != b"":
             raise ILPException(err_msg.decode("UTF-8"))
-        self.parse_output(out.decode("UTF-8"))
+        self.output = out.decode("UTF-8")
+        self.parse_output(self.output)
         return end - start
 
     def dump_stat(self, show_ivar: bool = False) -> str:
@@ -575,17 +732,18 @@ class LPSolve:
         return "\n".join(stat)
 
 class MPS:
-    """Generate mps format file from ILPModel"""
-    def __init__(self, obj_func: str, tcfg_cons: Tuple[str], loop_bounds: Tuple[str], prob_name: Optional[str] = "TEST"):
-        # Load obj func, tcfg cons and loop bounds from an ILPModel
-        self.obj_func = obj_func
-        self.tcfg_cons = tcfg_cons
-        self.loop_bounds = loop_bounds
+    """Generate free MPS format file from the CSR rows of a LinearModel.
+
+    The objective row is named OBJ and constraint row i is named R<i>. Integer variables are
+    put between INTORG and INTEND markers with an explicit [0, +inf) bound.
+    """
+    def __init__(self, model: LinearModel, prob_name: Optional[str] = "TEST"):
+        self.model = model
 
         # these four sections are main parts of mps file
         self.NAME: str = prob_name
 
-        # rows are type and name for each obj_func, tcfg_cons and loop_bounds
+        # rows are type and name for each obj_func and constraint
         # type      meaning
         # E         equality
         # L         less than or equal
@@ -596,97 +754,59 @@ class MPS:
         # Tuple[Tuple[type:str, name: str]]
 
         # COLUMNS are coefficients of each variable
-        self.COLUMNS: Dict[str, Dict[str, int]] = dict()
+        self.COLUMNS: Dict[str, Dict[str, Union[int, float]]] = dict()
         # Dict[var_name: str, Dict[row_name: str, coefficient: int]]
 
-        # RHS are right-hand side of each obj_func, tcfg_cons and loop_bounds
-        self.RHS: Dict[str, int] = dict()
+        # RHS are right-hand side of each constraint
+        self.RHS: Dict[str, Union[int, float]] = dict()
         # Dict[row_name: str, value: int]
 
     def gen_ROWS(self) -> None:
-        rows = [("N", "OBJ")]
-        for i in range(len(self.tcfg_cons)):
-            rows.append(("E", "CONS%s" % i))
-        for i in range(len(self.loop_bounds)):
-            rows.append(("L","BOUND%s" % i))
-        self.ROWS = tuple(rows)
+        row_type = {"=": "E", "<=": "L", ">=": "G"}
+        self.ROWS = (("N", "OBJ"),) + tuple((row_type[sense], "R%d" % i) for i, sense in enumerate(self.model.senses))
 
     def gen_COLUMNS(self) -> None:
+        objective: Dict[int, Union[int, float]] = dict()
+        for idx, coef in zip(self.model.obj_indices, self.model.obj_coefs):
+            objective[idx] = objective.get(idx, 0) + coef
+
+        self.COLUMNS = dict()
+        for idx, col in enumerate(self.model.columns()):
+            entries: Dict[str, Union[int, float]] = dict()
+            if objective.get(idx, 0) != 0:
+                entries["OBJ"] = objective[idx]
+            for row, coef in col:
+                entries["R%d" % row] = entries.get("R%d" % row, 0) + coef
+            if entries:
+                self.COLUMNS[self.model.var_names[idx]] = entries
 
-        def update_col(col: str, row: str, val: int) -> None:
-            """util func to add {row: val} to self.COLUMNS[col]"""
-            if col not in self.COLUMNS:
-                tmp_dict = dict()
-            else:
-                tmp_dict = self.COLUMNS[col]
-            tmp_dict[row] = val
-            self.COLUMNS[col] = tmp_dict
-
-        obj_func = self.obj_func
-        obj_func = obj_func.replace('*', '')
-        obj_func_split = obj_func.split()
-        # now form: coeff0 b0 coeff1 b1 coeff2 b2 ...
-        for i in range(len(obj_func_split)):
-            if obj_func_split[i].startswith('b'):
-                update_col(obj_func_split[i], "OBJ", int(obj_func_split[i-1]))
-
-        for i, cons in enumerate(self.tcfg_cons):
-            row = "CONS%s" % i
-
-            cols = cons
-            for useless_char in "+-()":
-                cols = cols.replace(useless_char, '')
-            # only vars, '=' and rhs_value are left
-            cols = cols.split()
-
-            # cons form is b0-(b1+b2...)=0, so coeff0 = 1 and other coeff -1
-            update_col(cols[0], row, 1)
-            for col in cols[1:]:
-                if col == '=':
-                    break
-                update_col(col, row, -1)
-
-        for i, bound in enumerate(self.loop_bounds):
-            row = "BOUND%s" % i
-            cols = bound.replace('-', '').split()
-            # bound form: b0 - (coeff1*b1 + coeff2*b2...) <= 0. coeff0 = 1 and others are negative value
-            # now form: b0 coeff1 b1 coeff2 b2 ... <= 0
-
-            update_col(cols[0], row, 1)
-            for i in range(1, len(cols)):
-                if cols[i] == '<=':
-                    break
-                if cols[i].isdigit():
-                    continue
-                update_col(cols[i], row, -int(cols[i-1]))
-    
     def gen_RHS(self) -> None:
-        
-        for i, cons in enumerate(self.tcfg_cons):
-            if int(cons.split()[-1]) != 0: # zero is default
-                self.RHS["CONS%s" % i] = int(cons.split()[-1])
-
-        for i, bound in enumerate(self.loop_bounds):
-            if int(bound.split()[-1]) != 0: # zero is default
-                self.RHS["BOUND%s" % i] = int(bound.split()[-1])
+        self.RHS = {"R%d" % i: rhs for i, rhs in enumerate(self.model.rhs) if rhs != 0}  # zero is default
 
     def gen_mps_file(self) -> str:
         self.gen_ROWS()
         self.gen_COLUMNS()
         self.gen_RHS()
+
+        def column_lines(names: List[str]) -> List[str]:
+            return ["    %-10s%-10s%12s" % (col, row, val) for col in names for row, val in self.COLUMNS[col].items()]
+
+        int_cols = [col for col in self.COLUMNS if col in self.model.integers]
         mps = [
             "NAME           %s" % self.NAME,
             "OBJSENSE",
             " MAX",
             "ROWS",
-            "\n".join(" %-3s%s" % (Type, name) for Type, name in self.ROWS),
+            *(" %-3s%s" % (Type, name) for Type, name in self.ROWS),
             "COLUMNS",
-            "    MARK0000  'MARKER'                 'INTEND'",
-            "\n".join("\n".join("    %-10s%-10s%12s" % (col, row, val) for row, val in self.COLUMNS[col].items()) for col in self.COLUMNS),
-            "    MARK0000  'MARKER'                 'INTEND'",
+            *column_lines([col for col in self.COLUMNS if col not in self.model.integers]),
+            "    MARK0000  'MARKER'                 'INTORG'",
+            *column_lines(int_cols),
+            "    MARK0001  'MARKER'                 'INTEND'",
             "RHS",
-            "\n".join("    %-10s%-10s%12s" % ("rhs", row, val) for row, val in self.RHS.items()),
-            "SOS",
+            *("    %-10s%-10s%12s" % ("rhs", row, val) for row, val in self.RHS.items()),
+            "BOUNDS",
+            *(" PL BND       %s" % col for col in int_cols),
             "ENDATA"]
         
-        return "\n".join(mps)
+        return "\n".join(mps) + "\n"
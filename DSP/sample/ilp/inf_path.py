@@ -1,8 +1,10 @@
 from sample.frontend.loops import LoopHrchy, Loop
 from sample.frontend.cfg import TCFGNode, TCFGEdge, TCFGEdgeKind
 from sample.frontend.isa import Instruction, Operand, Reg, MemRef, ConstVal, HexVal, RegPair, gp_reg_names, Cond
-from sample.ilp.ilp import LPSolve
-from typing import List, Set, Tuple, Dict, Optional
+from sample.ilp.ilp import LinearModel, LinearConstraint
+from sample.ilp.solver import ILPSolver, ILPResult, LPSolveBackend
+from typing import List, Set, Tuple, Dict, Optional, NamedTuple
+import multiprocessing
 import z3
 import time
 
@@ -13,12 +15,24 @@ class InfPathException(Exception):
     def __str__(self) -> str:
         return self.err_msg
 
+# the trace of a register: (tcfg node id, the instruction assigning it or None)
+Trace = List[Tuple[int, Optional[Instruction]]]
+# a loop path is identified by the loop id and the ids of its nodes
+PathKey = Tuple[int, Tuple[int, ...]]
+
+
 class SMTModel:
-    """ representation of an SMT model """
-    def __init__(self) -> None:
-        self._solver = z3.Solver()
+    """ representation of an SMT model
+
+    The constraints are added to the z3 solver in a push/pop scope while solving, so that one
+    solver can be shared by all paths of a loop. """
+    def __init__(self, solver: Optional[z3.Solver] = None) -> None:
+        self._solver = solver if solver is not None else z3.Solver()
         self.props: List[z3.Bool] = []
         self.prop_to_cons: Dict[z3.Bool, z3.BoolRef] = dict()
+        self.cons_map: Dict[z3.BoolRef, Tuple[TCFGEdge, Trace]] = dict()
+        # mapping from a constraint to the corresponding edge and trace of its reg
+        self._assertions: List[z3.BoolRef] = []
         self._index = 0
     
     def add_cons(self, cons: z3.BoolRef) -> None:
@@ -26,21 +40,71 @@ class SMTModel:
         self._index += 1
         self.props.append(p)
         self.prop_to_cons[p] = cons
-        self._solver.add(z3.Implies(p, cons))
+        self._assertions.append(z3.Implies(p, cons))
     
     def solve(self) -> List[z3.BoolRef]|None:
-        res = self._solver.check(self.props)
-        if res == z3.sat:
+        self._solver.push()
+        try:
+            self._solver.add(*self._assertions)
+            res, core = _check(self._solver, len(self.props))
+        finally:
+            self._solver.pop()
+        return self.unsat_core(res, core)
+
+    def to_smt2(self) -> str:
+        """ serialize the constraints as SMT-LIB2, the props are declared as p0, p1, ... """
+        solver = z3.Solver()
+        solver.add(*self._assertions)
+        return solver.sexpr()
+
+    def unsat_core(self, res: str, core: List[int]) -> List[z3.BoolRef]|None:
+        """ interpret a check result, core are the indices of props in the unsat core """
+        if res == "sat":
             return None
-        elif res == z3.unsat:
-            return [self.prop_to_cons[p] for p in self._solver.unsat_core()]
-        elif res == z3.unknown:
+        elif res == "unsat":
+            return [self.prop_to_cons[self.props[i]] for i in core]
+        elif res == "unknown":
             raise InfPathException('z3.check failed')
         else:
             raise InfPathException('unknown z3.check result')
 
     def Print(self):
-        print(self._solver)
+        print(self._assertions)
+
+
+def _check(solver: z3.Solver, prop_num: int) -> Tuple[str, List[int]]:
+    """ check the solver under props p0, p1, ..., return the result and sorted indices of the unsat core """
+    res = solver.check([z3.Bool("p%i" % i) for i in range(prop_num)])
+    core = sorted(int(p.decl().name()[1:]) for p in solver.unsat_core()) if res == z3.unsat else []
+    return str(res), core
+
+
+def _check_smt2(task: Tuple[str, int]) -> Tuple[str, List[int]]:
+    """ run in worker processes: check an SMT model serialized by SMTModel.to_smt2 """
+    smt2, prop_num = task
+    solver = z3.Solver()
+    solver.from_string(smt2)
+    return _check(solver, prop_num)
+
+
+def check_smt_models(smts: List[SMTModel], jobs: int = 1) -> List[Optional[List[z3.BoolRef]]]:
+    """ check the SMT models, return their unsat cores in order.
+    The models are serialized as SMT-LIB2 and checked concurrently if jobs > 1. """
+    workers = min(jobs, len(smts))
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [smt.solve() for smt in smts]
+    tasks = [(smt.to_smt2(), len(smt.props)) for smt in smts]
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        results = pool.map(_check_smt2, tasks)
+    return [smt.unsat_core(res, core) for smt, (res, core) in zip(smts, results)]
+
+
+class IterationStat(NamedTuple):
+    """ statistics of an iteration of InfPath.iterative_solve """
+    smt_time: float
+    ilp_time: float
+    paths: int          # the number of loop paths
+    checked_paths: int  # the number of loop paths checked by z3, the others hit the cache
 
 def parse_operand(s: str) -> Operand:
     if s.isdigit() or s.lstrip('-').isdigit():
@@ -64,15 +128,26 @@ class InfPath:
     """ generate a series of SMTModel to check satisfiability of a wcet path """
     """ TODO: sliding window, associate first iteration and above && last iteration and behind """
 
-    def __init__(self, loophrchy: LoopHrchy, lp_file: str) -> None:
+    def __init__(self, loophrchy: LoopHrchy, model: LinearModel,
+                 solver: Optional[ILPSolver] = None, lp_file: Optional[str] = None, jobs: int = 1) -> None:
+        """ The ILP model is refined in place with infeasible path constraints. If lp_file is given,
+        the refined model is also written to it after each iteration. If jobs > 1, the SMT models
+        of loop paths are checked by a pool of jobs processes. """
+        self._model = model
+        self._jobs = jobs
+        self._solver: ILPSolver = solver if solver is not None else LPSolveBackend()
         self._lp_file = lp_file
+        self._conflict_var_num = 0  # the number of support variables x%d in infeasible path constraints
+        self._iteration_stats: List[IterationStat] = []
         self._tcfg_nodes: Tuple[TCFGNode, ...] = tuple(loophrchy.tcfg_nodes)
         self._loop_map: Dict[int, Loop] = loophrchy.loop_map
         self._loops: Dict[int, Loop] = loophrchy.loops
-        self._cons_map: Dict[str, Tuple(TCFGEdge, List[Tuple(int, Optional[Instruction])])] = dict()
-        # mapping from a constraint of an SMT model to the corresponding edge and trace of all reg
-
         self._smt: List[SMTModel] = []
+        self._loop_solvers: Dict[int, z3.Solver] = dict()
+        # z3 solvers shared by the paths of each loop
+        self._path_results: Dict[PathKey, List[Tuple[z3.BoolRef, TCFGEdge, Trace]]] = dict()
+        # unsat core of each checked path with the edge and trace of every constraint, empty if sat
+        self._path_stat: Tuple[int, int] = (0, 0)  # (paths, checked paths) of the last solve
 
         self._trace: Dict[Operand, List[Tuple(int, Instruction | None)]] = dict()
         # mapping from register to its current assign-use trace. used in debug
@@ -80,10 +155,25 @@ class InfPath:
         for reg_name in gp_reg_names:
             self._trace[Reg(reg_name)] = []
 
-        lp_solve = LPSolve(lp_file)
-        lp_solve.solve()
-        assert(lp_solve.is_bound)
-        self._vars: Dict[str, int]= lp_solve.vars
+        self._result: ILPResult = self._solver.solve(self._model)
+        assert(self._result.is_bound)
+        self._vars: Dict[str, int]= self._result.vars
+
+    @property
+    def model(self) -> LinearModel:
+        return self._model
+
+    @property
+    def result(self) -> ILPResult:
+        return self._result
+
+    @property
+    def iteration_count(self) -> int:
+        return len(self._iteration_stats)
+
+    @property
+    def iteration_stats(self) -> List[IterationStat]:
+        return self._iteration_stats
     
     def reset(self, op: Operand, operand_state: Dict[Operand, z3.ExprRef], reg_index:Dict[Reg, int]) -> None:
         if not op in operand_state.keys():
@@ -106,10 +196,11 @@ class InfPath:
                 idx = path.index(bb)
                 outedge = [edge for edge in bb.out_edges if edge.dst == path[idx+1]][0]
                 cons, trace = self.gen_cons(inst, operand_state, outedge)
-                self._smt[-1].add_cons(cons)
+                smt = self._smt[-1]
+                smt.add_cons(cons)
                 # print(outedge, cons, operand_state)
-                if cons not in self._cons_map:
-                    self._cons_map[cons] = (outedge, trace)
+                if cons not in smt.cons_map:
+                    smt.cons_map[cons] = (outedge, trace)
                 continue
             if inst.name in (".fphead", "MVC") or inst.is_branch or inst.name.startswith("SP"):
                 continue
@@ -302,7 +393,7 @@ class InfPath:
             else:
                 return z3.simplify(operand_state[cond.reg] != 0), self._trace[cond.reg]
 
-    def gen_smt_single_path(self, loop: Loop, path: List[TCFGNode]) -> None:
+    def gen_smt_single_path(self, loop: Loop, path: List[TCFGNode]) -> SMTModel:
         """
         dfs the whole loop to collect all the branch condition
 
@@ -315,8 +406,12 @@ class InfPath:
         for reg_name in gp_reg_names:
             operand_state[Reg(reg_name)] = z3.Int("%s_0" % reg_name)
             reg_index[Reg(reg_name)] = 1
+        # the model only depends on the path, so that it can be cached
+        self._trace = dict()
+        for reg_name in gp_reg_names:
+            self._trace[Reg(reg_name)] = []
 
-        self._smt.append(SMTModel())
+        self._smt.append(SMTModel(self._loop_solvers.setdefault(loop.lid, z3.Solver())))
 
         i = 0
         while i < len(path):
@@ -342,7 +437,7 @@ class InfPath:
             self.update_state(node, operand_state, reg_index, path)
             
             i += 1
-        
+        return self._smt[-1]
     
     def dfs_collect_paths(self, loop: Loop, node: TCFGNode) -> List[List[TCFGNode]]:
         if node.out_edges == []: # end of loop 0 (end of prog)
@@ -362,30 +457,40 @@ class InfPath:
             return [[node] + path for path in self.dfs_collect_paths(loop, edge.dst)]
 
 
-    def gen_smt(self) -> None:
+    def gen_smt(self) -> List[Tuple[PathKey, Optional[SMTModel]]]:
+        """ collect the paths of all loops under the current ILP solution, and generate SMT models
+        for the paths which are not checked in previous iterations. """
+        self._smt = []
+        paths = []
+        generated: Set[PathKey] = set()
         for loop in self._loops.values():
-            paths = self.dfs_collect_paths(loop, loop.head)
-            for path in paths:
-                self.gen_smt_single_path(loop, path)
+            for path in self.dfs_collect_paths(loop, loop.head):
+                key = (loop.lid, tuple(node.nid for node in path))
+                if key in self._path_results or key in generated:
+                    paths.append((key, None))
+                else:
+                    generated.add(key)
+                    paths.append((key, self.gen_smt_single_path(loop, path)))
+        return paths
+
+    def check_smt(self, smts: List[SMTModel]) -> List[Optional[List[z3.BoolRef]]]:
+        """ check the SMT models, return their unsat cores in order """
+        return check_smt_models(smts, self._jobs)
 
     def solve(self, verbal = True) -> Optional[Set[Tuple[str]]]:
-        # initialize for iteration
-        self._smt = []
-        self._cons_map = dict()
-        self._trace = dict()
-        for reg_name in gp_reg_names:
-            self._trace[Reg(reg_name)] = []
+        paths = self.gen_smt()
+        unchecked = [(key, smt) for key, smt in paths if smt is not None]
+        for (key, smt), unsat_core in zip(unchecked, self.check_smt([smt for _, smt in unchecked])):
+            self._path_results[key] = [] if unsat_core is None else \
+                [(cons, *smt.cons_map[cons]) for cons in unsat_core]
+        self._path_stat = (len(paths), len(unchecked))
 
-        self.gen_smt()
         new_cons = set()
-        for SMTModel in self._smt:
-            unsat_core = SMTModel.solve()
-            if unsat_core != None:
-                
-                for cons in unsat_core:
+        for key, _ in paths:
+            if self._path_results[key]:
+
+                for cons, final_edge, trace in self._path_results[key]:
                     trace_edges = []
-                    final_edge = self._cons_map[cons][0]
-                    trace = self._cons_map[cons][1]
 
                     if verbal:
                         print('trace back of Cons: ', end='')
@@ -443,63 +548,56 @@ class InfPath:
                 print('unsat')
             return new_cons
         
-    def iterative_solve(self, verbal = False) -> int:
-        """ TODO: random stop """
-        it_count = 1
-        index = 0
+    def add_conflict_cons(self, conflicts: Set[Tuple[str]]) -> None:
+        """ For each set of conflict edges {d_1, ..., d_n}, at most n - 1 of them are executed:
+              x_i <= 1,  x_1 + ... + x_n <= n - 1,  d_i - 99999 x_i <= 0
+        where x_i are integer support variables. """
+        cons: List[LinearConstraint] = []
+        for conflict_edges in sorted(conflicts):
+            edge_num = len(conflict_edges)
+            support_vars = ["x%d" % i for i in range(self._conflict_var_num, self._conflict_var_num + edge_num)]
+            # add support var range bound
+            cons.extend(LinearConstraint(((1, var),), "<=", 1) for var in support_vars)
+            # add support var non-zero constraint
+            cons.append(LinearConstraint(tuple((1, var) for var in support_vars), "<=", edge_num - 1))
+            # add edge constraint
+            cons.extend(LinearConstraint(((1, edge), (-99999, var)), "<=", 0)
+                        for edge, var in zip(conflict_edges, support_vars))
+            # add support var type constraint
+            self._model.add_integers(support_vars)
+            self._conflict_var_num += edge_num
+        self._model.add_constraints("infeasible path constraints", cons)
+
+    def iterative_solve(self, verbal = False) -> float:
+        """ Refine the ILP model until the wcet path is feasible, return the total time.
+        The time of each iteration is recorded in iteration_stats.
+        TODO: random stop """
         start_time = time.time()
         while True:
-            print("iteration %d:" % it_count, end='')
+            print("iteration %d:" % (self.iteration_count + 1), end='')
+            smt_start = time.time()
             res = self.solve(verbal = verbal)
+            smt_time = time.time() - smt_start
+            paths, checked = self._path_stat
             if res == None:
+                self._iteration_stats.append(IterationStat(smt_time, 0., paths, checked))
                 if not verbal:
-                    print("sat!")
+                    print("sat! (smt %.3fs, %d/%d paths checked)" % (smt_time, checked, paths))
                 end_time = time.time()
+                print("%d iterations in %.3fs" % (self.iteration_count, end_time - start_time))
                 return end_time - start_time
 
-            with open(self._lp_file, 'r') as lp_file:
-                lines = [line.strip() for line in lp_file.readlines()]
-                pos = lines.index("Generals")
-                # add header
-                if "\\ === infeasible path constraints ===" not in lines:
-                    lines.insert(pos, "\\ === infeasible path constraints ===")
-                    pos += 1
-
-                for conflict_edges in res:
-                    edge_num = len(conflict_edges)
-                    # add support var range bound
-                    for i in range(index, index + edge_num):
-                        lines.insert(pos, "x%d <= 1" % i)
-                        pos += 1
-                    
-                    # add support var non-zero constraint
-                    lines.insert(pos, "%s <= %d" % (" + ".join(["x%d" % i for i in range(index, index + edge_num)]), edge_num-1))
-                    pos += 1
-
-                    # add edge constraint
-                    for i in range(edge_num):
-                        lines.insert(pos, "%s - 99999 x%d <= 0" % (conflict_edges[i], index + i))
-                        pos += 1
+            ilp_start = time.time()
+            self.add_conflict_cons(res)
+            if self._lp_file is not None:
+                with open(self._lp_file, 'w') as lp_file:
+                    lp_file.write(self._model.render_lp())
 
-                    lines.insert(pos, "")
-                    lines.insert(pos, "")
-                    pos += 2
-
-                    # add support var type constraint
-                    pos += 1
-                    for i in range(index, index + edge_num):
-                        lines.insert(pos, "x%d" % i)
-                        pos += 1
-
-                    index += edge_num
-
-            with open(self._lp_file, 'w') as lp_file:
-                lp_file.write("\n".join(lines))
-            
-            lp_solve = LPSolve(self._lp_file)
-            lp_solve.solve()
-            self._vars = lp_solve.vars
-            it_count += 1
+            # the model is only tightened, so the last solution can warm start the solver
+            self._result = self._solver.solve(self._model, warm_start=self._result)
+            self._vars = self._result.vars
+            ilp_time = time.time() - ilp_start
+            self._iteration_stats.append(IterationStat(smt_time, ilp_time, paths, checked))
 
             if not verbal:
-                print("unsat.")
+                print("unsat. (smt %.3fs, ilp %.3fs, %d/%d paths checked)" % (smt_time, ilp_time, checked, paths))
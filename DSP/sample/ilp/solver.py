@@ -0,0 +1,247 @@
+"""Pluggable solvers for the ILP models generated by ILPModel.
+
+- LPSolveBackend renders the model as a CPLEX LP file and runs lp_solve on it.
+- BranchAndBoundBackend solves the model in process. The LP relaxations are solved by
+  HiGHS through scipy (an optional dependency), and integrality is enforced by a
+  depth-first branch and bound.
+
+Both backends return an ILPResult. A previous result can be passed as warm start when
+the model has only been tightened since (e.g. infeasible path constraints are appended),
+the in-process backend then reuses it as a candidate solution and as an upper bound.
+"""
+from __future__ import annotations
+
+import abc
+import dataclasses
+import math
+import os
+import tempfile
+import time
+from enum import Enum, auto
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from sample.ilp.ilp import LinearModel, LPSolve, ILPException
+
+
+class SolverBackend(Enum):
+    LP_SOLVE = auto()
+    BRANCH_AND_BOUND = auto()
+
+
+@dataclasses.dataclass
+class ILPResult:
+    """ Solution of an ILP model.
+    obj_max_val is None and vars is empty unless the model is feasible and bounded. """
+    is_sat: bool
+    is_bound: bool = True
+    obj_max_val: Optional[float] = None
+    vars: Dict[str, Union[int, float]] = dataclasses.field(default_factory=dict)
+    cons_num: int = 0
+    vars_num: int = 0
+    ivars_num: int = 0
+    elapsed: float = 0.
+    # the raw output of lp_solve
+    raw_output: Optional[str] = None
+
+    def get_val(self, var_name: str) -> Union[int, float]:
+        if var_name not in self.vars:
+            raise ILPException("Can't find the exact value of %s." % var_name)
+        return self.vars[var_name]
+
+    def dump_stat(self, show_ivar: bool = False) -> str:
+        stat = [
+            "Statistics",
+            "Constraints: %s" % self.cons_num,
+            "Variables  : %s" % self.vars_num,
+            "Integers   : %s" % self.ivars_num,
+        ]
+        if not self.is_sat:
+            stat.append("This problem is infeasible")
+        elif not self.is_bound:
+            stat.append("This problem is unbounded")
+        else:
+            stat.append("Value of objective function: %.3f" % self.obj_max_val)
+            if show_ivar:
+                stat.append("Actual values of the variables:")
+                for name, val in self.vars.items():
+                    stat.append("{:<15}{:>15}".format(name, val))
+        return "\n".join(stat)
+
+
+class ILPSolver(abc.ABC):
+    """ Interface of ILP solvers. """
+
+    @abc.abstractmethod
+    def solve(self, model: LinearModel, warm_start: Optional[ILPResult] = None) -> ILPResult:
+        """ Maximize the objective of model. warm_start is a result of a model this one only tightens. """
+
+
+class LPSolveBackend(ILPSolver):
+    """ Solve the model by lp_solve.
+
+    Parameters:
+    - solver_loc: the location of lp_solve executable.
+    - lp_file: where the model is written, a temporary file is used if not given.
+    """
+
+    def __init__(self, solver_loc: str = "lp_solve", lp_file: Optional[str] = None) -> None:
+        self.solver_loc = solver_loc
+        self.lp_file = lp_file
+
+    def solve(self, model: LinearModel, warm_start: Optional[ILPResult] = None) -> ILPResult:
+        """ lp_solve runs in another process and can't be warm started, so warm_start is ignored. """
+        if self.lp_file is not None:
+            lp_file, temporary = self.lp_file, False
+        else:
+            fd, lp_file = tempfile.mkstemp(suffix=".lp")
+            os.close(fd)
+            temporary = True
+
+        try:
+            with open(lp_file, "w", encoding="UTF-8") as f:
+                f.write(model.render_lp())
+            lp_solve = LPSolve(lp_file, self.solver_loc)
+            elapsed = lp_solve.solve()
+        finally:
+            if temporary:
+                os.remove(lp_file)
+
+        result = ILPResult(is_sat=lp_solve.is_sat, cons_num=lp_solve.cons_num, vars_num=lp_solve.vars_num,
+                           ivars_num=lp_solve.ivars_num, elapsed=elapsed, raw_output=lp_solve.output)
+        if result.is_sat:
+            result.is_bound = lp_solve.is_bound
+            if result.is_bound:
+                result.obj_max_val = lp_solve.obj_max_val
+                result.vars = dict(lp_solve.vars)
+        return result
+
+
+class BranchAndBoundBackend(ILPSolver):
+    """ Solve the model in process by branch and bound over LP relaxations.
+
+    Parameters:
+    - max_nodes: the maximum number of LP relaxations to solve.
+    - tolerance: the tolerance of integrality and of the objective value.
+    """
+
+    def __init__(self, max_nodes: int = 100000, tolerance: float = 1e-6) -> None:
+        self.max_nodes = max_nodes
+        self.tolerance = tolerance
+
+    def solve(self, model: LinearModel, warm_start: Optional[ILPResult] = None) -> ILPResult:
+        try:
+            from scipy.optimize import linprog
+            from scipy.sparse import csr_matrix
+        except ImportError:
+            raise ILPException("The in-process ILP backend requires scipy, "
+                               "install it by 'python -m pip install scipy' or use lp_solve instead.")
+
+        start = time.perf_counter()
+        names = model.var_names
+        is_int = np.array([name in model.integers for name in names], dtype=bool)
+
+        c = np.zeros(len(names))
+        np.add.at(c, np.array(model.obj_indices, dtype=int), np.array(model.obj_coefs, dtype=float))
+
+        # the rows are already in CSR form, '>=' rows are negated into '<=' rows
+        a_all = csr_matrix((np.array(model.coefs, dtype=float), np.array(model.indices, dtype=int),
+                            np.array(model.indptr, dtype=int)), shape=(model.row_num, len(names)))
+        senses = np.array(model.senses, dtype=object)
+        sign = np.where(senses == ">=", -1., 1.)
+        b_all = sign * np.array(model.rhs, dtype=float)
+        a_all = csr_matrix(a_all.multiply(sign[:, None]))
+        is_eq = senses == "="
+
+        def select(rows: np.ndarray):
+            if not rows.any():
+                return None, None
+            return a_all[rows], b_all[rows]
+
+        a_eq, b_eq = select(is_eq)
+        a_ub, b_ub = select(~is_eq)
+
+        result = ILPResult(is_sat=False, cons_num=model.row_num, vars_num=len(names),
+                           ivars_num=int(is_int.sum()))
+
+        def finish(x: np.ndarray) -> ILPResult:
+            x = np.where(is_int, np.round(x), x)
+            result.is_sat, result.is_bound = True, True
+            result.obj_max_val = float(c @ x)
+            result.vars = {name: int(val) if float(val).is_integer() else float(val) for name, val in zip(names, x)}
+            result.elapsed = time.perf_counter() - start
+            return result
+
+        def is_feasible(x: np.ndarray) -> bool:
+            tol = self.tolerance
+            if (x < -tol).any() or (np.abs(x - np.round(x))[is_int] > tol).any():
+                return False
+            if a_eq is not None and (np.abs(a_eq @ x - b_eq) > tol).any():
+                return False
+            return a_ub is None or not (a_ub @ x - b_ub > tol).any()
+
+        # The model has only been tightened since warm_start, so its objective value bounds the new optimum,
+        # and it is still optimal if it satisfies the new constraints.
+        upper_bound = math.inf
+        if warm_start is not None and warm_start.is_sat and warm_start.is_bound and warm_start.obj_max_val is not None:
+            x0 = np.array([warm_start.vars.get(name, 0) for name in names], dtype=float)
+            if is_feasible(x0):
+                return finish(x0)
+            upper_bound = warm_start.obj_max_val
+
+        best_x: Optional[np.ndarray] = None
+        best_obj = -math.inf
+        # each node is a pair of lower and upper bounds of the variables
+        stack = [(np.zeros(len(names)), np.full(len(names), np.inf))]
+        nodes = 0
+        while stack:
+            lower, upper = stack.pop()
+            nodes += 1
+            if nodes > self.max_nodes:
+                raise ILPException("Branch and bound exceeds %d nodes." % self.max_nodes)
+
+            lp = linprog(-c, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq,
+                         bounds=np.column_stack((lower, upper)), method="highs")
+            if lp.status == 2:  # infeasible
+                continue
+            if lp.status == 3:  # unbounded
+                result.is_sat, result.is_bound = True, False
+                result.elapsed = time.perf_counter() - start
+                return result
+            if lp.status != 0:
+                raise ILPException("LP relaxation failed: %s" % lp.message)
+
+            obj = -lp.fun
+            if obj <= best_obj + self.tolerance:
+                continue
+            x = lp.x
+            frac = np.where(is_int, np.abs(x - np.round(x)), 0.)
+            j = int(np.argmax(frac)) if len(frac) else 0
+            if len(frac) == 0 or frac[j] <= self.tolerance:
+                best_x, best_obj = x, obj
+                if best_obj >= upper_bound - self.tolerance:
+                    break
+                continue
+
+            # explore the nearer branch first
+            down_upper, up_lower = upper.copy(), lower.copy()
+            down_upper[j], up_lower[j] = math.floor(x[j]), math.ceil(x[j])
+            down, up = (lower, down_upper), (up_lower, upper)
+            if x[j] - math.floor(x[j]) >= 0.5:
+                stack += [down, up]
+            else:
+                stack += [up, down]
+
+        if best_x is None:
+            result.elapsed = time.perf_counter() - start
+            return result
+        return finish(best_x)
+
+
+def make_solver(backend: SolverBackend, solver_loc: str = "lp_solve", lp_file: Optional[str] = None) -> ILPSolver:
+    if backend == SolverBackend.LP_SOLVE:
+        return LPSolveBackend(solver_loc, lp_file)
+    elif backend == SolverBackend.BRANCH_AND_BOUND:
+        return BranchAndBoundBackend()
+    raise ValueError("Unknown ILP solver backend %s." % (backend,))
@@ -9,7 +9,7 @@ from sample.pipeline.abstract_interpretation import FPInPipeline, FPDispatch, EP
 from sample.pipeline.behaviors import PipelineBehavior
 from sample.pipeline.constants import InstType, PipelineStage
 from sample.pipeline.sploop import SPLoopType, SPLoopSimulator
-from sample.pipeline.tracer import PipelineTracer
+from sample.pipeline.tracer import PipelineTracer, NULL_TRACER
 
 
 def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_is_line_head: Sequence[bool],
@@ -19,11 +19,7 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
                                     is_sp_loop_body: bool,
                                     sp_type: Optional[SPLoopType] = None, ii: Optional[int] = None, max_iter: Optional[int] = None,
                                     log: bool = False, status_log: bool = False) -> Tuple[int, PipelineTracer]:
-    """ Do block sim for single block. """
-
-    def behavior_append(tracer: PipelineTracer, behavior: Tuple):
-        if log:
-            tracer.append(behavior)
+    """ Do block sim for single block. Without log, no behavior is built and the shared NULL_TRACER is returned. """
 
     if inst_cache_config.penalty <= 0:
         warnings.warn("No instruction miss stall occurs during pipeline simulation because inst_penalty <= 0.")
@@ -31,7 +27,7 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
         warnings.warn("No data miss stall occurs during pipeline simulation because data_penalty <= 0.")
 
     """ This buffer contains all cache behaviors in chronological order. """
-    pipeline_tracer: PipelineTracer = PipelineTracer()
+    pipeline_tracer: PipelineTracer = PipelineTracer() if log else NULL_TRACER
 
     # Before Decode:DP stage, data flows in FP.
     fp_in_pg: Optional[FPInPipeline] = None
@@ -70,7 +66,8 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
     if hazard_ep_num > 0:
         warnings.warn("{} EPs may lead to pipeline hazard in basic block {}.".format(hazard_ep_num, block_id))
 
-    behavior_append(pipeline_tracer, (PipelineBehavior.DO_PIPELINE_SIMULATION_START, block_id))
+    if log:
+        pipeline_tracer.append((PipelineBehavior.DO_PIPELINE_SIMULATION_START, block_id))
 
     """
     SPLOOP related.
@@ -83,7 +80,8 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
     sp_simulator: Optional[SPLoopSimulator]
     sp_looping: bool  # True if current block is a SPLOOP body and set to False until getting an SPKERNEL instruction.
     if is_sp_loop_body:
-        behavior_append(pipeline_tracer, (PipelineBehavior.SPLOOP_BODY, ))
+        if log:
+            pipeline_tracer.append((PipelineBehavior.SPLOOP_BODY, ))
         sp_simulator = SPLoopSimulator(spl_type=sp_type, ii=ii, max_iter=max_iter)
         sp_looping = True
     else:
@@ -93,14 +91,16 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
     while True:
         if next_stage_penalty != 0:
             penalty_start, penalty_finish = current_cycle + 1, current_cycle + next_stage_penalty
-            behavior_append(pipeline_tracer, (PipelineBehavior.NEW_STALLED_PIPELINE_CYCLES, penalty_start, penalty_finish))
+            if log:
+                pipeline_tracer.append((PipelineBehavior.NEW_STALLED_PIPELINE_CYCLES, penalty_start, penalty_finish))
             next_stage_penalty = 0  # penalty clear.
             current_cycle = penalty_finish
             continue
 
         current_cycle += 1
         cpu_cycle += 1
-        behavior_append(pipeline_tracer, (PipelineBehavior.NEW_PIPELINE_CYCLE, current_cycle))
+        if log:
+            pipeline_tracer.append((PipelineBehavior.NEW_PIPELINE_CYCLE, current_cycle))
 
         """ ========================================================================================================================= """
         """ ========================================================================================================================= """
@@ -124,12 +124,14 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
                 ep_in_ei[ei + 1] = None
             elif ei + 1 == ep_in_ei[ei].execute_cycle:
                 ep_in_ei[ei + 1] = None
-                behavior_append(pipeline_tracer, (PipelineBehavior.EP_EXECUTE_FINISH, ep_in_ei[ei].ep_id, PipelineStage.Execute, ei + 1))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.EP_EXECUTE_FINISH, ep_in_ei[ei].ep_id, PipelineStage.Execute, ei + 1))
                 # Execute stage counts from 0
             else:
                 ep_in_ei[ei + 1] = ep_in_ei[ei]
-                behavior_append(pipeline_tracer, (PipelineBehavior.EP_TO_NEXT_STAGE, ep_in_ei[ei].ep_id,
-                                                  PipelineStage.Execute, ei + 1, PipelineStage.Execute, ei + 2))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.EP_TO_NEXT_STAGE, ep_in_ei[ei].ep_id,
+                                            PipelineStage.Execute, ei + 1, PipelineStage.Execute, ei + 2))
                 # Execute stage counts from 0
 
             """ 
@@ -147,15 +149,17 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
                     # Store
                     for inst in store_inst:
                         if inst.addr not in hit_data_refer:
-                            behavior_append(pipeline_tracer, (PipelineBehavior.DATA_CACHE_MISS_STALL, ep_in_e3.ep_id, inst.addr,
-                                                            data_cache_config.penalty, current_cycle + 1, current_cycle + data_cache_config.penalty))
+                            if log:
+                                pipeline_tracer.append((PipelineBehavior.DATA_CACHE_MISS_STALL, ep_in_e3.ep_id, inst.addr,
+                                                      data_cache_config.penalty, current_cycle + 1, current_cycle + data_cache_config.penalty))
                             # Choose the longest stall.
                             next_stage_penalty = max(next_stage_penalty, data_cache_config.penalty)
                     # Load
                     for inst in load_inst:
                         if inst.addr not in hit_data_refer:
-                            behavior_append(pipeline_tracer, (PipelineBehavior.DATA_CACHE_MISS_STALL, ep_in_e3.ep_id, inst.addr,
-                                                            data_cache_config.penalty, current_cycle + 1, current_cycle + data_cache_config.penalty))
+                            if log:
+                                pipeline_tracer.append((PipelineBehavior.DATA_CACHE_MISS_STALL, ep_in_e3.ep_id, inst.addr,
+                                                      data_cache_config.penalty, current_cycle + 1, current_cycle + data_cache_config.penalty))
                             # Choose the longest stall.
                             next_stage_penalty = max(next_stage_penalty, data_cache_config.penalty)
 
@@ -175,11 +179,13 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
         if ep_in_ei[0] is not None:
             if ep_in_ei[0].execute_cycle == 0:
                 """ If current EP only contains control instructions(e.g. SPLOOP, SPKERNEL, ect), then it executes finished. """
-                behavior_append(pipeline_tracer, (PipelineBehavior.EP_EXECUTE_FINISH, ep_in_ei[0].ep_id, PipelineStage.Decode, PipelineStage.DC))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.EP_EXECUTE_FINISH, ep_in_ei[0].ep_id, PipelineStage.Decode, PipelineStage.DC))
                 ep_in_ei[0] = None
             else:
-                behavior_append(pipeline_tracer, (PipelineBehavior.EP_TO_NEXT_STAGE, ep_in_ei[0].ep_id,
-                                                  PipelineStage.Decode, PipelineStage.DC, PipelineStage.Execute, 1))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.EP_TO_NEXT_STAGE, ep_in_ei[0].ep_id,
+                                            PipelineStage.Decode, PipelineStage.DC, PipelineStage.Execute, 1))
 
         """ 
         ------------------------------------------------------------------------
@@ -193,18 +199,21 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
             ep_in_dc = EP_WITH_SINGLE_NOP
         elif fp_in_dp is not None:
             ep_in_dc = fp_in_dp.dispatch()
-            behavior_append(pipeline_tracer, (PipelineBehavior.DC_NEW_EP_DISPATCH, fp_in_dp.fp_id, ep_in_dc.ep_id))
+            if log:
+                pipeline_tracer.append((PipelineBehavior.DC_NEW_EP_DISPATCH, fp_in_dp.fp_id, ep_in_dc.ep_id))
             """ If all execute packets are dispatched, then this fetch packet is freed out and waiting next fetch packet. """
             # The free out will take effect immediately.
             # The next fetch packet will be fetched to stage DP later on.
             if fp_in_dp.is_all_dispatched():
-                behavior_append(pipeline_tracer, (PipelineBehavior.FP_DISPATCH_FINISH, fp_in_dp.fp_id))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.FP_DISPATCH_FINISH, fp_in_dp.fp_id))
                 fp_in_dp = None
 
             """ Check if multi-cycle NOPs stall happens. """
             inst_id, _, cycle = ep_in_dc.multi_cycle_nop
             if inst_id is not None:
-                behavior_append(pipeline_tracer, (PipelineBehavior.MULTI_CYCLE_NOP_STALL, ep_in_dc.ep_id, inst_id, cycle))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.MULTI_CYCLE_NOP_STALL, ep_in_dc.ep_id, inst_id, cycle))
                 """ Assigning to next_stage_multi_cycle_nop instead of multi_cycle_nop first ensures that 
                 stall will not take effect until the next cycle. """
                 next_stage_multi_cycle_nop = cycle
@@ -226,8 +235,9 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
                         """ The inst-miss is checked before this. So this finishing can take effect immediately. """
                         sp_loop_extra_cycles = sp_simulator.finish()
                         sp_looping = False
-                        behavior_append(pipeline_tracer, (PipelineBehavior.SPLOOP_FINISH, ep_in_dc.ep_id,
-                                                          sp_simulator.dynlen, sp_simulator.ii, sp_simulator.max_iter, sp_loop_extra_cycles))
+                        if log:
+                            pipeline_tracer.append((PipelineBehavior.SPLOOP_FINISH, ep_in_dc.ep_id,
+                                                    sp_simulator.dynlen, sp_simulator.ii, sp_simulator.max_iter, sp_loop_extra_cycles))
                         break
                 else:
                     """ SOLoop not finished. """
@@ -252,20 +262,23 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
             " PR -> DP "
             fp_in_dp = FPDispatch(fp_in_pr.fp_id, fp_in_pr.eps) if fp_in_pr is not None else None
             if fp_in_pr is not None:
-                behavior_append(pipeline_tracer, (PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_pr.fp_id,
-                                                  PipelineStage.Fetch, PipelineStage.PR, PipelineStage.Decode, PipelineStage.DP))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_pr.fp_id,
+                                            PipelineStage.Fetch, PipelineStage.PR, PipelineStage.Decode, PipelineStage.DP))
 
             " PW -> PR "
             fp_in_pr = fp_in_pw
             if fp_in_pw is not None:
-                behavior_append(pipeline_tracer, (PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_pw.fp_id,
-                                                  PipelineStage.Fetch, PipelineStage.PW, PipelineStage.Fetch, PipelineStage.PR))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_pw.fp_id,
+                                            PipelineStage.Fetch, PipelineStage.PW, PipelineStage.Fetch, PipelineStage.PR))
 
             " PS -> PW "
             fp_in_pw = fp_in_ps
             if fp_in_ps is not None:
-                behavior_append(pipeline_tracer, (PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_ps.fp_id,
-                                                  PipelineStage.Fetch, PipelineStage.PS, PipelineStage.Fetch, PipelineStage.PW))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_ps.fp_id,
+                                            PipelineStage.Fetch, PipelineStage.PS, PipelineStage.Fetch, PipelineStage.PW))
 
                 """ A memory access happens in stage PW, so a program memory stall may happen. """
                 # inst_penalty <= 0 means memory stalls never happen.
@@ -274,31 +287,36 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
                     if fps_is_line_head[fp_id]:
                         block_to_fetch: MemoryBlock = fps_line_addr[fp_id]
                         if block_to_fetch not in hit_blocks:
-                            behavior_append(pipeline_tracer, (PipelineBehavior.INST_CACHE_MISS_STALL, fp_id,
-                                                              inst_cache_config.penalty, current_cycle + 1,
-                                                              current_cycle + inst_cache_config.penalty))
+                            if log:
+                                pipeline_tracer.append((PipelineBehavior.INST_CACHE_MISS_STALL, fp_id,
+                                                        inst_cache_config.penalty, current_cycle + 1,
+                                                        current_cycle + inst_cache_config.penalty))
                             # Choose the longest stall.
                             next_stage_penalty = max(next_stage_penalty, inst_cache_config.penalty)
 
             " PG -> PS "
             fp_in_ps = fp_in_pg
             if fp_in_pg is not None:
-                behavior_append(pipeline_tracer, (PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_pg.fp_id,
-                                                  PipelineStage.Fetch, PipelineStage.PG, PipelineStage.Fetch, PipelineStage.PS))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.FP_TO_NEXT_STAGE, fp_in_pg.fp_id,
+                                            PipelineStage.Fetch, PipelineStage.PG, PipelineStage.Fetch, PipelineStage.PS))
 
             " PG get next fetch packet "
             if next_fp_idx == num_fp:
                 fp_in_pg = None  # All fetch packets have been moved to pipeline.
             else:
                 fp_in_pg = fps[next_fp_idx]
-                behavior_append(pipeline_tracer, (PipelineBehavior.PG_NEW_FP_FETCH, fp_in_pg.fp_id))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.PG_NEW_FP_FETCH, fp_in_pg.fp_id))
                 next_fp_idx += 1
                 if next_fp_idx == num_fp:
-                    behavior_append(pipeline_tracer, (PipelineBehavior.FP_FETCH_FINISH,))
+                    if log:
+                        pipeline_tracer.append((PipelineBehavior.FP_FETCH_FINISH,))
         else:
             # If current fetch packet is the last one, then no pipeline stall happens.
             if fp_in_pr is not None:
-                behavior_append(pipeline_tracer, (PipelineBehavior.PIPELINE_STALL, fp_in_dp.fp_id))
+                if log:
+                    pipeline_tracer.append((PipelineBehavior.PIPELINE_STALL, fp_in_dp.fp_id))
 
         """
         -------------------------------------------------------------------------------- 
@@ -333,7 +351,7 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
                                                headers=["E{}".format(i) for i in range(1, 11)],
                                                tablefmt='psql')
 
-            behavior_append(pipeline_tracer, (PipelineBehavior.PIPELINE_STATUS, "\n".join([status_fetch_decode, status_execute])))
+            pipeline_tracer.append((PipelineBehavior.PIPELINE_STATUS, "\n".join([status_fetch_decode, status_execute])))
 
         """ Check if the execution of this block finishes. """
         fetch_free = fp_in_pg is None and fp_in_ps is None and fp_in_pw is None and fp_in_pr is None
@@ -346,5 +364,6 @@ def do_pipeline_simulation_in_block(block_id, fps: Sequence[FPInPipeline], fps_i
     current_cycle += sp_loop_extra_cycles  # Extra cycles due to SPLoop is added at the end of current block simulation.
     current_cycle += hazard_extra_cycles  # Extra cycles due to use-after-load hazard is added at the end of current block simulation.
     overlap_cycle = cpu_cycle -len(all_eps) - total_multi_cycle_nop
-    behavior_append(pipeline_tracer, (PipelineBehavior.DO_PIPELINE_SIMULATION_FINISH, block_id))
+    if log:
+        pipeline_tracer.append((PipelineBehavior.DO_PIPELINE_SIMULATION_FINISH, block_id))
     return current_cycle, overlap_cycle, pipeline_tracer
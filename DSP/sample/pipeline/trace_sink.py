@@ -0,0 +1,133 @@
+"""Streaming storage of pipeline traces.
+
+- TraceSink appends the trace of each block to a single JSON-lines file as soon as it is written,
+  one line per block, and keeps the offset of every line. The index of block offsets is written
+  next to the trace file when the sink is closed, and an index left by an earlier run is removed
+  when the sink is opened.
+- TraceReader extracts the trace of one block on demand. If the index is missing (e.g. the analysis
+  was interrupted), it is rebuilt by scanning the trace file.
+
+A single block can be extracted as YAML, in the format of PipelineTracer.dump, by
+    python -m sample.pipeline.trace_sink traces.jsonl BLOCK_ID [-o block.yaml]
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Tuple, List, Optional
+
+import yaml
+
+from sample.pipeline.tracer import PipelineTracer
+
+
+def index_path_of(trace_path: str) -> str:
+    return trace_path + ".index.json"
+
+
+class TraceSink:
+    """ Append-only JSON-lines file of pipeline traces with an index of block offsets. """
+
+    def __init__(self, trace_path: str):
+        self.__trace_path = trace_path
+        # An index left by an earlier run no longer matches the new trace file, it is written again on close.
+        if os.path.isfile(index_path_of(trace_path)):
+            os.remove(index_path_of(trace_path))
+        self.__file = open(trace_path, "wb")
+        # block id -> (offset, length) of its line.
+        self.__index: Dict[int, Tuple[int, int]] = dict()
+
+    @property
+    def trace_path(self):
+        return self.__trace_path
+
+    @property
+    def index(self):
+        return self.__index
+
+    def write(self, block_id: int, tracer: PipelineTracer):
+        """ The block ID in the trace is block_id, the tracer may be shared by blocks with the same simulation. """
+        if block_id in self.__index:
+            raise RuntimeError("Repeated trace of block {}.".format(block_id))
+        data = tracer.to_dict()
+        data["Block ID"] = block_id
+        line = (json.dumps(data, separators=(",", ":")) + "\n").encode("utf-8")
+        self.__index[block_id] = (self.__file.tell(), len(line))
+        self.__file.write(line)
+
+    def close(self):
+        if self.__file.closed:
+            return
+        self.__file.close()
+        # The index appears only when complete, a reader never sees a partial one.
+        index_path = index_path_of(self.__trace_path)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({str(block_id): [offset, length] for block_id, (offset, length) in sorted(self.__index.items())}, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TraceReader:
+    """ Random access to the traces written by TraceSink. """
+
+    def __init__(self, trace_path: str):
+        self.__trace_path = trace_path
+        index_path = index_path_of(trace_path)
+        if os.path.isfile(index_path):
+            with open(index_path) as f:
+                self.__index: Dict[int, Tuple[int, int]] = {int(block_id): (offset, length)
+                                                            for block_id, (offset, length) in json.load(f).items()}
+        else:
+            self.__index = self.__scan()
+
+    def __scan(self) -> Dict[int, Tuple[int, int]]:
+        index = dict()
+        offset = 0
+        with open(self.__trace_path, "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):  # An unfinished line is dropped.
+                    index[json.loads(line)["Block ID"]] = (offset, len(line))
+                offset += len(line)
+        return index
+
+    @property
+    def block_ids(self) -> List[int]:
+        return sorted(self.__index.keys())
+
+    def read(self, block_id: int) -> Dict:
+        """ The trace of the block, in the structure of PipelineTracer.to_dict. JSON keys of packets and cycles are strings. """
+        try:
+            offset, length = self.__index[block_id]
+        except KeyError:
+            raise KeyError("No trace of block {} in {}.".format(block_id, self.__trace_path))
+        with open(self.__trace_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Extract the pipeline trace of one block as YAML.")
+    parser.add_argument("trace", help="The trace file written by --tracer.")
+    parser.add_argument("block", type=int, nargs="?", help="The block ID. If not given, list the blocks in the trace.")
+    parser.add_argument("-o", dest="output", required=False, help="The YAML file to write, stdout if not given.")
+    args = parser.parse_args(argv)
+
+    reader = TraceReader(args.trace)
+    if args.block is None:
+        print(" ".join(str(block_id) for block_id in reader.block_ids))
+        return
+    data = reader.read(args.block)
+    if args.output is None:
+        yaml.dump(data, sys.stdout, default_flow_style=False, sort_keys=False)
+    else:
+        with open(args.output, "w") as f:
+            yaml.dump(data, f, default_flow_style=False, sort_keys=False)
+
+
+if __name__ == "__main__":
+    main()
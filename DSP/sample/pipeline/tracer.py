@@ -1,17 +1,85 @@
-from typing import List, Tuple, Optional, Dict
+from array import array
+from typing import List, Tuple, Optional, Dict, Union
 import yaml
 from sample.pipeline.behaviors import default_pipeline_behavior_translation, PipelineBehavior
+from sample.pipeline.constants import PipelineStage
+
+""" 
+Behaviors are stored in a columnar event buffer, one row per behavior: (cycle, event code, packet id, aux).
+How aux is used depends on the layout of the behavior.
+"""
+LAYOUT_CYCLE = 0  # (code, cycle). A new pipeline cycle, packet and aux are unused.
+LAYOUT_NONE = 1  # (code, )
+LAYOUT_PACKET = 2  # (code, packet)
+LAYOUT_DISPATCH = 3  # (code, fp_id, ep_id). packet is the EP and aux is the FP.
+LAYOUT_MOVE = 4  # (code, packet, last_stage, last_details, this_stage, this_details). aux encodes the two stages.
+LAYOUT_FINISH = 5  # (code, packet, stage, details). aux encodes the stage.
+LAYOUT_PAYLOAD = 6  # (code, packet, *payload). aux indexes the payload tuple.
+LAYOUT_EVENT = 7  # (code, *payload). aux indexes the payload tuple, packet is unused.
+
+BEHAVIOR_LAYOUT: Dict[PipelineBehavior, int] = {
+    PipelineBehavior.NEW_PIPELINE_CYCLE: LAYOUT_CYCLE,
+    PipelineBehavior.PG_NEW_FP_FETCH: LAYOUT_PACKET,
+    PipelineBehavior.FP_TO_NEXT_STAGE: LAYOUT_MOVE,
+    PipelineBehavior.DC_NEW_EP_DISPATCH: LAYOUT_DISPATCH,
+    PipelineBehavior.EP_TO_NEXT_STAGE: LAYOUT_MOVE,
+    PipelineBehavior.FP_FETCH_FINISH: LAYOUT_NONE,
+    PipelineBehavior.FP_DISPATCH_FINISH: LAYOUT_PACKET,
+    PipelineBehavior.EP_EXECUTE_FINISH: LAYOUT_FINISH,
+    PipelineBehavior.PIPELINE_STALL: LAYOUT_PACKET,
+    PipelineBehavior.MULTI_CYCLE_NOP_STALL: LAYOUT_PAYLOAD,
+    PipelineBehavior.INST_CACHE_MISS_STALL: LAYOUT_PAYLOAD,
+    PipelineBehavior.DATA_CACHE_MISS_STALL: LAYOUT_PAYLOAD,
+    PipelineBehavior.SPLOOP_FINISH: LAYOUT_PAYLOAD,
+    PipelineBehavior.SPECIAL_EVENT: LAYOUT_EVENT,
+}
+
+# The packet id of EP_WITH_SINGLE_NOP.
+NOP_PACKET_ID = -1
+# A stage is encoded as stage * STAGE_BASE + details, details of PipelineStage are shifted by EXECUTE_DETAILS_LIMIT.
+STAGE_BASE = 64
+EXECUTE_DETAILS_LIMIT = 32
+
+
+def encode_packet_id(packet_id: Union[int, str]) -> int:
+    return NOP_PACKET_ID if packet_id == "nop" else packet_id
+
+
+def decode_packet_id(packet_id: int) -> Union[int, str]:
+    return "nop" if packet_id == NOP_PACKET_ID else packet_id
+
+
+def encode_stage(stage: PipelineStage, details: Union[PipelineStage, int]) -> int:
+    if isinstance(details, PipelineStage):
+        return stage.value * STAGE_BASE + EXECUTE_DETAILS_LIMIT + details.value
+    if not 0 <= details < EXECUTE_DETAILS_LIMIT:
+        raise ValueError("Unexpected stage details {}.".format(details))
+    return stage.value * STAGE_BASE + details
+
+
+def decode_stage(code: int) -> Tuple[PipelineStage, Union[PipelineStage, int]]:
+    stage, details = divmod(code, STAGE_BASE)
+    if details >= EXECUTE_DETAILS_LIMIT:
+        return PipelineStage(stage), PipelineStage(details - EXECUTE_DETAILS_LIMIT)
+    return PipelineStage(stage), details
 
 
 class PipelineTracer:
     def __init__(self):
         """ """
-        self.__current_cycle: int = 0
+        self.__current_cycle: Union[int, float] = 0
 
         """ Basic """
         self.__block_id: Optional[int] = None
-        # Records the behavior of the pipeline at each execution cycle.
-        self.__behavior_by_cycle: Dict[int, List[Tuple]] = dict()
+        # Columnar event buffer of the behaviors of the pipeline at each execution cycle.
+        self.__cycles = array('d')
+        self.__codes = array('b')
+        self.__packets = array('q')
+        self.__aux = array('q')
+        # Payloads of behaviors in LAYOUT_PAYLOAD and LAYOUT_EVENT.
+        self.__payloads: List[Tuple] = list()
+        # Cycles start as int and turn into float after a stall of float penalty, the row of the first float cycle.
+        self.__first_float_row: Optional[int] = None
 
         """ Overview of CPU cycles. """
         self.__cycle_total: int = 0
@@ -44,8 +112,78 @@ class PipelineTracer:
         return self.__block_id
 
     @property
-    def behaviors(self):
-        return self.__behavior_by_cycle
+    def behaviors(self) -> Dict[Union[int, float], List[Tuple]]:
+        """ The behaviors of each execution cycle, rebuilt from the event buffer. """
+        behavior_by_cycle: Dict[Union[int, float], List[Tuple]] = dict()
+        current: Optional[List[Tuple]] = None
+        for behavior in self.iter_behaviors():
+            if behavior[0] == PipelineBehavior.NEW_PIPELINE_CYCLE:
+                current = behavior_by_cycle[behavior[1]] = list()
+            else:
+                current.append(behavior)
+        return behavior_by_cycle
+
+    @property
+    def event_columns(self) -> Tuple[array, array, array, array]:
+        """ (cycle, event code, packet id, aux) of the event buffer. """
+        return self.__cycles, self.__codes, self.__packets, self.__aux
+
+    def __len__(self):
+        return len(self.__codes)
+
+    def iter_behaviors(self):
+        """ Yields the recorded behaviors in order as tuples, each cycle starts with NEW_PIPELINE_CYCLE. """
+        payloads = self.__payloads
+        first_float_row = self.__first_float_row if self.__first_float_row is not None else len(self.__codes)
+        for row, (cycle, value, packet, aux) in enumerate(zip(self.__cycles, self.__codes, self.__packets, self.__aux)):
+            code = PipelineBehavior(value)
+            layout = BEHAVIOR_LAYOUT[code]
+            if layout == LAYOUT_CYCLE:
+                yield code, cycle if row >= first_float_row else int(cycle)
+            elif layout == LAYOUT_NONE:
+                yield code,
+            elif layout == LAYOUT_PACKET:
+                yield code, decode_packet_id(packet)
+            elif layout == LAYOUT_DISPATCH:
+                yield code, aux, decode_packet_id(packet)
+            elif layout == LAYOUT_MOVE:
+                last_code, this_code = divmod(aux, STAGE_BASE * STAGE_BASE)
+                yield (code, decode_packet_id(packet)) + decode_stage(last_code) + decode_stage(this_code)
+            elif layout == LAYOUT_FINISH:
+                yield (code, decode_packet_id(packet)) + decode_stage(aux)
+            elif layout == LAYOUT_PAYLOAD:
+                yield (code, decode_packet_id(packet)) + payloads[aux]
+            else:
+                yield (code, ) + payloads[aux]
+
+    def __record(self, behavior: tuple):
+        """ Append a behavior to the event buffer. """
+        code: PipelineBehavior = behavior[0]
+        layout = BEHAVIOR_LAYOUT[code]
+        packet, aux = 0, 0
+        if layout == LAYOUT_CYCLE:
+            if isinstance(self.__current_cycle, float) and self.__first_float_row is None:
+                self.__first_float_row = len(self.__codes)
+        elif layout == LAYOUT_PACKET:
+            packet = behavior[1]
+        elif layout == LAYOUT_DISPATCH:
+            aux, packet = behavior[1], behavior[2]
+        elif layout == LAYOUT_MOVE:
+            _, packet, s1, d1, s2, d2 = behavior
+            aux = encode_stage(s1, d1) * STAGE_BASE * STAGE_BASE + encode_stage(s2, d2)
+        elif layout == LAYOUT_FINISH:
+            _, packet, stage, details = behavior
+            aux = encode_stage(stage, details)
+        elif layout == LAYOUT_PAYLOAD:
+            packet, aux = behavior[1], len(self.__payloads)
+            self.__payloads.append(behavior[2:])
+        elif layout == LAYOUT_EVENT:
+            aux = len(self.__payloads)
+            self.__payloads.append(behavior[1:])
+        self.__cycles.append(self.__current_cycle)
+        self.__codes.append(code.value)
+        self.__packets.append(encode_packet_id(packet))
+        self.__aux.append(aux)
 
     @property
     def cycle_total(self):
@@ -107,10 +245,10 @@ class PipelineTracer:
     def __new_pipeline_cycle(self, behavior: tuple):
         _, cycle = behavior
 
-        self.__current_cycle = cycle
-        if self.__current_cycle in self.__behavior_by_cycle:
+        if cycle <= self.__current_cycle:
             raise RuntimeError("Repeated execution cycle.")
-        self.__behavior_by_cycle[self.__current_cycle] = list()
+        self.__current_cycle = cycle
+        self.__record(behavior)
         self.__cycle_total += 1
         self.__cycle_cpu += 1
 
@@ -124,19 +262,19 @@ class PipelineTracer:
     def __pg_new_fp_fetch(self, behavior: tuple):
         _, fp_id = behavior
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
         if fp_id in self.__fp_cycle_point:
             raise RuntimeError("Repeated fetch packet.")
         self.__fp_cycle_point[fp_id] = {"in": self.__current_cycle, "finish": None}
 
     def __fp_to_next_stage(self, behavior: tuple):
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def __dc_new_ep_dispatch(self, behavior: tuple):
         _, _, ep_id = behavior
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
         if ep_id == "nop":
             return
         if ep_id in self.__ep_cycle_point:
@@ -145,16 +283,16 @@ class PipelineTracer:
 
     def __ep_to_next_stage(self, behavior: tuple):
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def __fp_fetch_finish(self, behavior: tuple):
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def __fp_dispatch_finish(self, behavior: tuple):
         _, fp_id = behavior
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
         try:
             self.__fp_cycle_point[fp_id]["finish"] = self.__current_cycle
         except KeyError:
@@ -163,7 +301,7 @@ class PipelineTracer:
     def __ep_execute_finish(self, behavior: tuple):
         _, ep_id, _, _ = behavior
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
         if ep_id == "nop":
             return
         try:
@@ -173,18 +311,18 @@ class PipelineTracer:
 
     def __pipeline_stall(self, behavior: tuple):
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def __multi_cycle_nop_stall(self, behavior: tuple):
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def __inst_cache_miss_stall(self, behavior: tuple):
         _, fp_id, penalty, begin_cycle, end_cycle = behavior
 
         if not penalty == end_cycle - begin_cycle + 1:
             raise RuntimeError("Penalty does not match the cycle.")
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
         self.__cycle_inst_stall += penalty
         self.__inst_miss_time += 1
         self.__inst_stall_detail.append((fp_id, begin_cycle, end_cycle))
@@ -194,7 +332,7 @@ class PipelineTracer:
 
         if not penalty == end_cycle - begin_cycle + 1:
             raise RuntimeError("Penalty does not match the cycle.")
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
         self.__cycle_data_stall += penalty
         self.__data_miss_time += 1
         self.__data_stall_detail.append((ep_id, inst_id, begin_cycle, end_cycle))
@@ -207,14 +345,14 @@ class PipelineTracer:
 
         self.__extra_sp_cycle = extra_cycle
         self.__cycle_total += extra_cycle
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def __pipeline_status(self, behavior: tuple):
         pass
 
     def __special_event(self, behavior: tuple):
 
-        self.__behavior_by_cycle[self.__current_cycle].append(behavior)
+        self.__record(behavior)
 
     def append(self, behavior: tuple):
         code: PipelineBehavior = behavior[0]
@@ -266,15 +404,10 @@ class PipelineTracer:
         elif code == PipelineBehavior.SPECIAL_EVENT:
             self.__special_event(behavior)
 
-    def dump(self, output_dir: str,
-             behaviors: bool = True, cpu_overview: bool = True, cache_miss_overview: bool = True,
-             packet_point: bool = True, stall_detail: bool = True):
-
+    def to_dict(self, behaviors: bool = True, cpu_overview: bool = True, cache_miss_overview: bool = True,
+                packet_point: bool = True, stall_detail: bool = True) -> Dict:
+        """ The contents of dump. """
         data = dict()
-        # Check if output_dir is a valid file path.
-        with open(output_dir, "w") as f:
-            pass
-
         data["Block ID"] = self.__block_id
         if cpu_overview:
             data["Cycle overview"] = {
@@ -295,7 +428,29 @@ class PipelineTracer:
                                           for fp_id, inst_id, sc, fc in self.__data_stall_detail]
         if behaviors:
             data["Behaviors"] = {c: [default_pipeline_behavior_translation(behavior) for behavior in behaviors]
-                                 for c, behaviors in self.__behavior_by_cycle.items()}
+                                 for c, behaviors in self.behaviors.items()}
+        return data
+
+    def dump(self, output_dir: str,
+             behaviors: bool = True, cpu_overview: bool = True, cache_miss_overview: bool = True,
+             packet_point: bool = True, stall_detail: bool = True):
+
+        # Check if output_dir is a valid file path.
+        with open(output_dir, "w") as f:
+            pass
+
+        data = self.to_dict(behaviors=behaviors, cpu_overview=cpu_overview, cache_miss_overview=cache_miss_overview,
+                            packet_point=packet_point, stall_detail=stall_detail)
 
         with open(output_dir, "w") as f:
             yaml.dump(data, f, default_flow_style=False, sort_keys=False, encoding='utf-8')
+
+
+class NullPipelineTracer(PipelineTracer):
+    """ A tracer which records nothing, returned by pipeline simulations without log. """
+
+    def append(self, behavior: tuple):
+        pass
+
+
+NULL_TRACER = NullPipelineTracer()
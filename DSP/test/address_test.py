@@ -0,0 +1,106 @@
+import common
+
+import contextlib
+import io
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Dict, Hashable, List
+
+from sample.isa.stream_proc import ASMFileReader
+from sample.isa.isa_syntax import Instruction
+from sample.cache.cache_cfg import CacheCFG
+from sample.cache.address import Address_analyser
+from sample.cache.constants import MemoryModel
+
+""" The memoized expansion in Address_analyser must give the same memory blocks as the plain one. """
+
+
+class SyntheticCacheCFG:
+    """ The part of CacheCFG read by Address_analyser: straight-line nodes outside loops with given paths. """
+
+    def __init__(self, nodes: List[List[Instruction]], paths: List[List[List[int]]]):
+        self.nodes = nodes
+        self.paths = paths
+
+    @property
+    def node_idents(self) -> List[Hashable]:
+        return list(range(len(self.nodes)))
+
+    def get_node(self, node_id: int):
+        return SimpleNamespace(insts=self.nodes[node_id])
+
+    def get_node_map_loop(self, node_id: int):
+        return []
+
+    def get_all_paths_node(self, node_id: int) -> List[List[int]]:
+        return self.paths[node_id]
+
+
+""" Synthetic programs: every expansion along every path, and the whole analysis. The expansion log is dropped. """
+
+SEEDS = 20
+
+with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+    expansions, blocks, hits, misses = 0, 0, 0, 0
+    for seed in range(SEEDS):
+        asm_file, nodes = common.synthetic_program(directory, seed)
+        prefix = asm_file[:-len(".asm")]
+        paths = common.synthetic_paths(random.Random(seed), len(nodes))
+        cache_cfg = SyntheticCacheCFG(nodes, paths)
+
+        results: Dict[bool, Dict] = dict()
+        analysers: Dict[bool, Address_analyser] = dict()
+        for memoize in (False, True):
+            analysers[memoize] = Address_analyser(asm_file, prefix + ".slist", None, common.data_cache_config,
+                                                  cache_cfg, MemoryModel.LARGE_MEMORY_MODEL, memoize=memoize)
+            results[memoize] = analysers[memoize].do_address_analysis()
+        assert results[False] == results[True], seed
+        # Each analysis starts with an empty expansion cache: a second one repeats the hits and misses of the first.
+        stats = analysers[True].expansion_cache_stats
+        assert analysers[True].do_address_analysis() == results[True], seed
+        assert analysers[True].expansion_cache_stats == stats, seed
+        blocks += sum(len(inst_blocks) for refs in results[True].values() for inst_blocks in refs.values())
+
+        for node_paths in paths:
+            for path in node_paths:
+                for inst in nodes[path[0]]:
+                    if not inst.is_memory_access:
+                        continue
+                    exprs = list()
+                    for memoize in (False, True):
+                        considered_insts, positions = analysers[memoize].considered_insts(path, inst)
+                        exprs.append(analysers[memoize].expansion(inst, considered_insts, positions=positions))
+                    assert exprs[0].eq(exprs[1]), (seed, path, inst)
+                    expansions += 1
+        hits, misses = hits + analysers[True].expansion_cache_stats[0], misses + analysers[True].expansion_cache_stats[1]
+print("Synthetic: %d programs, %d memory blocks, %d expansions, hits %d, misses %d"
+      % (SEEDS, blocks, expansions, hits, misses))
+
+
+""" Benchmarks under tests/inputs. """
+
+for test_case in common.available_cases():
+    print(test_case)
+    analyser = common.build_analyser(test_case, global_analysis=False)
+    _analysis_file = common.analysis_file(test_case)
+    prefix = _analysis_file[:-len(".asm")]
+
+    reader = ASMFileReader(_analysis_file)
+    cache_cfg = CacheCFG(sorted([Instruction(inst) for inst in reader.instructions], key=lambda x: x.address))
+    cache_cfg.read_from_front_end(analyser.prog, analyser.loop_hierarchy)
+
+    results = dict()
+    for memoize in (False, True):
+        address_analyser = Address_analyser(_analysis_file, "%s.slist" % prefix, analyser.prog,
+                                            common.data_cache_config, cache_cfg, MemoryModel.SMALL_MEMORY_MODEL,
+                                            memoize=memoize)
+        start_time = time.time()
+        results[memoize] = address_analyser.do_address_analysis()
+        print("memoize=%s: %.6f s" % (memoize, time.time() - start_time))
+
+    assert results[False].keys() == results[True].keys()
+    for node_id, refs in results[False].items():
+        assert refs == results[True][node_id], node_id
+    print("Hits %d, misses %d" % address_analyser.expansion_cache_stats)
@@ -1,6 +1,7 @@
 import os
 os.chdir("..")
 
+import argparse
 import warnings
 import time
 from typing import Tuple, Sequence, Hashable, Optional, List, Dict
@@ -10,6 +11,7 @@ from sample.analyser import WCETAnalyser, TCFGNode, Prog
 from sample.cache.cache_config import CacheConfig, read_cache_config_from_json
 from sample.ilp.ilp import ILPModel, MPS, LPSolve, ILPException
 from sample.ilp.inf_path import InfPath
+from sample.ilp.solver import LPSolveBackend
 from sample.frontend.critical_cfg import CriticalCfg
 from sample.cache.constants import MemoryModel
 
@@ -43,6 +45,11 @@ test_cases = [
     ("tests/inputs/main/lms", 191465),
 ]
 
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument('--jobs', dest='jobs', type=int, default=1,
+                        help="The number of processes checking the SMT models of loop paths.")
+args = arg_parser.parse_args()
+
 for test_case, res in test_cases:
     print(test_case)
     f = test_case.split("/")[-1]
@@ -90,18 +97,17 @@ for test_case, res in test_cases:
                          data_cache_config,
                          loop_cons_file=_loop_cons_dir,
                          pred_cycle=analyser.cycle_constrain)
-    lp_str = ilp_model.gen_ilp_model()
-    
-    with open("%s.lp" % prefix, "w", encoding="UTF-8") as f:
-        f.write(lp_str)
-    infpath = InfPath(analyser.loop_hierarchy, "%s.lp" % prefix)
+    linear_model = ilp_model.gen_linear_model()
+
+    infpath = InfPath(analyser.loop_hierarchy, linear_model,
+                      solver=LPSolveBackend(lp_file="%s.lp" % prefix), lp_file="%s.lp" % prefix,
+                      jobs=args.jobs)
     infpath.iterative_solve()
-    lp_solve = LPSolve("%s.lp" % prefix)
-    elapse_time = lp_solve.solve()
+    result = infpath.result
     
-    assert lp_solve.is_bound
+    assert result.is_bound
     end_time = time.time()
     elapsed_time = end_time - start_time
-    print("Result %d" % int(float(lp_solve.obj_max_val)))
+    print("Result %d" % int(float(result.obj_max_val)))
     print(f"Elapsed_time: {elapsed_time:.6f} s")
 
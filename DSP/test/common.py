@@ -0,0 +1,200 @@
+import os
+import sys
+
+# The test scripts run from the DSP directory, wherever they are started.
+DSP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(DSP_DIR)
+if DSP_DIR not in sys.path:
+    sys.path.insert(0, DSP_DIR)
+
+import random
+from typing import List, Optional, Tuple
+
+from sample.analyser import WCETAnalyser
+from sample.isa.stream_proc import ASMFileReader
+from sample.isa.isa_syntax import Instruction
+from sample.cache.cache_config import CacheConfig
+from sample.cache.constants import MemoryModel
+
+""" Shared by the test scripts: the benchmark programs under tests/inputs with the analyser setup of the scripts,
+and small synthetic programs for the checks which do not need the benchmarks. """
+
+test_cases = [
+    "tests/inputs/main/adpcm",
+    "tests/inputs/main/bs",
+    "tests/inputs/main/bsort100",
+    "tests/inputs/main/insertsort",
+    "tests/inputs/main/edn",
+    "tests/inputs/main/expint",
+    "tests/inputs/main/fir",
+    "tests/inputs/main/jfdctint",
+    "tests/inputs/main/matmult",
+    "tests/inputs/main/cnt",
+    "tests/inputs/main/lms",
+    "tests/inputs/fcall/bsort100",
+    "tests/inputs/fcall/dijkstra",
+    "tests/inputs/fcall/edn",
+    "tests/inputs/fcall/fdct",
+    "tests/inputs/fcall/fibcall",
+    "tests/inputs/fcall/fir",
+    "tests/inputs/fcall/floyd",
+    "tests/inputs/fcall/matmult",
+    "tests/inputs/fcall/ns",
+    "tests/inputs/fcall/expint",
+    "tests/inputs/fcall/sqrt",
+    "tests/inputs/fcall/qurt",
+    "tests/inputs/fcall/ndes",
+    "tests/inputs/fcall/ludcmp",
+    "tests/inputs/fcall/duff",
+    "tests/inputs/fcall/nsichneu",
+]
+
+inst_cache_config = CacheConfig(capacity_size=32768, associativity=1, line_size=32, penalty=12.5)
+data_cache_config = CacheConfig(capacity_size=32768, associativity=2, line_size=64, penalty=6)
+
+
+def analysis_file(test_case: str) -> str:
+    return "%s/%s.asm" % (test_case, test_case.split("/")[-1])
+
+
+def available_cases() -> List[str]:
+    """ The test cases whose inputs exist, the others are reported and skipped. """
+    cases = list()
+    for test_case in test_cases:
+        if os.path.isfile(analysis_file(test_case)):
+            cases.append(test_case)
+        else:
+            print("%s: no inputs, skipped" % test_case)
+    return cases
+
+
+def build_analyser(test_case: str, global_analysis: bool = True, **kwargs) -> WCETAnalyser:
+    """ The analyser of a test case after the front end analysis, and after the global cache and SPLoop analyses
+    if global_analysis is set. kwargs are passed to WCETAnalyser. """
+    prefix = "%s/%s" % (test_case, test_case.split("/")[-1])
+    analyser = WCETAnalyser(analysis_file(test_case), inst_cache_config, data_cache_config,
+                            jump_table_dir=r"./tests/inputs/jtable/v7.json",
+                            cons_dir="%s/loop_cons.json" % test_case,
+                            memory_model=MemoryModel.SMALL_MEMORY_MODEL,
+                            dline_dir="%s.dline" % prefix,
+                            slist_dir="%s.slist" % prefix,
+                            start_name="main",
+                            **kwargs)
+    analyser.frontend_analysis()
+    if global_analysis:
+        analyser.inst_cache_analysis_global()
+        analyser.data_cache_analysis_global()
+        analyser.sp_loop_analysis_global()
+    return analyser
+
+
+""" Synthetic programs. """
+
+STACK_ADDR, STACK_SIZE = 0x8000, 0x400
+ARRAY_ADDR, ARRAY_SIZE = 0x100, 0x100
+SYNTHETIC_REGS = ["A4", "A5", "A6", "B4", "B5", "B15"]
+
+
+def synthetic_instruction(rng: random.Random, address: int) -> str:
+    a, b, c = rng.choice(SYNTHETIC_REGS), rng.choice(SYNTHETIC_REGS), rng.choice(SYNTHETIC_REGS[:-1])
+    text = rng.choice([
+        "ADD.L1 %s,%s,%s" % (a, b, c),
+        "SUB.L1 %s,%s,%s" % (a, b, c),
+        "MV.L1 %s,%s" % (a, c),
+        "MVK.S1 %d,%s" % (rng.randrange(ARRAY_ADDR + ARRAY_SIZE), c),
+        "LDW.D1T1 *+%s(%d),%s" % (a, 4 * rng.randrange(4), c),
+        "STW.D1T1 %s,*+%s(%d)" % (c, a, 4 * rng.randrange(4)),
+    ])
+    return "%08x %08x   %s\n" % (address, 0, text)
+
+
+def synthetic_program(directory: str, seed: int, node_num: int = 8, start_addr: int = 0x1000) \
+        -> Tuple[str, List[List[Instruction]]]:
+    """
+    Write a program of node_num straight-line nodes of random moves, arithmetic, loads and stores to directory,
+    with the .dline and .slist files next to it (a stack section and one global array).
+    Return the path of the .asm file and the instructions of each node.
+    """
+    rng = random.Random(seed)
+    sizes = [rng.randrange(2, 7) for _ in range(node_num)]
+    prefix = os.path.join(directory, "synthetic%d" % seed)
+    with open(prefix + ".asm", "w") as f:
+        f.writelines(synthetic_instruction(rng, start_addr + 4 * i) for i in range(sum(sizes)))
+    synthetic_sections(prefix)
+
+    instructions = [Instruction(inst) for inst in ASMFileReader(prefix + ".asm").instructions]
+    nodes, start = list(), 0
+    for size in sizes:
+        nodes.append(instructions[start:start + size])
+        start += size
+    return prefix + ".asm", nodes
+
+
+def synthetic_sections(prefix: str):
+    """ The .dline and .slist files of a synthetic program: a stack section and one global array. """
+    with open(prefix + ".dline", "w") as f:
+        f.write("Section Information\n\n\n\n\n")
+        f.write("  1  .stack  0x%08x  0x%08x  0x%08x  8  Y\n\n" % (STACK_ADDR, STACK_ADDR, STACK_SIZE))
+    with open(prefix + ".slist", "w") as f:
+        f.write("Symbol table\n\n Num | Value | Size | Bind | Type | Vis | Ndx | Name\n")
+        f.write("[1] | 0x%08x | %d | GLOBAL | OBJECT | DEFAULT | 1 | array\n" % (ARRAY_ADDR, ARRAY_SIZE))
+
+
+def synthetic_disassembly(directory: str, seed: int, diamonds: int = 4, start_addr: int = 0x1000) -> str:
+    """
+    Write a whole program in the disassembly format read by the front end to directory, with the .dline and .slist
+    files next to it: main is a chain of diamonds (a conditional branch to an else body, a then body branching to
+    the join) of random straight-line bodies, and _c_int00 sets up the stack and global pointers.
+    Return the path of the .asm file.
+    """
+    rng = random.Random(seed)
+
+    def body() -> List[Tuple[str, Optional[str]]]:
+        return [("", synthetic_instruction(rng, 0).split(None, 2)[2].strip()) for _ in range(rng.randrange(2, 7))]
+
+    # (condition or label, instruction text or None for a label)
+    items = body()
+    for idx in range(diamonds):
+        items += [("[ A1]", "B.S1 ELSE%d" % idx), ("", "NOP 5")] + body() + [("", "B.S1 END%d" % idx), ("", "NOP 5")]
+        items += [("ELSE%d" % idx, None)] + body() + [("END%d" % idx, None)] + body()
+    items += [("", "B.S2 B3"), ("", "NOP 5")]
+    items += [("_c_int00", None), ("", "MVKL.S2 0x%x,B15" % STACK_ADDR), ("", "MVKH.S2 0x0,B15"),
+              ("", "AND.L2 -8,B15,B15"), ("", "MVKL.S2 0x%x,B14" % ARRAY_ADDR), ("", "MVKH.S2 0x0,B14"),
+              ("", "B.S2 B3"), ("", "NOP 5")]
+
+    labels, address = dict(), start_addr
+    for cond, text in items:
+        if text is None:
+            labels[cond] = address
+        else:
+            address += 4
+
+    lines, address = list(), start_addr
+    for cond, text in items:
+        if text is None:
+            name = cond if cond.startswith("_") else "$C$%s" % cond
+            lines.append("%08x %s:\n" % (address, name))
+            continue
+        name, _, operands = text.partition(" ")
+        if operands in labels:
+            target = labels[operands]
+            operands = "$C$%s (PC+%d = 0x%08x)" % (operands, target - (address & ~0x1f), target)
+        # The operands start at column 44, as get_operands of the front end expects.
+        lines.append("%08x   %08x %-10s%-14s%s\n" % (address, 0, cond, name, operands))
+        address += 4
+
+    prefix = os.path.join(directory, "program%d" % seed)
+    with open(prefix + ".asm", "w") as f:
+        f.write("TEXT Section .text (Little Endian), 0x%x bytes at 0x%08x\n" % (address - start_addr, start_addr))
+        f.write("%08x main:\n" % start_addr)
+        f.writelines(lines)
+    synthetic_sections(prefix)
+    return prefix + ".asm"
+
+
+def synthetic_paths(rng: random.Random, node_num: int, paths_per_node: int = 5, max_depth: Optional[int] = 4) \
+        -> List[List[List[int]]]:
+    """ For each node, random distinct-node paths backwards from it, as CacheCFG.get_all_paths_node returns. """
+    return [[[node] + [pred for pred in rng.sample(range(node_num), max_depth) if pred != node]
+             for _ in range(paths_per_node)]
+            for node in range(node_num)]
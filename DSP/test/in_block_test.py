@@ -0,0 +1,113 @@
+import common
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+from sample.analyser import WCETAnalyser, BlockAnalysisResult
+from sample.cache.memory_block import MemoryBlock
+from sample.frontend.isa import Addr
+from sample.pipeline.tracer import PipelineTracer
+
+""" The in-block analysis by a pool of processes must give the same results as the sequential one. """
+
+JOBS = max(2, os.cpu_count() or 1)
+
+
+class StubAnalyser(WCETAnalyser):
+    """ The per-block analysis is replaced by a function of the block ID, which records the cache constraints in the
+    analyser like the real one, so that only the assembly of the results by in_block_analysis is checked. """
+
+    def __init__(self, asm_file: str, nodes, block_num: int):
+        super().__init__(asm_file, common.inst_cache_config, common.data_cache_config)
+        self.insts = [inst for node in nodes for inst in node]
+        # Several contexts of the same basic block share its start address.
+        self.blocks.extend(SimpleNamespace(start_addr=Addr(0x1000 + 0x20 * (idx % 7))) for idx in range(block_num))
+
+    def analyse_block(self, block_id: int, log: Optional[bool] = None,
+                      status_log: Optional[bool] = None) -> BlockAnalysisResult:
+        rng = random.Random(block_id)
+        inst_cache_cons = data_cache_cons = None
+        if rng.random() < 0.5:
+            inst_cache_cons = {MemoryBlock(tag=block_id, set_index=rng.randrange(4)): rng.randrange(3)}
+            self.inst_cache_cons[block_id] = inst_cache_cons
+        if rng.random() < 0.5:
+            data_cache_cons = {inst: rng.randrange(3) for inst in rng.sample(self.insts, 3)}
+            self.data_cache_cons[block_id] = data_cache_cons
+            data_cache_cons = {inst.address: loop_level for inst, loop_level in data_cache_cons.items()}
+        return BlockAnalysisResult(block_id, [rng.randrange(100), rng.randrange(100)], rng.randrange(10),
+                                   [PipelineTracer()] if log else [], inst_cache_cons, data_cache_cons)
+
+
+""" Synthetic blocks: the pool runs first on a fresh analyser, then the sequential analysis on another one. """
+
+BLOCKS = 101
+
+with tempfile.TemporaryDirectory() as directory:
+    asm_file, nodes = common.synthetic_program(directory, 0)
+    for log in (False, True):
+        results = dict()
+        for jobs in (JOBS, 1):
+            analyser = StubAnalyser(asm_file, nodes, BLOCKS)
+            finished = list()
+            behaviors = analyser.in_block_analysis(log=log, jobs=jobs, progress=finished.append)
+            assert sum(finished) == BLOCKS, (jobs, finished)
+            results[jobs] = (dict(analyser.cycle_constrain), list(analyser.overlap_cycle),
+                             dict(analyser.inst_cache_cons), dict(analyser.data_cache_cons),
+                             {block_id: [tracer.to_dict() for tracer in tracers]
+                              for block_id, tracers in behaviors.items()})
+        assert results[1] == results[JOBS], log
+        assert list(results[1][0]) == list(range(BLOCKS))
+print("Synthetic: %d blocks, jobs=%d and jobs=1 agree" % (BLOCKS, JOBS))
+
+
+""" Synthetic programs through the whole analysis: the real analyse_block, on a pool and sequentially. """
+
+with tempfile.TemporaryDirectory() as directory:
+    for seed in range(3):
+        asm_file = common.synthetic_disassembly(directory, seed)
+        prefix = asm_file[:-len(".asm")]
+        for log in (False, True):
+            results = dict()
+            for jobs in (JOBS, 1):
+                analyser = WCETAnalyser(asm_file, common.inst_cache_config, common.data_cache_config,
+                                        dline_dir=prefix + ".dline", slist_dir=prefix + ".slist")
+                # The address analysis prints its expansions.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    analyser.frontend_analysis()
+                    analyser.inst_cache_analysis_global()
+                    analyser.data_cache_analysis_global()
+                    analyser.sp_loop_analysis_global()
+                behaviors = analyser.in_block_analysis(log=log, jobs=jobs)
+                results[jobs] = (dict(analyser.cycle_constrain), list(analyser.overlap_cycle),
+                                 dict(analyser.inst_cache_cons), dict(analyser.data_cache_cons),
+                                 {block_id: [tracer.to_dict() for tracer in tracers]
+                                  for block_id, tracers in behaviors.items()})
+            assert results[1] == results[JOBS], (seed, log)
+            assert list(results[1][0]) == list(range(len(analyser.blocks))), seed
+            assert any(results[1][4].values()) == log, seed
+        print("Synthetic program %d: %d blocks, jobs=%d and jobs=1 agree" % (seed, len(analyser.blocks), JOBS))
+
+
+""" Benchmarks under tests/inputs. """
+
+for test_case in common.available_cases():
+    print(test_case)
+    analyser = common.build_analyser(test_case)
+
+    # The pool runs first: the simulation caches of the workers are not merged back, so the sequential run starts cold.
+    results = dict()
+    for jobs in (JOBS, 1):
+        start_time = time.time()
+        analyser.in_block_analysis(log=False, jobs=jobs)
+        print("jobs=%d: %.6f s" % (jobs, time.time() - start_time))
+        results[jobs] = (dict(analyser.cycle_constrain), list(analyser.overlap_cycle),
+                         dict(analyser.inst_cache_cons), dict(analyser.data_cache_cons))
+
+    assert results[1] == results[JOBS]
+    print("Hits %d, misses %d" % analyser.simulation_cache_stats)
@@ -0,0 +1,46 @@
+import common
+
+import os
+import random
+import time
+
+import z3
+
+from sample.ilp.inf_path import SMTModel, check_smt_models
+
+""" The SMT models of loop paths checked by a pool of processes must give the same unsat cores as the sequential
+check. """
+
+JOBS = max(2, os.cpu_count() or 1)
+MODELS = 200
+
+
+def random_model(rng: random.Random, solver: z3.Solver) -> SMTModel:
+    """ Branch conditions over a few registers as gen_cons builds them: comparisons of sums with constants,
+    and conditions on comparison results. About half of the models are unsat. """
+    regs = [z3.Int("A%d_%d" % (i, rng.randrange(3))) for i in range(3)]
+    smt = SMTModel(solver)
+    for _ in range(rng.randrange(1, 7)):
+        expr = rng.choice(regs) + rng.choice([z3.IntVal(rng.randrange(-4, 5)), rng.choice(regs)])
+        bound = z3.IntVal(rng.randrange(-8, 9))
+        cons = rng.choice([expr < bound, expr > bound, expr == bound, z3.Not(expr == bound), expr != 0])
+        smt.add_cons(z3.simplify(cons))
+    return smt
+
+
+rng = random.Random(0)
+# The paths of a loop share one solver in InfPath.
+solvers = [z3.Solver() for _ in range(4)]
+smts = [random_model(rng, rng.choice(solvers)) for _ in range(MODELS)]
+
+results = dict()
+for jobs in (1, JOBS):
+    start_time = time.time()
+    cores = check_smt_models(smts, jobs)
+    print("jobs=%d: %.6f s" % (jobs, time.time() - start_time))
+    results[jobs] = [None if core is None else [cons.sexpr() for cons in core] for core in cores]
+
+assert results[1] == results[JOBS]
+unsat = [core for core in results[1] if core is not None]
+assert 0 < len(unsat) < MODELS, len(unsat)
+print("%d models, %d unsat" % (MODELS, len(unsat)))
@@ -0,0 +1,96 @@
+import common
+
+import random
+import time
+import warnings
+
+from sample.cache.cache_config import CacheConfig
+from sample.frontend.cfg import EPacket
+from sample.frontend.isa import Instruction, Addr
+from sample.pipeline.abstract_interpretation import EPInPipeline, eps_in_pipeline_to_fps_in_pipeline, \
+    fps_in_pipeline_to_cache_line
+from sample.pipeline.constants import InstLookUpTable, InstType
+from sample.pipeline.simulator import do_pipeline_simulation_in_block
+from sample.pipeline.sploop import SPLoopType
+
+""" The pipeline simulation without log, which builds no behaviors, must give the same cycles as with log. """
+
+warnings.simplefilter("ignore")
+
+SEEDS = 5
+BLOCKS_PER_SEED = 300
+
+inst_names = {ty: sorted(InstLookUpTable.inst[ty])[0] for ty in (InstType.SINGLE_CYCLE, InstType.LOAD, InstType.STORE,
+                                                                 InstType.MULTI_EXT, InstType.CYCLE4, InstType.MPYDP)}
+weighted_names = [inst_names[InstType.SINGLE_CYCLE]] * 4 + \
+                 [inst_names[ty] for ty in (InstType.LOAD, InstType.STORE, InstType.MULTI_EXT, InstType.CYCLE4,
+                                            InstType.MPYDP)]
+
+
+def synthetic_block(rng: random.Random, start_addr: int, sp_loop: bool):
+    """ Execute packets of 1-4 instructions, some led by a multi-cycle NOP, optionally wrapped as an SPLoop body. """
+    eps, addr = list(), start_addr
+    if sp_loop:
+        eps.append(EPacket([Instruction("SPLOOP", None, ["2"], Addr(addr))]))
+        addr += 4
+    for _ in range(rng.randint(1, 30)):
+        insts = list()
+        for k in range(rng.randint(1, 4)):
+            if k == 0 and rng.random() < 0.2:
+                insts.append(Instruction("NOP", ".S1", [str(rng.randint(2, 9))], Addr(addr)))
+            else:
+                insts.append(Instruction(rng.choice(weighted_names), ".L1", ["A1", "A2", "A3"], Addr(addr),
+                                         is_par=k > 0))
+            addr += 4
+        eps.append(EPacket(insts))
+    if sp_loop:
+        eps.append(EPacket([Instruction("SPKERNEL", None, ["0", "0"], Addr(addr))]))
+    return eps
+
+
+""" Synthetic blocks with random cache penalties, about half of the lines and data references missing. """
+
+elapsed = {False: 0., True: 0.}
+sp_loops = 0
+for seed in range(SEEDS):
+    rng = random.Random(seed)
+    for block_id in range(BLOCKS_PER_SEED):
+        inst_cache_config = CacheConfig(capacity_size=32768, associativity=1, line_size=32,
+                                        penalty=rng.choice([12.5, 0, 3]))
+        data_cache_config = CacheConfig(capacity_size=32768, associativity=2, line_size=64,
+                                        penalty=rng.choice([6, 0, 12.5]))
+        sp_loop = rng.random() < 0.3
+        sp_loops += sp_loop
+        eps = [EPInPipeline(idx, ep)
+               for idx, ep in enumerate(synthetic_block(rng, 0x1000 + 4 * rng.randrange(64), sp_loop))]
+        fps = eps_in_pipeline_to_fps_in_pipeline(eps)
+        line_addr, is_line_head = fps_in_pipeline_to_cache_line(fps, inst_cache_config)
+        hit_blocks = {block for block in line_addr if rng.random() < 0.5}
+        hit_data = {inst.addr for ep in eps for inst in ep if rng.random() < 0.5}
+        args = (block_id, fps, is_line_head, line_addr, hit_blocks, hit_data, inst_cache_config, data_cache_config,
+                sp_loop, SPLoopType.SPLoop if sp_loop else None, 2 if sp_loop else None, 7 if sp_loop else None)
+
+        results = dict()
+        for log in (False, True):
+            start_time = time.time()
+            cycle, overlap, tracer = do_pipeline_simulation_in_block(*args, log=log)
+            elapsed[log] += time.time() - start_time
+            results[log] = (cycle, overlap)
+            assert bool(tracer.behaviors) == log, (seed, block_id)
+        assert results[False] == results[True], (seed, block_id)
+
+print("Synthetic: %d blocks (%d SPLoops), without log: %.6f s, with log: %.6f s"
+      % (SEEDS * BLOCKS_PER_SEED, sp_loops, elapsed[False], elapsed[True]))
+
+
+""" Benchmarks under tests/inputs. """
+
+for test_case in common.available_cases():
+    print(test_case)
+    analyser = common.build_analyser(test_case, memoize_simulation=False)
+    for idx in range(len(analyser.blocks)):
+        results = dict()
+        for log in (False, True):
+            result = analyser.analyse_block(idx, log=log)
+            results[log] = (result.cycle, result.overlap_cycle)
+        assert results[False] == results[True], idx
@@ -0,0 +1,114 @@
+import common
+
+import random
+
+import numpy as np
+from scipy.optimize import milp, Bounds, LinearConstraint as ScipyConstraint
+
+from sample.ilp.ilp import LinearModel, LinearConstraint
+from sample.ilp.solver import ILPSolver, ILPResult, BranchAndBoundBackend, make_solver
+
+""" The in-process branch-and-bound backend must agree with scipy's milp on random flow models, solved cold and
+warm started from the solution of the model before it was tightened. """
+
+MODELS = 300
+TOLERANCE = 1e-6
+
+
+def random_model(seed: int) -> LinearModel:
+    """ A chain of blocks b0..bn-1 with random back edges, each bounded by a random loop bound, like ILPModel. """
+    rng = random.Random(seed)
+    n = rng.randrange(3, 9)
+    edges = {(i, i + 1) for i in range(n - 1)}
+    for _ in range(rng.randrange(1, 4)):
+        src = rng.randrange(1, n)
+        edges.add((src, rng.randrange(0, src)))
+    edges = sorted(edges)
+
+    cons = [LinearConstraint(((1, "dSta_0"),), "=", 1), LinearConstraint(((1, "b0"), (-1, "dSta_0")), "=", 0)]
+    for v in range(n):
+        in_edges = tuple((-1, "d%d_%d" % e) for e in edges if e[1] == v)
+        out_edges = tuple((-1, "d%d_%d" % e) for e in edges if e[0] == v)
+        if in_edges:
+            cons.append(LinearConstraint(((1, "b%d" % v),) + in_edges, "=", 0))
+        if out_edges:
+            cons.append(LinearConstraint(((1, "b%d" % v),) + out_edges, "=", 0))
+    for src, dst in edges:
+        if src > dst:
+            entry = "d%d_%d" % (dst - 1, dst) if dst > 0 else "dSta_0"
+            cons.append(LinearConstraint(((1, "b%d" % dst), (-rng.randrange(2, 12), entry)), "<=", 0))
+
+    model = LinearModel()
+    model.add_constraints("tcfg constraints", cons)
+    model.objective = [(rng.choice([3, 5, 7.5, 12.5, -2]), "b%d" % v) for v in range(n)]
+    model.add_integers(model.variables())
+    return model
+
+
+def reference(model: LinearModel):
+    """ (status, optimum) by scipy.optimize.milp, status 0 is optimal. """
+    names = model.variables()
+    index = {name: i for i, name in enumerate(names)}
+    c = np.zeros(len(names))
+    for coef, name in model.objective:
+        c[index[name]] += coef
+    a = np.zeros((model.row_num, len(names)))
+    lower, upper = [], []
+    for i, con in enumerate(model.constraints):
+        for coef, name in con.terms:
+            a[i, index[name]] += coef
+        lower.append(con.rhs if con.sense in ("=", ">=") else -np.inf)
+        upper.append(con.rhs if con.sense in ("=", "<=") else np.inf)
+    res = milp(-c, constraints=ScipyConstraint(a, lower, upper), bounds=Bounds(0, np.inf),
+               integrality=np.array([name in model.integers for name in names], dtype=int))
+    return res.status, (-res.fun if res.status == 0 else None)
+
+
+def check(result: ILPResult, status: int, optimum, seed: int) -> None:
+    if status == 0:
+        assert result.is_sat and result.is_bound, seed
+        assert abs(result.obj_max_val - optimum) < TOLERANCE, (seed, result.obj_max_val, optimum)
+    else:
+        assert not (result.is_sat and result.is_bound), (seed, status)
+
+
+solver = BranchAndBoundBackend()
+warm_started = 0
+for seed in range(MODELS):
+    model = random_model(seed)
+    status, optimum = reference(model)
+    result = solver.solve(model)
+    check(result, status, optimum, seed)
+    if status != 0:
+        continue
+
+    # A constraint the solution already satisfies: the warm start is returned as it is.
+    loose = model.copy()
+    loose.add_constraints("infeasible path constraints", [LinearConstraint(((1, "b0"),), "<=", 1)])
+    check(solver.solve(loose, warm_start=result), *reference(loose), seed)
+
+    # A constraint that cuts the solution off: the old optimum only bounds the new one.
+    taken = [name for name in model.variables() if name.startswith("d") and name != "dSta_0"
+             and result.get_val(name) > 0]
+    if taken:
+        tight = model.copy()
+        tight.add_constraints("infeasible path constraints",
+                              [LinearConstraint(((1, taken[-1]),), "<=", result.get_val(taken[-1]) - 1)])
+        check(solver.solve(tight, warm_start=result), *reference(tight), seed)
+        warm_started += 1
+
+print("%d models, %d warm started from a cut-off solution" % (MODELS, warm_started))
+
+try:
+    ILPSolver()
+except TypeError:
+    pass
+else:
+    raise AssertionError("ILPSolver must be abstract.")
+
+try:
+    make_solver("gurobi")
+except ValueError:
+    pass
+else:
+    raise AssertionError("make_solver must reject unknown backends.")
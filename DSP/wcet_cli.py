@@ -1,17 +1,18 @@
 import argparse
 import json
 import os.path
-import subprocess
 import time
 import traceback
 from sys import stdout
-from typing import TextIO, List
+from typing import TextIO
 import alive_progress
 from sample.analyser import WCETAnalyser
 from sample.cache.cache_config import CacheConfig, read_cache_config_from_json
 from sample.frontend.isa import Addr
-from sample.pipeline.tracer import PipelineTracer
-from sample.cache.constants import MemoryModel
+from sample.pipeline.trace_sink import TraceSink
+from sample.cache.constants import MemoryModel, CacheStateBackend
+from sample.ilp.solver import SolverBackend, make_solver
+from sample.ilp.inf_path import InfPath
 from copy import deepcopy
 
 
@@ -122,6 +123,8 @@ class CLI:
                                        cons_dir=arg_space.loop_cons,
                                        slist_dir=arg_space.slist,
                                        start_name=arg_space.start_symbol,
+                                       state_backend=CacheStateBackend[arg_space.state_backend.upper()],
+                                       jobs=arg_space.jobs,
                                        finish_addr=Addr(
                                            arg_space.finish_address) if arg_space.finish_address is not None else None)
 
@@ -136,7 +139,6 @@ class CLI:
         ColorfulConsole.task_finish()
 
         self.__cons_dict = dict()
-        self.__tracer_dict = dict()
 
     def __frontend(self):
         ColorfulConsole.new_task("Front-end analysis")
@@ -172,43 +174,49 @@ class CLI:
         ColorfulConsole.log("Do global cache analysis for data cache.")
         self.__analyser.data_cache_analysis_global()
 
+        hits, misses = self.__analyser.expansion_cache_stats
+        if hits + misses > 0:
+            ColorfulConsole.info("Address expansion cache: {} hits, {} misses, hit rate {:.2%}."
+                                 .format(hits, misses, hits / (hits + misses)))
+        for cache, (rounds, hashed, full_hashed) in self.__analyser.fixpoint_stats.items():
+            if full_hashed > 0:
+                ColorfulConsole.info("Fixpoint of {} cache analysis: {} rounds, {} of {} set hashes computed ({:.2%})."
+                                     .format(cache, rounds, hashed, full_hashed, hashed / full_hashed))
+
         ColorfulConsole.log("Scan the program for SPLoops.")
         self.__analyser.sp_loop_analysis_global()
 
-        ColorfulConsole.log("Do in-block analysis for each basic block.")
-        with alive_progress.alive_bar(len(self.__analyser.blocks)) as bar:
-            for idx in range(len(self.__analyser.blocks)):
-                self.__analyser.move_block_cursor_to(idx)
-                self.__analyser.abstract_interpretation_gen()
-                self.__analyser.sp_loop_analysis_bb()
-                self.__analyser.inst_cache_analysis_bb()
-                self.__analyser.data_cache_analysis_bb()
-                self.__analyser.in_block_wcet_analysis(log=self.__in_block_trace, status_log=False)
-
-                # TODO: set the value as a copy, otherwise all values are pointers to the same list.
-                # TODO: This list-based implementation has a huge danger.
-
-                # self.__cons_dict[idx] = self.__analyser.cycle.copy()
-                # print('In-block cycle: ', idx, self.__cons_dict[idx])  # TODO: remove it.
-                self.__analyser.cycle_constrain[idx] = self.__analyser.cycle.copy()
-                self.__tracer_dict[idx] = self.__analyser.behaviors.copy()
-                bar()
-        self.__analyser.inter_block_analysis()
-        self.__cons_dict = self.__analyser.cycle_constrain.copy()
+        trace_sink = None
         if self.__in_block_trace:
-            ColorfulConsole.log("Dump pipeline simulation traces.")
-            base_dir = os.path.join(self.__output_dir, "traces").replace("\\", "/")
-            if not os.path.isdir(base_dir):
-                os.mkdir(base_dir)
+            trace_path = self.__dump("", base_dir=self.__output_dir, file_name="traces.jsonl", dump=False)
+            trace_sink = TraceSink(trace_path)
+            ColorfulConsole.log("Stream pipeline simulation traces into file {}.".format(trace_path))
 
+        ColorfulConsole.log("Do in-block analysis for each basic block with {} process(es).".format(self.__arg_space.jobs))
+        start_time = time.perf_counter()
+        try:
             with alive_progress.alive_bar(len(self.__analyser.blocks)) as bar:
-                for idx, tracer in self.__tracer_dict.items():
-                    tracer: List[
-                        PipelineTracer]  # TODO: two tracers, one for MUST-analysis, one for Persistent-analysis.
-                    dump_dir = self.__dump("", base_dir=base_dir, file_name="{}.json".format(idx), dump=False)
-                    tracer[1].dump(output_dir=dump_dir)
-                    bar()
-            ColorfulConsole.info("Traces of in-block pipeline simulation dump into path {}".format(base_dir))
+                def progress(finished: int):
+                    for _ in range(finished):
+                        bar()
+
+                self.__analyser.in_block_analysis(log=self.__in_block_trace, status_log=False,
+                                                  jobs=self.__arg_space.jobs, progress=progress, trace_sink=trace_sink)
+        finally:
+            if trace_sink is not None:
+                trace_sink.close()
+        ColorfulConsole.info("In-block analysis of {} blocks finished in {:.3f} s."
+                             .format(len(self.__analyser.blocks), time.perf_counter() - start_time))
+        hits, misses = self.__analyser.simulation_cache_stats
+        if hits + misses > 0:
+            ColorfulConsole.info("Pipeline simulation cache: {} hits, {} misses, hit rate {:.2%}."
+                                 .format(hits, misses, hits / (hits + misses)))
+        self.__analyser.inter_block_analysis()
+        self.__cons_dict = self.__analyser.cycle_constrain.copy()
+        if trace_sink is not None:
+            ColorfulConsole.info("Traces of in-block pipeline simulation dump into file {}, "
+                                 "extract a block by 'python -m sample.pipeline.trace_sink {} BLOCK_ID'."
+                                 .format(trace_sink.trace_path, trace_sink.trace_path))
 
         ColorfulConsole.task_finish()
 
@@ -222,12 +230,20 @@ class CLI:
 
         if solve:
             ColorfulConsole.new_task("ILP solving")
-            p_args = ['-stat', '-rxli', 'xli_CPLEX', ilp_cons_dir]
-            with subprocess.Popen("{} {}".format(self.__solver_loc, " ".join(p_args)),
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False, encoding="UTF-8") as p:
-                out, error_msg = p.communicate()
-            if len(error_msg):
-                raise RuntimeError("Error when solving ILP: {}".format(error_msg))
+            solver = make_solver(SolverBackend[self.__arg_space.ilp_backend.upper()], solver_loc=self.__solver_loc)
+            if self.__arg_space.inf_path:
+                ColorfulConsole.log("Refine the ILP constraints with infeasible paths by {} process(es)."
+                                    .format(self.__arg_space.jobs))
+                inf_path = InfPath(self.__analyser.loop_hierarchy, self.__analyser.linear_model,
+                                   solver=solver, jobs=self.__arg_space.jobs)
+                inf_path.iterative_solve()
+                result = inf_path.result
+            else:
+                result = solver.solve(self.__analyser.linear_model)
+            if not result.is_sat:
+                raise RuntimeError("The ILP constraints are infeasible.")
+            ColorfulConsole.log("Value of objective function: {}".format(result.obj_max_val))
+            out = result.raw_output if result.raw_output is not None else result.dump_stat(show_ivar=True)
             dump_dir = self.__dump(out, base_dir=self.__output_dir, file_name="ilp.solve")
             ColorfulConsole.info("ILP solve result dump to file {}".format(dump_dir))
             ColorfulConsole.task_finish()
@@ -260,6 +276,14 @@ if __name__ == '__main__':
                             help="The folder path for output results. If the folder does not exist, the program will create it.")
     arg_parser.add_argument('--solver', required=False, default="lp_solve.exe",
                             help="The location of LPSolver. If LPSolver has been added to the system PATH, it does not need to be specified.")
+    arg_parser.add_argument('--ilp_backend', dest='ilp_backend', choices=['lp_solve', 'branch_and_bound'],
+                            default='lp_solve',
+                            help="Specifies the ILP solver, lp_solve for the external LPSolver and branch_and_bound "
+                                 "for the in-process solver which requires scipy.")
+
+    arg_parser.add_argument('--inf_path', required=False, action='store_true',
+                            help="Refine the ILP constraints with infeasible paths checked by z3 until the WCET path "
+                                 "is feasible.")
 
     group = arg_parser.add_mutually_exclusive_group()
     group.add_argument("--frontend", action='store_true', help="Only front-end analysis.")
@@ -282,13 +306,22 @@ if __name__ == '__main__':
     arg_parser.add_argument('-m', '--memmodel', dest="memory_model", choices=['small', 'large'], default='small',
                             help='Specifies the Memory Model,small for SMALL MEMORY MODEL and large for LARGE MEMORY MODEL')
 
+    arg_parser.add_argument('--state_backend', dest='state_backend', choices=['dict', 'array'], default='dict',
+                            help="Specifies the storage of abstract cache states, dict for per-set dictionaries and "
+                                 "array for a NumPy age matrix which uses less memory.")
+
+    arg_parser.add_argument('--jobs', dest='jobs', type=int, default=1,
+                            help="The number of processes used by address analysis, in-block analysis and "
+                                 "infeasible path checking, default is 1.")
+
     arg_parser.add_argument('--start_symbol', dest='start_symbol', required=False, default='main', help='')  # TODO.
     arg_parser.add_argument('--finish_address', dest='finish_address', required=False, default=None, help='')  # TODO.
 
     arg_parser.add_argument("--graphviz", required=False, action='store_true',
                             help="Use graphviz to generate the control flow graph of TCFG.")
     arg_parser.add_argument("--tracer", required=False, action='store_true',
-                            help="Record and output specific information of in-block analysis.")
+                            help="Record specific information of in-block analysis and stream it into traces.jsonl "
+                                 "in the output directory.")
 
     args = arg_parser.parse_args()
 